@@ -0,0 +1,52 @@
+-- Baseline schema of the bots, as it was created before the migrations were versioned.
+
+CREATE TABLE IF NOT EXISTS users (
+    id BIGINT PRIMARY KEY,
+    "regDate" TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id BIGINT PRIMARY KEY,
+    "regDate" TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS properties (
+    id SERIAL PRIMARY KEY,
+    "userID" BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    address VARCHAR(100) NOT NULL,
+    title VARCHAR(30),
+    "addDate" TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS "userWorkers" (
+    id SERIAL PRIMARY KEY,
+    "userID" BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    "workID" INTEGER NOT NULL,
+    "workerID" BIGINT REFERENCES workers (id) ON DELETE SET NULL,
+    "workerName" VARCHAR(36) NOT NULL,
+    "workerNumber" VARCHAR(20),
+    "addDate" TIMESTAMP NOT NULL,
+    "addID" VARCHAR(36) NOT NULL,
+    "isActive" BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS "userWorks" (
+    id SERIAL PRIMARY KEY,
+    "userID" BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    "propertyID" INTEGER NOT NULL REFERENCES properties (id) ON DELETE CASCADE,
+    "workID" INTEGER NOT NULL,
+    "workerID" BIGINT REFERENCES workers (id) ON DELETE SET NULL,
+    date DATE NOT NULL,
+    "timeRange" VARCHAR(30) NOT NULL,
+    comment VARCHAR(200),
+    "addDate" TIMESTAMP NOT NULL,
+    "acceptForWorkDate" TIMESTAMP,
+    "acceptanceConfirmed" BOOLEAN NOT NULL DEFAULT FALSE,
+    "completedDate" TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS cleaning (
+    id SERIAL PRIMARY KEY,
+    "workID" INTEGER NOT NULL REFERENCES "userWorks" (id) ON DELETE CASCADE,
+    "hygieneKitsCount" INTEGER NOT NULL
+);
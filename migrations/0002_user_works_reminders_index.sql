@@ -0,0 +1,4 @@
+-- Serves the daily reminders query: assigned, uncompleted works of a date window.
+CREATE INDEX IF NOT EXISTS "userWorks_reminders_idx"
+    ON "userWorks" (date, id)
+    WHERE "workerID" IS NOT NULL AND "completedDate" IS NULL;
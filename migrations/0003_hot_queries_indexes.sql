@@ -0,0 +1,31 @@
+-- Indexes of the queries which are run on every screen of the bots.
+
+-- Landlord lists of planned and archived works, ordered by (date, id) for the keyset pagination
+CREATE INDEX IF NOT EXISTS "userWorks_user_active_idx"
+    ON "userWorks" ("userID", "workID", date, id)
+    WHERE "completedDate" IS NULL;
+CREATE INDEX IF NOT EXISTS "userWorks_user_completed_idx"
+    ON "userWorks" ("userID", "workID", date, id)
+    WHERE "completedDate" IS NOT NULL;
+
+-- Works taken by a worker
+CREATE INDEX IF NOT EXISTS "userWorks_worker_idx"
+    ON "userWorks" ("workerID", date, id)
+    WHERE "workerID" IS NOT NULL;
+
+-- Works nobody has taken yet
+CREATE INDEX IF NOT EXISTS "userWorks_free_idx"
+    ON "userWorks" (date, id)
+    WHERE "acceptForWorkDate" IS NULL;
+
+-- Foreign keys: joins and cascade deletes
+CREATE INDEX IF NOT EXISTS "userWorks_property_idx" ON "userWorks" ("propertyID");
+CREATE INDEX IF NOT EXISTS "cleaning_work_idx" ON cleaning ("workID");
+CREATE INDEX IF NOT EXISTS "properties_user_idx" ON properties ("userID", id);
+
+-- Workers of a landlord, invitation links and the worker profile lookups
+CREATE INDEX IF NOT EXISTS "userWorkers_user_idx" ON "userWorkers" ("userID", "workID");
+CREATE UNIQUE INDEX IF NOT EXISTS "userWorkers_add_id_idx" ON "userWorkers" ("addID");
+CREATE INDEX IF NOT EXISTS "userWorkers_worker_idx"
+    ON "userWorkers" ("workerID")
+    WHERE "workerID" IS NOT NULL;
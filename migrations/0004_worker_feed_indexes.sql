@@ -0,0 +1,10 @@
+-- Free works are read per landlord of the worker instead of over the whole table.
+CREATE INDEX IF NOT EXISTS "userWorks_user_free_idx"
+    ON "userWorks" ("userID", "workID", date, id)
+    WHERE "acceptForWorkDate" IS NULL AND "completedDate" IS NULL;
+DROP INDEX IF EXISTS "userWorks_free_idx";
+
+-- Landlords and work types of a worker
+CREATE INDEX IF NOT EXISTS "userWorkers_worker_landlords_idx"
+    ON "userWorkers" ("workerID", "userID", "workID")
+    WHERE "isActive" IS TRUE;
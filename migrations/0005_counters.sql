@@ -0,0 +1,203 @@
+-- Aggregates of the menus, kept up to date by triggers on the source tables.
+
+CREATE TABLE IF NOT EXISTS "userCounters" (
+    "userID" BIGINT PRIMARY KEY,
+    properties INTEGER NOT NULL DEFAULT 0,
+    workers INTEGER NOT NULL DEFAULT 0,
+    "activeWorkers" INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS "userWorkCounters" (
+    "userID" BIGINT NOT NULL,
+    "workID" INTEGER NOT NULL,
+    scheduled INTEGER NOT NULL DEFAULT 0,
+    confirmed INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ("userID", "workID")
+);
+
+CREATE TABLE IF NOT EXISTS "workerWorkCounters" (
+    "workerID" BIGINT NOT NULL,
+    "workID" INTEGER NOT NULL,
+    accepted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ("workerID", "workID")
+);
+
+
+-- Adds (sign = 1) or subtracts (sign = -1) the contribution of a work to the counters
+CREATE OR REPLACE FUNCTION "addWorkCounters"(work "userWorks", sign INTEGER) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO "userWorkCounters" AS c ("userID", "workID", scheduled, confirmed, completed)
+    VALUES (
+        work."userID",
+        work."workID",
+        sign * (work."acceptForWorkDate" IS NULL)::INTEGER,
+        sign * (work."acceptanceConfirmed" IS TRUE AND work."completedDate" IS NULL)::INTEGER,
+        sign * (work."completedDate" IS NOT NULL)::INTEGER
+    )
+    ON CONFLICT ("userID", "workID") DO UPDATE SET
+        scheduled = c.scheduled + EXCLUDED.scheduled,
+        confirmed = c.confirmed + EXCLUDED.confirmed,
+        completed = c.completed + EXCLUDED.completed;
+
+    IF work."workerID" IS NOT NULL THEN
+        INSERT INTO "workerWorkCounters" AS c ("workerID", "workID", accepted)
+        VALUES (
+            work."workerID",
+            work."workID",
+            sign * (work."acceptForWorkDate" IS NOT NULL AND work."completedDate" IS NULL)::INTEGER
+        )
+        ON CONFLICT ("workerID", "workID") DO UPDATE SET
+            accepted = c.accepted + EXCLUDED.accepted;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION "userWorksCountersTrigger"() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM "addWorkCounters"(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM "addWorkCounters"(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS "userWorks_counters" ON "userWorks";
+CREATE TRIGGER "userWorks_counters"
+    AFTER INSERT OR DELETE OR UPDATE OF
+        "userID", "workID", "workerID", "acceptForWorkDate", "acceptanceConfirmed", "completedDate"
+    ON "userWorks"
+    FOR EACH ROW EXECUTE FUNCTION "userWorksCountersTrigger"();
+
+
+CREATE OR REPLACE FUNCTION "propertiesCountersTrigger"() RETURNS TRIGGER AS $$
+DECLARE
+    user_id BIGINT := CASE WHEN TG_OP = 'DELETE' THEN OLD."userID" ELSE NEW."userID" END;
+    sign INTEGER := CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END;
+BEGIN
+    INSERT INTO "userCounters" AS c ("userID", properties)
+    VALUES (user_id, sign)
+    ON CONFLICT ("userID") DO UPDATE SET properties = c.properties + EXCLUDED.properties;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS "properties_counters" ON properties;
+CREATE TRIGGER "properties_counters"
+    AFTER INSERT OR DELETE ON properties
+    FOR EACH ROW EXECUTE FUNCTION "propertiesCountersTrigger"();
+
+
+CREATE OR REPLACE FUNCTION "userWorkersCountersTrigger"() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO "userCounters" AS c ("userID", workers, "activeWorkers")
+        VALUES (OLD."userID", -1, -(OLD."isActive" IS TRUE)::INTEGER)
+        ON CONFLICT ("userID") DO UPDATE SET
+            workers = c.workers + EXCLUDED.workers,
+            "activeWorkers" = c."activeWorkers" + EXCLUDED."activeWorkers";
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO "userCounters" AS c ("userID", workers, "activeWorkers")
+        VALUES (NEW."userID", 1, (NEW."isActive" IS TRUE)::INTEGER)
+        ON CONFLICT ("userID") DO UPDATE SET
+            workers = c.workers + EXCLUDED.workers,
+            "activeWorkers" = c."activeWorkers" + EXCLUDED."activeWorkers";
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS "userWorkers_counters" ON "userWorkers";
+CREATE TRIGGER "userWorkers_counters"
+    AFTER INSERT OR DELETE OR UPDATE OF "userID", "isActive" ON "userWorkers"
+    FOR EACH ROW EXECUTE FUNCTION "userWorkersCountersTrigger"();
+
+
+-- Recounts the counters from the source tables, returns the number of corrected rows.
+-- The counters are locked, so the triggers of concurrent writes wait and apply their changes afterwards.
+CREATE OR REPLACE FUNCTION "reconcileCounters"() RETURNS INTEGER AS $$
+DECLARE
+    corrected INTEGER := 0;
+    n INTEGER;
+BEGIN
+    LOCK TABLE "userCounters", "userWorkCounters", "workerWorkCounters" IN EXCLUSIVE MODE;
+
+    WITH actual AS (
+        SELECT
+            u.id AS "userID",
+            (SELECT COUNT(*) FROM properties p WHERE p."userID" = u.id) AS properties,
+            (SELECT COUNT(*) FROM "userWorkers" uw WHERE uw."userID" = u.id) AS workers,
+            (SELECT COUNT(*) FROM "userWorkers" uw WHERE uw."userID" = u.id AND uw."isActive" IS TRUE) AS "activeWorkers"
+        FROM (
+            SELECT "userID" AS id FROM properties
+            UNION SELECT "userID" FROM "userWorkers"
+            UNION SELECT "userID" FROM "userCounters"
+        ) u
+    ), changed AS (
+        INSERT INTO "userCounters" AS c SELECT * FROM actual
+        ON CONFLICT ("userID") DO UPDATE SET
+            properties = EXCLUDED.properties,
+            workers = EXCLUDED.workers,
+            "activeWorkers" = EXCLUDED."activeWorkers"
+        WHERE (c.properties, c.workers, c."activeWorkers")
+            IS DISTINCT FROM (EXCLUDED.properties, EXCLUDED.workers, EXCLUDED."activeWorkers")
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO n FROM changed;
+    corrected := corrected + n;
+
+    WITH actual AS (
+        SELECT
+            k."userID", k."workID",
+            COUNT(w.id) FILTER (WHERE w."acceptForWorkDate" IS NULL) AS scheduled,
+            COUNT(w.id) FILTER (WHERE w."acceptanceConfirmed" IS TRUE AND w."completedDate" IS NULL) AS confirmed,
+            COUNT(w.id) FILTER (WHERE w."completedDate" IS NOT NULL) AS completed
+        FROM (
+            SELECT "userID", "workID" FROM "userWorks"
+            UNION SELECT "userID", "workID" FROM "userWorkCounters"
+        ) k
+        LEFT JOIN "userWorks" w
+            ON w."userID" = k."userID" AND w."workID" = k."workID"
+        GROUP BY k."userID", k."workID"
+    ), changed AS (
+        INSERT INTO "userWorkCounters" AS c SELECT * FROM actual
+        ON CONFLICT ("userID", "workID") DO UPDATE SET
+            scheduled = EXCLUDED.scheduled,
+            confirmed = EXCLUDED.confirmed,
+            completed = EXCLUDED.completed
+        WHERE (c.scheduled, c.confirmed, c.completed)
+            IS DISTINCT FROM (EXCLUDED.scheduled, EXCLUDED.confirmed, EXCLUDED.completed)
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO n FROM changed;
+    corrected := corrected + n;
+
+    WITH actual AS (
+        SELECT
+            k."workerID", k."workID",
+            COUNT(w.id) FILTER (WHERE w."acceptForWorkDate" IS NOT NULL AND w."completedDate" IS NULL) AS accepted
+        FROM (
+            SELECT "workerID", "workID" FROM "userWorks" WHERE "workerID" IS NOT NULL
+            UNION SELECT "workerID", "workID" FROM "workerWorkCounters"
+        ) k
+        LEFT JOIN "userWorks" w
+            ON w."workerID" = k."workerID" AND w."workID" = k."workID"
+        GROUP BY k."workerID", k."workID"
+    ), changed AS (
+        INSERT INTO "workerWorkCounters" AS c SELECT * FROM actual
+        ON CONFLICT ("workerID", "workID") DO UPDATE SET accepted = EXCLUDED.accepted
+        WHERE c.accepted IS DISTINCT FROM EXCLUDED.accepted
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO n FROM changed;
+    corrected := corrected + n;
+
+    RETURN corrected;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT "reconcileCounters"();
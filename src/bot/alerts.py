@@ -0,0 +1,182 @@
+'''Digests of the error alerts.
+
+Every exception is written to the logfile, but the logs chat gets one message per kind of exception
+(fingerprint: type and the place where it was raised) per `ALERT_INTERVAL` with the number of occurrences.
+The state is kept in Redis, so both bots share the intervals and the counters.'''
+
+from .logs import addLog, queueTelegramLog
+from .storage import getScript
+from . import config
+
+import time
+import json
+import asyncio
+import hashlib
+import secrets
+import datetime
+import traceback
+
+
+ALERT_INTERVAL = getattr(config, 'ALERT_INTERVAL', 60*5) # minimum time between the messages of a fingerprint
+ALERT_WINDOW = getattr(config, 'ALERT_WINDOW', 60*60) # sliding window of the occurrences counter
+ALERT_TRACEBACK_LENGTH = 3000 # telegram message is limited by 4096 characters
+
+ALERTS_KEY = 'alerts' # zset: fingerprint -> time when the next digest of it may be sent
+
+alerts_metrics = {
+    'reported': 0,
+    'sent': 0,
+    'suppressed': 0,
+    'redis_errors': 0,
+}
+
+
+# Counts an occurrence and decides whether the digest is sent now.
+# KEYS[1] - pending occurrences (hash), KEYS[2] - window (zset), KEYS[3] - `ALERTS_KEY`
+# ARGV: now, window, interval, occurrence id, fingerprint, type, location, traceback, level
+# Returns `{in window, pending occurrences...}`, the occurrences are returned only if the digest must be sent.
+RECORD_SCRIPT = '''
+local now = tonumber(ARGV[1])
+redis.call('ZADD', KEYS[2], now, ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[2]))
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+local in_window = redis.call('ZCARD', KEYS[2])
+
+redis.call('HINCRBY', KEYS[1], 'count', 1)
+redis.call('HSETNX', KEYS[1], 'first', now)
+redis.call('HSET', KEYS[1], 'last', now, 'type', ARGV[6], 'location', ARGV[7], 'traceback', ARGV[8], 'level', ARGV[9])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+
+local due = redis.call('ZSCORE', KEYS[3], ARGV[5])
+if due and tonumber(due) > now then
+    return {in_window}
+end
+
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[3]), ARGV[5])
+local pending = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return {in_window, unpack(pending)}
+'''
+
+# Takes the pending occurrences of the fingerprints whose interval has passed.
+# The fingerprints without new occurrences are forgotten, their next exception is sent at once.
+# KEYS[1] - `ALERTS_KEY`; ARGV: now, interval, window
+# Returns `{fingerprint, in window, pending occurrences (json), ...}`
+FLUSH_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local result = {}
+for _, fingerprint in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now)) do
+    local key = 'alert=' .. fingerprint
+    local pending = redis.call('HGETALL', key)
+    if #pending > 0 then
+        redis.call('DEL', key)
+        redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), fingerprint)
+        local window = key .. '&window'
+        redis.call('ZREMRANGEBYSCORE', window, '-inf', now - tonumber(ARGV[3]))
+        table.insert(result, fingerprint)
+        table.insert(result, redis.call('ZCARD', window))
+        table.insert(result, cjson.encode(pending))
+    else
+        redis.call('ZREM', KEYS[1], fingerprint)
+    end
+end
+return result
+'''
+
+
+def getFingerprint(exception: BaseException) -> tuple[str, str, str]:
+    "Returns `(fingerprint, exception type, location)`, the location is the innermost frame of the traceback."
+
+    exception_type = type(exception).__qualname__
+    frames = traceback.extract_tb(exception.__traceback__)
+    if frames:
+        frame = frames[-1]
+        location = f'{frame.filename}:{frame.lineno} ({frame.name})'
+    else:
+        location = 'unknown'
+
+    fingerprint = hashlib.sha1(f'{exception_type}|{location}'.encode()).hexdigest()[:16]
+    return fingerprint, exception_type, location
+
+
+async def reportException(exception: BaseException, level: str='error') -> None:
+    '''Writes the exception to the logfile and counts it for the digest of its fingerprint.
+    The digest is sent at once if the fingerprint has not been sent during the last `ALERT_INTERVAL`,
+    in background, so the handler which failed doesn't wait for Telegram.'''
+
+    text = ''.join(traceback.format_exception(exception))
+    await addLog(level=level, text=text)
+    alerts_metrics['reported'] += 1
+    startFlusher()
+
+    fingerprint, exception_type, location = getFingerprint(exception)
+    key = f'alert={fingerprint}'
+    try:
+        record = (await getScript(RECORD_SCRIPT))
+        result = (await record(
+            keys=[key, f'{key}&window', ALERTS_KEY],
+            args=[
+                time.time(), ALERT_WINDOW, ALERT_INTERVAL, secrets.token_hex(8),
+                fingerprint, exception_type, location, text[-ALERT_TRACEBACK_LENGTH:], level,
+            ],
+        ))
+    except Exception:
+        # Without Redis every exception is sent separately, the number of the messages is limited by the logs
+        alerts_metrics['redis_errors'] += 1
+        return await addLog(level=level, text=text, send_telegram_message=True)
+
+    in_window, pending = result[0], result[1:]
+    if not pending:
+        alerts_metrics['suppressed'] += 1
+        return
+
+    pending = {k.decode(): v.decode() for k, v in zip(pending[::2], pending[1::2])}
+    sendDigest(pending, in_window)
+
+def sendDigest(pending: dict, in_window: int) -> None:
+    '''Sends the pending occurrences of a fingerprint to the logs chat in background.
+    The digest is dropped with the other telegram logs when too many of them are being sent.'''
+
+    first = datetime.datetime.fromtimestamp(float(pending['first'])).strftime('%H:%M:%S')
+    last = datetime.datetime.fromtimestamp(float(pending['last'])).strftime('%H:%M:%S')
+
+    text = (
+        f"{pending['type']} at {pending['location']}\n"
+        f"{pending['count']} times since {first} (last at {last}), "
+        f"{in_window} times in {ALERT_WINDOW // 60} min\n\n"
+        f"{pending['traceback']}"
+    )
+    if queueTelegramLog(datetime.datetime.now(), pending['level'], text):
+        alerts_metrics['sent'] += 1
+
+
+async def flushAlerts() -> None:
+    "Sends the digests of the fingerprints which got new occurrences after their last message."
+
+    flush = (await getScript(FLUSH_SCRIPT))
+    result = (await flush(keys=[ALERTS_KEY], args=[time.time(), ALERT_INTERVAL, ALERT_WINDOW]))
+
+    for i in range(0, len(result), 3):
+        pending = json.loads(result[i + 2])
+        pending = dict(zip(pending[::2], pending[1::2]))
+        sendDigest(pending, result[i + 1])
+
+flusher = None
+def startFlusher() -> None:
+    "Starts the periodic sending of the digests in the current loop, once per process."
+
+    global flusher
+
+    loop = asyncio.get_running_loop()
+    if flusher is not None and not flusher.done() and flusher.get_loop() is loop:
+        return
+
+    async def runFlusher():
+        while True:
+            await asyncio.sleep(ALERT_INTERVAL / 5)
+            try:
+                await flushAlerts()
+            except Exception:
+                alerts_metrics['redis_errors'] += 1
+
+    flusher = loop.create_task(runFlusher())
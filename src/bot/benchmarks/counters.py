@@ -0,0 +1,90 @@
+'''Latency of the menu counters.
+
+"count" runs the former `COUNT` queries of a menu on the source tables,
+"summary" reads the same numbers from the summary tables (see `counters`).
+The summary tables are reconciled at the end, a non-zero number of corrected rows means the triggers missed a change.
+Must be run on a local copy of the database, `--seed` fills it with generated data first:
+
+    python -m src.bot.benchmarks.counters --seed 20000 --repeat 500
+'''
+
+from ..db import connect
+from ..counters import getUserCounters, getUserWorkCounters, getWorkerWorkCounters, reconcileCounters
+from ..query_audit import seedDatabase, getSampleArguments
+from .timing import measure, report
+
+import sys
+import asyncio
+import argparse
+
+
+CLEANING_MENU_QUERY = '''
+    SELECT
+        COUNT(id) FILTER (WHERE "acceptForWorkDate" IS NULL) AS scheduled,
+        COUNT(id) FILTER (WHERE "acceptanceConfirmed" = TRUE AND "completedDate" IS NULL) AS confirmed,
+        COUNT(id) FILTER (WHERE "completedDate" IS NOT NULL) AS completed
+    FROM "userWorks"
+    WHERE "userID" = $1 AND "workID" = $2
+'''
+PROPERTIES_MENU_QUERY = 'SELECT COUNT(id) FROM properties WHERE "userID" = $1'
+WORKERS_MENU_QUERIES = (
+    'SELECT COUNT(id) FROM "userWorkers" WHERE "userID" = $1',
+    'SELECT COUNT(id) FROM "userWorkers" WHERE "userID" = $1 AND "isActive" IS TRUE',
+)
+WORKER_START_QUERY = '''
+    SELECT COUNT(id)
+    FROM "userWorks"
+    WHERE "workID" = $2
+        AND "workerID" = $1
+        AND "completedDate" IS NULL
+        AND "acceptForWorkDate" IS NOT NULL
+'''
+
+
+async def countCleaningMenu(conn, user_id: int, work_id: int) -> None:
+    await conn.fetchrow(CLEANING_MENU_QUERY, user_id, work_id)
+
+async def countPropertiesMenu(conn, user_id: int) -> None:
+    await conn.fetchval(PROPERTIES_MENU_QUERY, user_id)
+
+async def countWorkersMenu(conn, user_id: int) -> None:
+    for query in WORKERS_MENU_QUERIES:
+        await conn.fetchval(query, user_id)
+
+async def countWorkerStart(conn, worker_id: int, work_id: int) -> None:
+    await conn.fetchval(WORKER_START_QUERY, worker_id, work_id)
+
+
+async def main(seed: int, repeat: int) -> int:
+    conn = await connect()
+    try:
+        if seed:
+            await seedDatabase(conn, seed)
+        arguments = (await getSampleArguments(conn))
+        user_id, worker_id, work_id = arguments['user_id'], arguments['worker_id'], arguments['work_kind']
+
+        menus = (
+            ('cleaningMenu', countCleaningMenu, getUserWorkCounters, (user_id, work_id)),
+            ('propertiesMenu', countPropertiesMenu, getUserCounters, (user_id,)),
+            ('workersMenu', countWorkersMenu, getUserCounters, (user_id,)),
+            ('work start', countWorkerStart, getWorkerWorkCounters, (worker_id, work_id)),
+        )
+        for name, count, summary, args in menus:
+            report(f'{name} count', (await measure(count, conn, *args, repeat=repeat)))
+            report(f'{name} summary', (await measure(summary, conn, *args, repeat=repeat)))
+
+        corrected = (await reconcileCounters(conn))
+    finally:
+        await conn.close()
+
+    print(f'Reconciled rows: {corrected}')
+    return 1 if corrected else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the latency of the menu counters.')
+    parser.add_argument('--seed', type=int, default=0, help='generate this many cleanings first')
+    parser.add_argument('--repeat', type=int, default=500, help='renders per menu and method')
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.seed, args.repeat)))
@@ -0,0 +1,89 @@
+'''Dispatch latency of a callback, from the callback data to the handler call.
+
+"eval" is the former way: the handlers are found by scanning the module and called by an evaluated string.
+"table" parses the legacy arguments string by the dispatch table, "packed" decodes the binary callback data.
+
+    python -m src.bot.benchmarks.dispatch --repeat 100000
+'''
+
+from ..dispatcher import Dispatcher
+from ..callbacks import encodeCallback, decodeCallback
+from .timing import measure, report
+
+import types
+import asyncio
+import argparse
+
+
+dispatcher = Dispatcher()
+
+
+@dispatcher.handler()
+async def cleaningCard(user_id: int, work_id: int, only_completed: bool=False) -> None: ...
+
+@dispatcher.handler()
+async def cleaningList(user_id: int, page: int=1, only_completed: bool=False, after: str=None) -> None: ...
+
+def createModule(handlers_count: int) -> types.ModuleType:
+    '''Returns a module like `__main__` of a bot: the benchmarked handlers among the other functions and globals.'''
+
+    module = types.ModuleType('bot')
+    for i in range(handlers_count):
+        exec(f'async def handler{i}(user_id): ...', vars(module))
+        setattr(module, f'CONSTANT_{i}', i)
+    module.cleaningCard = cleaningCard
+    module.cleaningList = cleaningList
+    return module
+
+
+async def evalDispatch(module: types.ModuleType, callback_data: str, user_id: int) -> None:
+    "The former `statesRunner`: the functions of the module are listed and the call is evaluated."
+
+    data = callback_data.split('-')
+    functions_list = [
+        name for (name, obj)
+            in vars(module).items()
+            if hasattr(obj, "__class__")
+                and obj.__class__.__name__ == "function"
+    ]
+
+    func = data[1]
+    if func not in functions_list:
+        raise ValueError(func)
+    arguments = ', '.join([f'user_id={user_id}', *filter(None, data[2].split('&'))])
+    await eval(f"{func}({arguments})", vars(module))
+
+async def tableDispatch(callback_data: str, user_id: int) -> None:
+    _, func, arguments = callback_data.split('-')
+    await dispatcher.dispatch(func, user_id=user_id, **dispatcher.parseArguments(func, arguments))
+
+async def packedDispatch(callback_data: str, user_id: int) -> None:
+    callback = decodeCallback(callback_data)
+    func = callback['handler']
+    await dispatcher.dispatch(func, user_id=user_id, **dispatcher.checkArguments(func, callback['kwargs']))
+
+
+async def main(repeat: int, handlers_count: int) -> None:
+    module = createModule(handlers_count)
+    calls = (
+        ('cleaningCard', {'work_id': 12345, 'only_completed': True}),
+        ('cleaningList', {'page': 3, 'only_completed': False, 'after': '2024-08-01_12345'}),
+    )
+
+    for func, kwargs in calls:
+        legacy_arguments = '&'.join(f'{k}={v}' if not isinstance(v, str) else f'{k}="{v}"' for k, v in kwargs.items())
+        legacy_data = f'start_func-{func}-{legacy_arguments}'
+        packed_data = encodeCallback(func, **kwargs)
+
+        report(f'{func} eval', (await measure(evalDispatch, module, legacy_data, 1, repeat=repeat)))
+        report(f'{func} table', (await measure(tableDispatch, legacy_data, 1, repeat=repeat)))
+        report(f'{func} packed', (await measure(packedDispatch, packed_data, 1, repeat=repeat)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the dispatch latency of a callback.')
+    parser.add_argument('--repeat', type=int, default=20000, help='dispatched callbacks per method')
+    parser.add_argument('--handlers', type=int, default=100, help='other functions in the scanned module')
+    args = parser.parse_args()
+
+    asyncio.run(main(args.repeat, args.handlers))
@@ -0,0 +1,77 @@
+'''Render cost of a list page.
+
+"stack" is the former paginator, which found the name of its caller by `inspect.stack()`.
+"built" is `paginator` with an empty cache, "cached" is `paginator` for a page which was already built.
+
+    python -m src.bot.benchmarks.pagination --repeat 2000
+'''
+
+from ..pagination import paginator, pages_cache
+from ..callbacks import encodeCallback
+from .timing import measure, report
+
+import math
+import asyncio
+import inspect
+import argparse
+from telebot import types
+
+
+async def stackPaginator(array: tuple[dict], per_page: int=5, current_page: int=1, **kwargs) -> types.InlineKeyboardMarkup:
+    "The former paginator, the page buttons call the function which called it."
+
+    keyboard = types.InlineKeyboardMarkup()
+    button = types.InlineKeyboardButton
+
+    pages_count = math.ceil(len(array) / per_page)
+    last_index = per_page * current_page
+    for i in array[last_index - per_page:last_index]:
+        keyboard.add(button(text=i['text'], callback_data=i['callback_data']))
+
+    caller_func = inspect.stack()[1].function
+    kwargs = '&'.join(f'{k}={v}' if isinstance(v, int) else f'{k}="{v}"' for k, v in kwargs.items())
+
+    if pages_count > 1:
+        keyboard.row(
+            button(text='⏪', callback_data=f'start_func-{caller_func}-page=1&{kwargs}'),
+            button(text='⬅️', callback_data=f'start_func-{caller_func}-page={current_page-1}&{kwargs}'),
+            button(text=f'{current_page} / {pages_count}', callback_data='#'),
+            button(text='➡️', callback_data=f'start_func-{caller_func}-page={current_page+1}&{kwargs}'),
+            button(text='⏩', callback_data=f'start_func-{caller_func}-page={pages_count}&{kwargs}'),
+        )
+    return keyboard
+
+
+async def cleaningList(array: tuple[dict], page: int) -> None:
+    "A list handler, the former paginator inspects its frame."
+
+    await stackPaginator(array, current_page=page, only_completed=False)
+
+async def builtPage(array: tuple[dict], page: int, count: int) -> None:
+    pages_cache.clear()
+    await paginator(array, 'cleaningList', page, count=count, cursors=('2024-08-01_1', '2024-08-05_5'), only_completed=False)
+
+async def cachedPage(array: tuple[dict], page: int, count: int) -> None:
+    await paginator(array, 'cleaningList', page, count=count, cursors=('2024-08-01_1', '2024-08-05_5'), only_completed=False)
+
+
+async def main(repeat: int, count: int) -> None:
+    array = tuple(
+        {'text': f'🧴 2024-08-{i % 28 + 1:02} 10:00-12:00', 'callback_data': encodeCallback('cleaningCard', work_id=i, call_id=True)}
+        for i in range(count)
+    )
+    page = 2
+
+    report('stack', (await measure(cleaningList, array, page, repeat=repeat)))
+    # The keyset pages get only the rows of the page
+    report('built', (await measure(builtPage, array[:5], page, count, repeat=repeat)))
+    report('cached', (await measure(cachedPage, array[:5], page, count, repeat=repeat)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the render cost of a list page.')
+    parser.add_argument('--repeat', type=int, default=2000, help='rendered pages per method')
+    parser.add_argument('--count', type=int, default=50, help='rows of the list')
+    args = parser.parse_args()
+
+    asyncio.run(main(args.repeat, args.count))
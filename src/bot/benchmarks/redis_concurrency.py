@@ -0,0 +1,96 @@
+'''Number of the concurrent updates which one loop handles when every update makes Redis requests.
+
+"sync" is the former client: the blocking `redis.Redis` called from the coroutines.
+"async" is the shared client of `storage.getRedisConnection`.
+The loop lag is the delay of a timer which should fire every millisecond, it shows how long the loop is blocked.
+
+    python -m src.bot.benchmarks.redis_concurrency --updates 5000 --concurrency 50 200
+'''
+
+from ..config import REDIS_DB, REDIS_HOST, REDIS_PORT
+from ..storage import getRedisConnection, closeRedisConnection
+from .timing import reportRate, report
+
+import time
+import redis
+import asyncio
+import argparse
+
+
+KEY_PREFIX = 'benchmark=redis'
+REQUESTS_PER_UPDATE = 3 # the state is read, written and an overflowed callback is checked
+
+
+async def syncUpdate(client: redis.Redis, user_id: int) -> None:
+    key = f"{KEY_PREFIX}&user={user_id}"
+    client.get(key)
+    client.set(key, 'state', ex=60)
+    client.exists(f"{key}&callback")
+
+async def asyncUpdate(client, user_id: int) -> None:
+    key = f"{KEY_PREFIX}&user={user_id}"
+    await client.get(key)
+    await client.set(key, 'state', ex=60)
+    await client.exists(f"{key}&callback")
+
+
+async def watchLoop(lags: list[float], stop: asyncio.Event) -> None:
+    "Records how late a 1 ms timer fires."
+
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+async def runUpdates(update, client, updates: int, concurrency: int) -> float:
+    "Handles `updates` updates, at most `concurrency` at once. Returns the duration."
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handle(user_id: int) -> None:
+        async with semaphore:
+            await update(client, user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handle(i) for i in range(updates)))
+    return time.perf_counter() - started
+
+async def benchmark(name: str, update, client, updates: int, concurrency: int) -> None:
+    lags = []
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watchLoop(lags, stop))
+
+    duration = (await runUpdates(update, client, updates, concurrency))
+
+    stop.set()
+    await watcher
+    reportRate(f'{name}, concurrency {concurrency}: updates', updates, duration)
+    if lags:
+        report(f'{name}, concurrency {concurrency}: loop lag', lags)
+
+
+async def main(updates: int, concurrency: list[int]) -> None:
+    sync_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+    async_client = (await getRedisConnection())
+
+    try:
+        for value in concurrency:
+            await benchmark('sync', syncUpdate, sync_client, updates, value)
+            await benchmark('async', asyncUpdate, async_client, updates, value)
+    finally:
+        keys = [key async for key in async_client.scan_iter(match=f'{KEY_PREFIX}*', count=1000)]
+        if keys:
+            await async_client.delete(*keys)
+        sync_client.close()
+        await closeRedisConnection()
+
+    print(f'{REQUESTS_PER_UPDATE} Redis requests per update')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the concurrent updates which make Redis requests.')
+    parser.add_argument('--updates', type=int, default=5000, help='handled updates per run')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 50, 200], help='updates handled at once')
+    args = parser.parse_args()
+
+    asyncio.run(main(args.updates, args.concurrency))
@@ -0,0 +1,66 @@
+'''Latency of recording a state transition.
+
+"separate" is the former `autoSetState`: the state is read, read again by `setState` and written back as JSON.
+"script" is `pushState`, one script call which pushes the state and returns the previous one.
+The overhead counters of `autoSetState` are printed for a decorated handler at the end.
+
+    python -m src.bot.benchmarks.states --repeat 5000
+'''
+
+from ..storage import getRedisConnection, closeRedisConnection
+from ..state_machine import autoSetState, encodeState, pushState, delStates, getStateMetrics
+from .timing import measure, report
+
+import json
+import asyncio
+import argparse
+
+
+BOT = 'benchmark'
+USER_ID = 1
+
+
+async def separateTransition(kwargs: dict) -> None:
+    redis = (await getRedisConnection())
+    key = f"bot={BOT}&user={USER_ID}-state"
+
+    current_state = (await redis.get(key))
+    last_state = json.loads(current_state) if current_state else None
+    if last_state is None:
+        await redis.get(key)
+    await redis.set(key, json.dumps({'func': 'cleaningCard', 'args': [], 'kwargs': kwargs, 'last_state': last_state}))
+
+async def scriptTransition(kwargs: dict) -> None:
+    await pushState(BOT, USER_ID, encodeState('cleaningCard', kwargs))
+
+
+@autoSetState(bot=BOT)
+async def cleaningCard(user_id: int, work_id: int) -> None: ...
+
+
+async def main(repeat: int) -> None:
+    redis = (await getRedisConnection())
+    kwargs = {'work_id': 12345}
+
+    try:
+        report('separate', (await measure(separateTransition, kwargs, repeat=repeat)))
+        report('script', (await measure(scriptTransition, kwargs, repeat=repeat)))
+
+        await measure(cleaningCard, user_id=USER_ID, work_id=12345, repeat=repeat)
+        for name, metrics in getStateMetrics().items():
+            print(
+                f"{name} state overhead: {metrics['calls']} calls, "
+                f"avg {metrics['time_avg'] * 1000:.3f} ms, max {metrics['time_max'] * 1000:.3f} ms"
+            )
+    finally:
+        await redis.delete(f"bot={BOT}&user={USER_ID}-state")
+        await delStates(BOT, USER_ID)
+        await closeRedisConnection()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the latency of recording a state transition.')
+    parser.add_argument('--repeat', type=int, default=5000, help='transitions per method')
+    args = parser.parse_args()
+
+    asyncio.run(main(args.repeat))
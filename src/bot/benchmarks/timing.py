@@ -0,0 +1,39 @@
+'''Timing helpers of the benchmarks.'''
+
+import time
+import statistics
+
+
+def summarize(durations: list[float]) -> dict:
+    "Returns the latency percentiles (in milliseconds) of the measured calls."
+
+    durations = sorted(durations)
+    percentile = lambda p: durations[min(int(len(durations) * p), len(durations) - 1)] * 1000
+    return {
+        'calls': len(durations),
+        'avg': statistics.fmean(durations) * 1000,
+        'p50': percentile(0.5),
+        'p99': percentile(0.99),
+        'max': durations[-1] * 1000,
+    }
+
+def report(name: str, durations: list[float]) -> None:
+    stats = summarize(durations)
+    print(
+        f"{name}: {stats['calls']} calls, avg {stats['avg']:.3f} ms, "
+        f"p50 {stats['p50']:.3f} ms, p99 {stats['p99']:.3f} ms, max {stats['max']:.3f} ms"
+    )
+
+def reportRate(name: str, count: int, duration: float) -> None:
+    print(f"{name}: {count} in {duration:.2f} s, {count / duration:.0f}/s")
+
+
+async def measure(func, *args, repeat: int=1000, **kwargs) -> list[float]:
+    "Awaits `func(*args, **kwargs)` `repeat` times one by one, returns the durations of the calls."
+
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func(*args, **kwargs)
+        durations.append(time.perf_counter() - started)
+    return durations
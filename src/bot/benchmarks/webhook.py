@@ -0,0 +1,110 @@
+'''Throughput of the webhook ingestion.
+
+The webhook application of `updates` is served locally for a bot without handlers, and synthetic message updates
+are posted to it with the secret token, so the measured time is the receiving, the validation and the hand-over
+(to the bot or to Redis Streams with `UPDATES_STREAM`). A part of the requests can be posted with a wrong secret.
+
+    python -m src.bot.benchmarks.webhook --updates 20000 --concurrency 100 --rate 2000
+'''
+
+from ..runtime import runtime
+from ..updates import createWebhookApp, getSecretToken, webhook_metrics
+from .timing import report, reportRate
+
+import time
+import asyncio
+import aiohttp
+import telebot
+import argparse
+from aiohttp import web
+
+
+BOT_NAME = 'main'
+
+
+def createUpdate(update_id: int) -> dict:
+    user = {'id': 100000 + update_id % 1000, 'is_bot': False, 'first_name': 'Benchmark'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user['id'], 'type': 'private'},
+            'from': user,
+            'text': f'Address {update_id}',
+        },
+    }
+
+
+async def postUpdates(
+    url: str,
+    secret_token: str,
+    updates: int,
+    concurrency: int,
+    rate: int,
+    invalid_rate: float,
+) -> tuple[list[float], dict]:
+    '''Posts the updates, at most `concurrency` at once and `rate` per second (0 - no limit).
+    Returns the durations of the requests and the numbers of the answers by status.'''
+
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+    statuses = dict()
+    invalid_every = int(1 / invalid_rate) if invalid_rate else 0
+    started = time.perf_counter()
+
+    async def post(session: aiohttp.ClientSession, update_id: int) -> None:
+        if rate:
+            # The updates are spread evenly over the time
+            await asyncio.sleep(max(started + update_id / rate - time.perf_counter(), 0))
+
+        token = 'invalid' if invalid_every and update_id % invalid_every == 0 else secret_token
+        async with semaphore:
+            request_started = time.perf_counter()
+            async with session.post(url, json=createUpdate(update_id), headers={'X-Telegram-Bot-Api-Secret-Token': token}) as response:
+                await response.read()
+            durations.append(time.perf_counter() - request_started)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(post(session, i) for i in range(1, updates + 1)))
+
+    return durations, statuses
+
+
+async def main(updates: int, concurrency: int, rate: int, invalid_rate: float, port: int) -> None:
+    bot = telebot.TeleBot(token='123456:benchmark', threaded=False)
+
+    runner = web.AppRunner(createWebhookApp(bot, BOT_NAME), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    try:
+        started = time.perf_counter()
+        durations, statuses = (await postUpdates(
+            f'http://127.0.0.1:{port}/{BOT_NAME}', getSecretToken(bot), updates, concurrency, rate, invalid_rate,
+        ))
+        reportRate('posted updates', updates, time.perf_counter() - started)
+        report('request', durations)
+    finally:
+        await runner.cleanup()
+
+    print(f'Answers: {statuses}')
+    print(f'Webhook: {webhook_metrics}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Posts synthetic updates to a local webhook.')
+    parser.add_argument('--updates', type=int, default=10000, help='posted updates')
+    parser.add_argument('--concurrency', type=int, default=100, help='requests at once')
+    parser.add_argument('--rate', type=int, default=0, help='updates per second, 0 - as fast as possible')
+    parser.add_argument('--invalid-rate', type=float, default=0.0, help='part of the updates with a wrong secret')
+    parser.add_argument('--port', type=int, default=8090, help='port of the local webhook')
+    args = parser.parse_args()
+
+    # The webhook is served in the runtime loop like in production, the stream publishing needs its clients
+    runtime.start()
+    try:
+        runtime.run(main(args.updates, args.concurrency, args.rate, args.invalid_rate, args.port))
+    finally:
+        runtime.stop()
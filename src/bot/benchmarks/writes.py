@@ -0,0 +1,150 @@
+'''Load test of the cleaning writes.
+
+Concurrent transactions create cleanings by the statement of `addCleaning`, `--fail-rate` of them raise
+after the insert and must be rolled back. Then several workers try to take every created cleaning at once,
+by the statement of `acceptCleaning`, and exactly one of them must succeed. The same number of attempts
+to refuse every cleaning follow, by the statement of `refuseCleaning`, and again exactly one must succeed.
+The test fails if a work is left without its cleaning details (or the other way round),
+is taken or refused other than once, or stays assigned after the refusal.
+Must be run on a local copy of the database, the created cleanings are deleted at the end:
+
+    python -m src.bot.benchmarks.writes --seed 1000 --cleanings 5000 --concurrency 20
+'''
+
+from ..db import connect, transaction, closePool, getPoolMetrics
+from ..main_bot.queries import ADD_CLEANING_QUERY
+from ..work_bot.queries import TAKE_CLEANING_QUERY, FREE_CLEANING_QUERY
+from ..work_bot.feed import getWorkWorkers
+from ..query_audit import seedDatabase, getSampleArguments
+from .timing import reportRate
+
+import sys
+import time
+import random
+import asyncio
+import argparse
+import datetime
+
+
+ORPHANS_QUERY = '''
+    SELECT
+        (SELECT COUNT(*) FROM "userWorks" w
+            WHERE w."workID" = 1 AND NOT EXISTS (SELECT 1 FROM cleaning c WHERE c."workID" = w.id)) AS works,
+        (SELECT COUNT(*) FROM cleaning c
+            WHERE NOT EXISTS (SELECT 1 FROM "userWorks" w WHERE w.id = c."workID")) AS details
+'''
+
+
+class RolledBack(Exception):
+    "Is raised inside a transaction to roll it back."
+
+
+async def createCleaning(user_id: int, property_id: int, fail_rate: float) -> int | None:
+    "Returns the id of the created work, `None` if the transaction was rolled back."
+
+    now = datetime.datetime.now
+    try:
+        async with transaction() as uow:
+            work_id, _ = (await uow.fetchrow(
+                ADD_CLEANING_QUERY,
+                user_id, property_id, 1, now().date(), '10:00-12:00', 'benchmark', now(), 1,
+            ))
+            if random.random() < fail_rate:
+                raise RolledBack
+    except RolledBack:
+        return None
+    return work_id
+
+async def takeCleaning(worker_id: int, work_id: int) -> bool:
+    async with transaction() as uow:
+        return (await uow.fetchval(TAKE_CLEANING_QUERY, worker_id, datetime.datetime.now(), work_id)) is not None
+
+async def refuseCleaning(worker_id: int, work_id: int) -> bool:
+    async with transaction() as uow:
+        refused = (await uow.execute(FREE_CLEANING_QUERY, work_id, worker_id)) == 'UPDATE 1'
+        if refused:
+            await getWorkWorkers(uow, work_id)
+    return refused
+
+
+async def runConcurrently(coros, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros))
+
+
+async def main(seed: int, cleanings: int, concurrency: int, racers: int, fail_rate: float) -> int:
+    conn = await connect()
+    try:
+        if seed:
+            await seedDatabase(conn, seed)
+        arguments = (await getSampleArguments(conn))
+        user_id, worker_id = arguments['user_id'], arguments['worker_id']
+        property_id = (await conn.fetchval('SELECT id FROM properties WHERE "userID" = $1 LIMIT 1', user_id))
+        orphans_before = (await conn.fetchrow(ORPHANS_QUERY))
+
+        started = time.perf_counter()
+        created = (await runConcurrently(
+            (createCleaning(user_id, property_id, fail_rate) for _ in range(cleanings)),
+            concurrency,
+        ))
+        reportRate('created cleanings', cleanings, time.perf_counter() - started)
+        work_ids = [work_id for work_id in created if work_id is not None]
+
+        started = time.perf_counter()
+        taken = (await runConcurrently(
+            (takeCleaning(worker_id, work_id) for work_id in work_ids for _ in range(racers)),
+            concurrency,
+        ))
+        reportRate('take attempts', len(taken), time.perf_counter() - started)
+
+        started = time.perf_counter()
+        refused = (await runConcurrently(
+            (refuseCleaning(worker_id, work_id) for work_id in work_ids for _ in range(racers)),
+            concurrency,
+        ))
+        reportRate('refuse attempts', len(refused), time.perf_counter() - started)
+        assigned = (await conn.fetchval(
+            'SELECT COUNT(*) FROM "userWorks" WHERE id = ANY($1) AND ("workerID" IS NOT NULL OR "acceptanceConfirmed")',
+            work_ids,
+        ))
+
+        orphans = (await conn.fetchrow(ORPHANS_QUERY))
+        leaked = (await conn.fetchval(
+            'SELECT COUNT(*) FROM "userWorks" WHERE "userID" = $1 AND comment = $2 AND NOT (id = ANY($3))',
+            user_id, 'benchmark', work_ids,
+        ))
+        async with conn.transaction():
+            await conn.execute('DELETE FROM cleaning WHERE "workID" = ANY($1)', work_ids)
+            await conn.execute('DELETE FROM "userWorks" WHERE id = ANY($1)', work_ids)
+    finally:
+        await conn.close()
+        await closePool()
+
+    # Every work must have exactly one successful attempt among its racers
+    wrongly_taken = sum(sum(taken[i*racers:(i+1)*racers]) != 1 for i in range(len(work_ids)))
+    wrongly_refused = sum(sum(refused[i*racers:(i+1)*racers]) != 1 for i in range(len(work_ids)))
+    new_orphans = {name: orphans[name] - orphans_before[name] for name in ('works', 'details')}
+    print(f'Committed: {len(work_ids)}, rolled back: {cleanings - len(work_ids)}, leaked rolled back rows: {leaked}')
+    print(f'Orphaned works: {new_orphans["works"]}, orphaned details: {new_orphans["details"]}')
+    print(f'Works not taken exactly once: {wrongly_taken}')
+    print(f'Works not refused exactly once: {wrongly_refused}, assigned after the refusal: {assigned}')
+    print(f'Pool: {getPoolMetrics()}')
+
+    return 1 if any(new_orphans.values()) or leaked or wrongly_taken or wrongly_refused or assigned else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the write throughput and checks the orphaned rows.')
+    parser.add_argument('--seed', type=int, default=0, help='generate this many cleanings first')
+    parser.add_argument('--cleanings', type=int, default=2000, help='created cleanings')
+    parser.add_argument('--concurrency', type=int, default=20, help='transactions at once')
+    parser.add_argument('--racers', type=int, default=3, help='attempts to take and to refuse every cleaning at once')
+    parser.add_argument('--fail-rate', type=float, default=0.1, help='part of the creations which are rolled back')
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.seed, args.cleanings, args.concurrency, args.racers, args.fail_rate)))
@@ -0,0 +1,56 @@
+import time
+import collections
+
+
+class LRUCache:
+    '''In-process cache with a size limit and an expiration time of the values.
+    The least recently used values are evicted first.
+
+    Usage:
+        cache = LRUCache(maxsize=1000, ttl=60*60)
+        cache.set(key, value)
+        value = cache.get(key) # None if missing or expired
+    '''
+
+    def __init__(self, maxsize: int=1000, ttl: float=None):
+        '''
+        :param maxsize: maximum number of the stored values.
+        :param ttl: lifetime (in seconds) of a value, `None` - values don't expire.
+        '''
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        item = self.data.get(key)
+        if item is None or (item[1] is not None and item[1] < time.monotonic()):
+            if item is not None:
+                del self.data[key]
+            self.misses += 1
+            return default
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, key, value, ttl: float=None) -> None:
+        "`ttl` overrides the lifetime of the cache for this value."
+
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        self.data[key] = (value, expires)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        self.data.pop(key, None)
+
+    def clear(self) -> None:
+        self.data.clear()
+
+    def stats(self) -> dict:
+        return {'size': len(self.data), 'hits': self.hits, 'misses': self.misses}
@@ -1,15 +1,59 @@
 # The code from this repository is taken as a basis: https://github.com/flymedllva/Telebot-Calendar/
 # Only some changes have been made to the names of the buttons and the behavior of the functions.
 
+from .cache import LRUCache
+from .tg_api.bot import AsyncBot
+
 import datetime
 import calendar
+import functools
 
-from telebot import TeleBot
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from telebot_calendar import Calendar as CalendarBase, CallbackData, RUSSIAN_LANGUAGE
 
 
+# Serialized keyboards by (name, year, month, today, start_func, redis_data_key).
+# The current day is marked in a keyboard, so the keyboards of a day expire at midnight.
+keyboards_cache = LRUCache(maxsize=1000)
+
+
+@functools.lru_cache(maxsize=256)
+def getMonthGrid(year: int, month: int) -> tuple:
+    "Returns the weeks of a month, the days of the other months are 0."
+
+    return tuple(tuple(week) for week in calendar.monthcalendar(year, month))
+
+def getSecondsUntilMidnight(now: datetime.datetime) -> float:
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return (midnight - now).total_seconds()
+
+
 class Calendar(CalendarBase):
+    def render_calendar(
+        self,
+        name: str = "calendar",
+        year: int = None,
+        month: int = None,
+        start_func: int = None,
+        redis_data_key: str = None,
+    ) -> str:
+        """
+        Returns the serialized keyboard of `create_calendar`, it is built once per day.
+        """
+
+        now_day = datetime.datetime.now()
+        year = year or now_day.year
+        month = month or now_day.month
+
+        key = (name, year, month, now_day.date(), start_func, redis_data_key)
+        keyboard = keyboards_cache.get(key)
+        if keyboard is None:
+            keyboard = self.create_calendar(
+                name=name, year=year, month=month, start_func=start_func, redis_data_key=redis_data_key, now_day=now_day,
+            ).to_json()
+            keyboards_cache.set(key, keyboard, ttl=getSecondsUntilMidnight(now_day))
+        return keyboard
+
     def create_calendar(
         self,
         name: str = "calendar",
@@ -17,6 +61,7 @@ class Calendar(CalendarBase):
         month: int = None,
         start_func: int = None,
         redis_data_key: str = None,
+        now_day: datetime.datetime = None,
     ) -> InlineKeyboardMarkup:
         """
         Create a built in inline keyboard with calendar
@@ -24,10 +69,11 @@ class Calendar(CalendarBase):
         :param name:
         :param year: Year to use in the calendar if you are not using the current year.
         :param month: Month to use in the calendar if you are not using the current month.
+        :param now_day: the current time, the day is marked in the calendar.
         :return: Returns an InlineKeyboardMarkup object with a calendar.
         """
 
-        now_day = datetime.datetime.now()
+        now_day = now_day or datetime.datetime.now()
 
         if year is None:
             year = now_day.year
@@ -54,15 +100,13 @@ class Calendar(CalendarBase):
             ]
         )
 
-        for week in calendar.monthcalendar(year, month):
+        is_current_month = (now_day.year, now_day.month) == (year, month)
+        for week in getMonthGrid(year, month):
             row = list()
             for day in week:
                 if day == 0:
                     row.append(InlineKeyboardButton(" ", callback_data=data_ignore))
-                elif (
-                    f"{now_day.day}.{now_day.month}.{now_day.year}"
-                    == f"{day}.{month}.{year}"
-                ):
+                elif is_current_month and day == now_day.day:
                     row.append(
                         InlineKeyboardButton(
                             f"({day})",
@@ -98,9 +142,9 @@ class Calendar(CalendarBase):
 
         return keyboard
 
-    def calendar_query_handler(
+    async def calendar_query_handler(
         self,
-        bot: TeleBot,
+        bot: AsyncBot,
         call: CallbackQuery,
         name: str,
         action: str,
@@ -115,7 +159,7 @@ class Calendar(CalendarBase):
         This method should be called inside CallbackQueryHandler.
 
 
-        :param bot: The object of the bot CallbackQueryHandler
+        :param bot: The awaitable methods of the bot
         :param call: CallbackQueryHandler data
         :param day:
         :param month:
@@ -127,20 +171,19 @@ class Calendar(CalendarBase):
 
         current = datetime.datetime(int(year), int(month), 1)
         if action == "IGNORE":
-            bot.answer_callback_query(callback_query_id=call.id)
+            await bot.answer_callback_query(callback_query_id=call.id)
             return False, None
         elif action == "DAY":
-            bot.delete_message(
+            await bot.delete_message(
                 chat_id=call.message.chat.id, message_id=call.message.message_id
             )
             return datetime.datetime(int(year), int(month), int(day))
         elif action == "PREVIOUS-MONTH":
             preview_month = current - datetime.timedelta(days=1)
-            bot.edit_message_text(
-                text=call.message.text,
+            await bot.edit_message_reply_markup(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                reply_markup=self.create_calendar(
+                reply_markup=self.render_calendar(
                     name=name,
                     year=int(preview_month.year),
                     month=int(preview_month.month),
@@ -151,11 +194,10 @@ class Calendar(CalendarBase):
             return None
         elif action == "NEXT-MONTH":
             next_month = current + datetime.timedelta(days=31)
-            bot.edit_message_text(
-                text=call.message.text,
+            await bot.edit_message_reply_markup(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                reply_markup=self.create_calendar(
+                reply_markup=self.render_calendar(
                     name=name, year=int(next_month.year), month=int(next_month.month),
                     start_func=start_func, redis_data_key=redis_data_key,
                 ),
@@ -163,24 +205,23 @@ class Calendar(CalendarBase):
             return None
         elif action == "MONTHS": pass
         elif action == "MONTH":
-            bot.edit_message_text(
-                text=call.message.text,
+            await bot.edit_message_reply_markup(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                reply_markup=self.create_calendar(
+                reply_markup=self.render_calendar(
                     name=name, year=int(year), month=int(month), 
                     start_func=start_func, redis_data_key=redis_data_key,
                 ),
             )
             return None
         elif action == "CANCEL":
-            bot.delete_message(
+            await bot.delete_message(
                 chat_id=call.message.chat.id, message_id=call.message.message_id
             )
             return "CANCEL", None
         else:
-            bot.answer_callback_query(callback_query_id=call.id, text="ERROR!")
-            bot.delete_message(
+            await bot.answer_callback_query(callback_query_id=call.id, text="ERROR!")
+            await bot.delete_message(
                 chat_id=call.message.chat.id, message_id=call.message.message_id
             )
             return None
\ No newline at end of file
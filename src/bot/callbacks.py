@@ -0,0 +1,222 @@
+from .storage import getRedisConnection
+from .exceptions import NotFound
+
+import base64
+import secrets
+
+
+# Callback data format (version 1):
+#   "1" + base64url(handler, flags, arguments)  - inline callback
+#   "1~" + token                                 - callback which is too long for Telegram,
+#                                                  the inline form is stored in Redis by the token
+# The tables below are append-only: the index of a name is its code in already sent buttons.
+CALLBACK_VERSION = '1'
+CALLBACK_OVERFLOW = '~'
+CALLBACK_MAX_LENGTH = 64 # Telegram limit for callback_data
+CALLBACK_OVERFLOW_TTL = 60*60*24*30
+
+HANDLERS = (
+    'back', 'start',
+    'toolsMenu', 'cleaningMenu', 'addCleaning', 'cleaningList', 'cleaningCard', 'removeCleaning',
+    'propertiesMenu', 'addProperty', 'propertiesList', 'propertyCard', 'removeProperty',
+    'workersMenu', 'addWorker', 'createWorkerAddLink', 'workersList', 'workerCard', 'removeUserWorker',
+    'acceptCleaning', 'refuseCleaning', 'completeCleaning', 'confirmAcceptance',
+)
+ARGUMENTS = (
+    'user_id', 'work_id', 'worker_id', 'property_id', 'page', 'only_completed', 'status',
+    'confirmed', 'redis_data_key', 'worker_data_key', 'after', 'before',
+)
+
+INLINE_NAME = 0xFF # handler is not in the table, its name follows
+INLINE_ARGUMENT = 0x1F # argument is not in the table, its name follows
+
+FLAG_CALL_ID = 0b1 # the handler gets the id of the callback query as `call_id`
+
+TYPE_NONE, TYPE_FALSE, TYPE_TRUE, TYPE_INT, TYPE_STR = range(5)
+
+
+def _packVarint(value: int) -> bytes:
+    result = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+def _unpackVarint(data: bytes, position: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+def _packString(value: str) -> bytes:
+    value = value.encode('utf-8')
+    return _packVarint(len(value)) + value
+
+def _unpackString(data: bytes, position: int) -> tuple[str, int]:
+    length, position = _unpackVarint(data, position)
+    return data[position:position + length].decode('utf-8'), position + length
+
+
+def encodeCallback(handler: str, /, call_id: bool=False, **kwargs) -> str:
+    '''Packs a handler call into the inline callback data form. The result may exceed Telegram limit,
+    use `packCallback` when the arguments are not known to be short.
+
+    :param handler: name of the handler function.
+    :param call_id: if `True`, the handler gets the id of the callback query as `call_id`.
+    :param kwargs: handler arguments (`int`, `bool`, `str` or `None`).
+    '''
+
+    data = bytearray()
+
+    if handler in HANDLERS:
+        data.append(HANDLERS.index(handler))
+    else:
+        data.append(INLINE_NAME)
+        data += _packString(handler)
+
+    data.append(FLAG_CALL_ID if call_id else 0)
+
+    for key, value in kwargs.items():
+        if value is None: value_type = TYPE_NONE
+        elif value is False: value_type = TYPE_FALSE
+        elif value is True: value_type = TYPE_TRUE
+        elif isinstance(value, int): value_type = TYPE_INT
+        elif isinstance(value, str): value_type = TYPE_STR
+        else: raise TypeError(f'Unsupported callback argument type: {key}={value!r}')
+
+        if key in ARGUMENTS:
+            data.append(ARGUMENTS.index(key) << 3 | value_type)
+        else:
+            data.append(INLINE_ARGUMENT << 3 | value_type)
+            data += _packString(key)
+
+        if value_type == TYPE_INT:
+            data += _packVarint(value << 1 if value >= 0 else (-value << 1) - 1) # zigzag
+        elif value_type == TYPE_STR:
+            data += _packString(value)
+
+    return CALLBACK_VERSION + base64.urlsafe_b64encode(bytes(data)).decode().rstrip('=')
+
+def decodeCallback(callback_data: str) -> dict:
+    '''Unpacks the inline callback data form.
+    Returns `{'handler': ..., 'call_id': ..., 'kwargs': {...}}`.'''
+
+    encoded = callback_data[len(CALLBACK_VERSION):]
+    data = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+
+    position = 0
+    if data[position] == INLINE_NAME:
+        handler, position = _unpackString(data, position + 1)
+    else:
+        handler = HANDLERS[data[position]]
+        position += 1
+
+    flags = data[position]
+    position += 1
+
+    kwargs = dict()
+    while position < len(data):
+        header = data[position]
+        position += 1
+
+        key_index, value_type = header >> 3, header & 0b111
+        if key_index == INLINE_ARGUMENT:
+            key, position = _unpackString(data, position)
+        else:
+            key = ARGUMENTS[key_index]
+
+        if value_type == TYPE_NONE: value = None
+        elif value_type == TYPE_FALSE: value = False
+        elif value_type == TYPE_TRUE: value = True
+        elif value_type == TYPE_INT:
+            value, position = _unpackVarint(data, position)
+            value = (value >> 1) if not value & 1 else -((value + 1) >> 1)
+        elif value_type == TYPE_STR:
+            value, position = _unpackString(data, position)
+        else:
+            raise ValueError(f'Unknown callback value type: {value_type}')
+
+        kwargs[key] = value
+
+    return {
+        'handler': handler,
+        'call_id': bool(flags & FLAG_CALL_ID),
+        'kwargs': kwargs,
+    }
+
+
+def isPackedCallback(callback_data: str) -> bool:
+    return callback_data.startswith(CALLBACK_VERSION)
+
+async def packCallback(handler: str, /, call_id: bool=False, **kwargs) -> str:
+    '''Packs a handler call into callback data.
+    If the packed call doesn't fit Telegram limit, it is stored in Redis and the callback data gets a short token.
+
+    Usage:
+        button_obj(text='🧴 Карточка клининга', callback_data=await packCallback('cleaningCard', work_id=1, call_id=True))
+
+    :param handler: name of the handler function.
+    :param call_id: if `True`, the handler gets the id of the callback query as `call_id`.
+    :param kwargs: handler arguments (`int`, `bool`, `str` or `None`).
+    '''
+
+    callback_data = encodeCallback(handler, call_id=call_id, **kwargs)
+    if len(callback_data) <= CALLBACK_MAX_LENGTH:
+        return callback_data
+
+    token = secrets.token_urlsafe(12)
+    redis = (await getRedisConnection())
+    await redis.set(f"callback={token}", callback_data, ex=CALLBACK_OVERFLOW_TTL)
+
+    return CALLBACK_VERSION + CALLBACK_OVERFLOW + token
+
+async def unpackCallback(callback_data: str) -> dict:
+    '''Unpacks callback data made by `packCallback`.
+    Returns `{'handler': ..., 'call_id': ..., 'kwargs': {...}}`.'''
+
+    if callback_data.startswith(CALLBACK_VERSION + CALLBACK_OVERFLOW):
+        token = callback_data[len(CALLBACK_VERSION + CALLBACK_OVERFLOW):]
+        redis = (await getRedisConnection())
+        stored = (await redis.get(f"callback={token}"))
+        if stored is None:
+            raise NotFound('Callback data has expired')
+        callback_data = stored.decode()
+
+    return decodeCallback(callback_data)
+
+def parseLegacyCallback(callback_data: str) -> dict | None:
+    '''Parses the callback data of the buttons which were sent before the packed format:
+    `start_func-<handler>-<arguments>-<parameters>` and `set_redis_data-<key>-<arguments>-start_func=<handler>`.
+    Returns `{'handler': ..., 'call_id': ..., 'arguments': '...'}` with the raw arguments string,
+    or `None` if the callback doesn't start anything.'''
+
+    data = callback_data.split('-')
+    command = data[0]
+
+    if command == 'start_func' and len(data) > 1:
+        parameters = data[3].split('&') if len(data) > 3 else []
+        return {
+            'handler': data[1],
+            'call_id': 'call_id=True' in parameters,
+            'arguments': data[2] if len(data) > 2 else '',
+        }
+
+    if command == 'set_redis_data' and len(data) > 3:
+        # The values were saved to the draft, now the handler gets them as arguments
+        parameters = dict(p.partition('=')[::2] for p in data[3].split('&'))
+        if 'start_func' in parameters:
+            return {
+                'handler': parameters['start_func'],
+                'call_id': False,
+                'arguments': f'redis_data_key={data[1]}&{data[2]}',
+            }
+
+    return None
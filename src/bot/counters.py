@@ -0,0 +1,48 @@
+'''Aggregates of the menus.
+They are kept in summary tables by the triggers of migration `0005_counters`,
+so a menu reads a single row instead of counting the source tables.'''
+
+
+USER_COUNTERS_QUERY = '''
+    SELECT properties, workers, "activeWorkers"
+    FROM "userCounters"
+    WHERE "userID" = $1
+'''
+
+USER_WORK_COUNTERS_QUERY = '''
+    SELECT scheduled, confirmed, completed
+    FROM "userWorkCounters"
+    WHERE "userID" = $1 AND "workID" = $2
+'''
+
+WORKER_WORK_COUNTERS_QUERY = '''
+    SELECT accepted
+    FROM "workerWorkCounters"
+    WHERE "workerID" = $1 AND "workID" = $2
+'''
+
+
+async def getUserCounters(conn, user_id: int) -> dict:
+    "Returns the numbers of properties, workers and active workers of a landlord."
+
+    counters = (await conn.fetchrow(USER_COUNTERS_QUERY, user_id))
+    return dict(counters) if counters else {'properties': 0, 'workers': 0, 'activeWorkers': 0}
+
+async def getUserWorkCounters(conn, user_id: int, work_id: int) -> dict:
+    "Returns the numbers of scheduled, confirmed and completed works of a landlord."
+
+    counters = (await conn.fetchrow(USER_WORK_COUNTERS_QUERY, user_id, work_id))
+    return dict(counters) if counters else {'scheduled': 0, 'confirmed': 0, 'completed': 0}
+
+async def getWorkerWorkCounters(conn, worker_id: int, work_id: int) -> dict:
+    "Returns the number of accepted uncompleted works of a worker."
+
+    counters = (await conn.fetchrow(WORKER_WORK_COUNTERS_QUERY, worker_id, work_id))
+    return dict(counters) if counters else {'accepted': 0}
+
+
+async def reconcileCounters(conn) -> int:
+    '''Recounts the summary tables from the source tables.
+    Returns the number of corrected rows, which must be 0 unless the triggers were bypassed.'''
+
+    return await conn.fetchval('SELECT "reconcileCounters"()')
@@ -1,10 +1,27 @@
 from .config import DB
 
+import time
+import weakref
 import asyncio
 import asyncpg
+import contextlib
+
+
+# Pool sizing and lifetime limits. Every key can be overridden from the `DB` config dict.
+POOL_MIN_SIZE = DB.get('pool_min_size', 2)
+POOL_MAX_SIZE = DB.get('pool_max_size', 10)
+POOL_MAX_QUERIES = DB.get('pool_max_queries', 50000)
+POOL_MAX_INACTIVE_LIFETIME = DB.get('pool_max_inactive_lifetime', 300.0)
+POOL_ACQUIRE_TIMEOUT = DB.get('pool_acquire_timeout', 10.0)
+POOL_COMMAND_TIMEOUT = DB.get('pool_command_timeout', 30.0)
+# Connections idle for longer than this are pinged before being handed out
+POOL_HEALTH_CHECK_IDLE = DB.get('pool_health_check_idle', 30.0)
 
 
 async def connect():
+    '''Opens a standalone connection.
+    Handlers must use `acquire()` instead, this one is left for one-off scripts.'''
+
     conn = await asyncpg.connect(
         user=DB['user'],
         password=DB['password'],
@@ -15,6 +32,190 @@ async def connect():
     return conn
 
 
+pool = None
+pool_loop = None
+pool_locks = weakref.WeakKeyDictionary() # loop -> lock of the pool creation
+connections_last_used = dict() # server pid -> time of the last release
+pool_metrics = {
+    'acquired': 0,
+    'in_use': 0,
+    'waiters': 0,
+    'acquire_time_total': 0.0,
+    'acquire_time_max': 0.0,
+    'health_check_failures': 0,
+    'committed': 0,
+    'rolled_back': 0,
+}
+
+
+async def getPool() -> asyncpg.Pool:
+    '''Returns the process-wide connection pool, creating it on the first call.
+    The pool is bound to the event loop it was created in, so it is recreated if the loop changes.'''
+
+    global pool, pool_loop
+
+    loop = asyncio.get_running_loop()
+    if pool is not None and pool_loop is loop:
+        return pool
+
+    # The concurrent first calls wait for one pool instead of creating their own
+    async with pool_locks.setdefault(loop, asyncio.Lock()):
+        if pool is None or pool_loop is not loop:
+            if pool is not None:
+                # The loop of the previous pool is gone, its connections can only be dropped
+                try:
+                    pool.terminate()
+                except Exception:
+                    pass
+                connections_last_used.clear()
+
+            pool = await asyncpg.create_pool(
+                user=DB['user'],
+                password=DB['password'],
+                database=DB['database'],
+                host=DB['host'],
+                min_size=POOL_MIN_SIZE,
+                max_size=POOL_MAX_SIZE,
+                max_queries=POOL_MAX_QUERIES,
+                max_inactive_connection_lifetime=POOL_MAX_INACTIVE_LIFETIME,
+                command_timeout=POOL_COMMAND_TIMEOUT,
+            )
+            pool_loop = loop
+
+    return pool
+
+async def closePool() -> None:
+    "Gracefully closes all the pool connections."
+
+    global pool, pool_loop
+    if pool is not None:
+        await pool.close()
+        pool = None
+        pool_loop = None
+        connections_last_used.clear()
+
+
+async def _isHealthy(conn) -> bool:
+    "Pings a connection that has been idle for too long."
+
+    last_used = connections_last_used.get(conn.get_server_pid())
+    if last_used is not None and time.monotonic() - last_used < POOL_HEALTH_CHECK_IDLE:
+        return True
+
+    try:
+        await conn.execute('SELECT 1', timeout=POOL_ACQUIRE_TIMEOUT)
+    except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError):
+        pool_metrics['health_check_failures'] += 1
+        return False
+    return True
+
+@contextlib.asynccontextmanager
+async def acquire():
+    '''Takes a healthy connection from the pool and returns it back on exit.
+
+    Usage:
+        async with acquire() as conn:
+            await conn.fetch(...)
+    '''
+
+    db_pool = await getPool()
+
+    pool_metrics['waiters'] += 1
+    started = time.perf_counter()
+    try:
+        for attempt in range(2):
+            conn = await db_pool.acquire(timeout=POOL_ACQUIRE_TIMEOUT)
+            healthy = False
+            try:
+                healthy = (await _isHealthy(conn))
+            finally:
+                if not healthy:
+                    # The broken connection is dropped, the pool opens a new one on the next acquire.
+                    # It is returned even if the check is interrupted, so the pool doesn't lose it.
+                    connections_last_used.pop(conn.get_server_pid(), None)
+                    conn.terminate()
+                    await db_pool.release(conn)
+            if healthy:
+                break
+        else:
+            raise asyncpg.InterfaceError('Unable to acquire a healthy connection from the pool')
+    finally:
+        pool_metrics['waiters'] -= 1
+
+    acquire_time = time.perf_counter() - started
+    pool_metrics['acquired'] += 1
+    pool_metrics['acquire_time_total'] += acquire_time
+    pool_metrics['acquire_time_max'] = max(pool_metrics['acquire_time_max'], acquire_time)
+    pool_metrics['in_use'] += 1
+    try:
+        yield conn
+    finally:
+        pool_metrics['in_use'] -= 1
+        connections_last_used[conn.get_server_pid()] = time.monotonic()
+        await db_pool.release(conn)
+
+
+class UnitOfWork:
+    '''Statements of one write operation, they are committed together or not at all.
+    Every query is prepared once per connection by the statement cache of asyncpg,
+    so the repeated writes skip the parsing and planning.'''
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def execute(self, query: str, *args) -> str:
+        return await self.conn.execute(query, *args)
+
+    async def executemany(self, query: str, args: list) -> None:
+        "Runs the statement for every set of the arguments in one round-trip."
+
+        await self.conn.executemany(query, args)
+
+    async def fetch(self, query: str, *args) -> list:
+        return await self.conn.fetch(query, *args)
+
+    async def fetchrow(self, query: str, *args):
+        return await self.conn.fetchrow(query, *args)
+
+    async def fetchval(self, query: str, *args):
+        return await self.conn.fetchval(query, *args)
+
+@contextlib.asynccontextmanager
+async def transaction(isolation: str='read_committed'):
+    '''Runs the writes of the block in one transaction, which is rolled back if the block raises.
+
+    Usage:
+        async with transaction() as uow:
+            await uow.execute(...)
+            await uow.execute(...)
+    '''
+
+    async with acquire() as conn:
+        try:
+            async with conn.transaction(isolation=isolation):
+                yield UnitOfWork(conn)
+        except BaseException:
+            pool_metrics['rolled_back'] += 1
+            raise
+        pool_metrics['committed'] += 1
+
+
+def getPoolMetrics() -> dict:
+    "Returns a snapshot of the pool usage metrics."
+
+    metrics = dict(pool_metrics)
+    metrics['acquire_time_avg'] = (
+        metrics['acquire_time_total'] / metrics['acquired'] if metrics['acquired'] else 0.0
+    )
+    if pool is not None:
+        metrics['size'] = pool.get_size()
+        metrics['idle'] = pool.get_idle_size()
+    else:
+        metrics['size'] = metrics['idle'] = 0
+
+    return metrics
+
+
 asyncpg_errors = {
     'UniqueViolationError' : asyncpg.exceptions.UniqueViolationError,
-}
\ No newline at end of file
+}
@@ -0,0 +1,111 @@
+from .exceptions import NotFound
+
+import inspect
+
+
+def parseBool(value: str) -> bool:
+    if value in ('True', 'true', '1'): return True
+    if value in ('False', 'false', '0'): return False
+    raise ValueError(f'Invalid boolean value: {value}')
+
+
+# Converters of the callback argument strings by the parameter annotations
+CONVERTERS = {
+    int: int,
+    bool: parseBool,
+    str: str,
+}
+
+
+class Handler:
+    "A function which can be started from a callback query, with the converters of its arguments."
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+
+        self.converters = dict()
+        for parameter in inspect.signature(func).parameters.values():
+            annotation = parameter.annotation
+            self.converters[parameter.name] = CONVERTERS.get(annotation, str)
+
+    def parseArguments(self, arguments: str) -> dict:
+        '''Converts callback arguments string (`work_id=1&status="accepted"`) to the function kwargs.
+
+        :param arguments: `&`-separated `key=value` pairs, string values may be quoted.
+        '''
+
+        kwargs = dict()
+        for argument in arguments.split('&'):
+            if argument == '':
+                continue
+
+            key, _, value = argument.partition('=')
+            if key not in self.converters:
+                raise ValueError(f'Unknown argument of {self.name}: {key}')
+
+            value = value.strip('"')
+            kwargs[key] = None if value == 'None' else self.converters[key](value)
+
+        return kwargs
+
+    def checkArguments(self, kwargs: dict) -> dict:
+        '''Checks the already typed arguments of a packed callback against the function signature.
+
+        :param kwargs: decoded callback arguments.
+        '''
+
+        for key, value in kwargs.items():
+            if key not in self.converters:
+                raise ValueError(f'Unknown argument of {self.name}: {key}')
+            if isinstance(value, str) and self.converters[key] is not str:
+                kwargs[key] = self.converters[key](value)
+
+        return kwargs
+
+
+class Dispatcher:
+    '''Table of the functions which can be started from callback queries.
+    The table is filled once at import by the `handler` decorator, callbacks can't start anything else.
+
+    Usage:
+        dispatcher = Dispatcher()
+
+        @dispatcher.handler()
+        @exceptions_catcher()
+        async def cleaningCard(user_id: int, work_id: int) -> None: ...
+
+        await dispatcher.dispatch('cleaningCard', user_id=1, work_id=2)
+    '''
+
+    def __init__(self):
+        self.handlers = dict()
+
+    def handler(self):
+        "Registers a function in the dispatch table."
+
+        def container(func):
+            self.handlers[func.__name__] = Handler(func)
+            return func
+        return container
+
+    def getHandler(self, name: str) -> Handler:
+        handler = self.handlers.get(name)
+        if handler is None:
+            raise NotFound(name)
+        return handler
+
+    def parseArguments(self, name: str, arguments: str) -> dict:
+        "Parses the callback arguments string of the handler."
+
+        return self.getHandler(name).parseArguments(arguments)
+
+    def checkArguments(self, name: str, kwargs: dict) -> dict:
+        "Checks the decoded arguments of a packed callback of the handler."
+
+        return self.getHandler(name).checkArguments(kwargs)
+
+    async def dispatch(self, name: str, *args, **kwargs):
+        "Calls the handler by its name."
+
+        return await self.getHandler(name).func(*args, **kwargs)
@@ -0,0 +1,155 @@
+from .storage import getRedisConnection, getScript
+
+import json
+import secrets
+import datetime
+
+
+DRAFT_TTL = 60*10
+DRAFT_ID_LENGTH = 6 # bytes of a draft id, 8 characters in the callback data
+
+# Marks an existing draft, so a draft with all the fields unset is not removed by Redis as an empty hash
+DRAFT_MARKER = '_draft'
+# Marks a draft which is being saved by its flow
+DRAFT_TAKEN = '_taken'
+
+
+# Field codecs: (dump to str, load from str)
+INT = (str, int)
+TEXT = (str, str)
+DATE = (datetime.date.isoformat, datetime.date.fromisoformat)
+JSON = (json.dumps, json.loads)
+INT_LIST = (
+    lambda values: ','.join(str(int(v)) for v in values if v is not None), # a missing value is skipped
+    lambda value: [int(v) for v in value.split(',') if v],
+)
+
+
+# Creates a draft if the key is free. KEYS[1] - draft; ARGV[1] - ttl, ARGV[2:] - field/value pairs
+CREATE_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+'''
+
+# Changes the fields of an existing draft and returns the whole draft, nothing if it has expired.
+# KEYS[1] - draft; ARGV[1] - ttl, ARGV[2] - number of the set pairs, then field/value pairs and the unset fields
+UPDATE_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local pairs_end = 2 + tonumber(ARGV[2]) * 2
+if pairs_end > 2 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 3, pairs_end))
+end
+if #ARGV > pairs_end then
+    redis.call('HDEL', KEYS[1], unpack(ARGV, pairs_end + 1))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return redis.call('HGETALL', KEYS[1])
+'''
+
+# Marks a draft as taken and returns it. Only one of the concurrent callers gets the draft.
+# KEYS[1] - draft; ARGV[1] - taken marker
+TAKE_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 or redis.call('HSETNX', KEYS[1], ARGV[1], 1) == 0 then
+    return false
+end
+return redis.call('HGETALL', KEYS[1])
+'''
+
+
+class DraftStore:
+    '''Drafts of a multi-step flow, every draft is a Redis hash with a field per step.
+    A step changes only its fields and gets the whole draft back in one call,
+    a field which is not set yet is `None`.
+
+    Usage:
+        cleaning_drafts = DraftStore('cleaning', property_id=INT, date=DATE)
+        draft_id = await cleaning_drafts.create(property_id=1)
+        draft = await cleaning_drafts.update(draft_id, date=datetime.date.today())
+        draft = await cleaning_drafts.take(draft_id) # when the flow is being completed
+        ... # save the draft
+        await cleaning_drafts.delete(draft_id) # or `release` if it is not saved
+    '''
+
+    def __init__(self, name: str, ttl: int=DRAFT_TTL, **fields: tuple[callable, callable]):
+        '''
+        :param name: name of the flow, a part of the keys.
+        :param ttl: lifetime (in seconds) of a draft since its last change.
+        :param fields: codec of every field (`INT`, `TEXT`, `DATE`, `JSON`, `INT_LIST`).
+        '''
+
+        self.name = name
+        self.ttl = ttl
+        self.fields = fields
+
+    def getKey(self, draft_id: str) -> str:
+        return f"draft={self.name}&id={draft_id}"
+
+    def dump(self, values: dict) -> tuple[list, list]:
+        "Returns the field/value pairs of the set fields and the names of the unset ones."
+
+        pairs = []
+        unset = []
+        for field, value in values.items():
+            if field not in self.fields:
+                raise ValueError(f'Unknown field of the {self.name} draft: {field}')
+            if value is None:
+                unset.append(field)
+            else:
+                pairs += [field, self.fields[field][0](value)]
+        return pairs, unset
+
+    def load(self, data: list | dict) -> dict | None:
+        "Returns the draft by the reply of `HGETALL`, `None` if it is missing."
+
+        if not data:
+            return None
+        if isinstance(data, list):
+            data = dict(zip(data[::2], data[1::2]))
+
+        data = {k.decode(): v.decode() for k, v in data.items()}
+        return {field: load(data[field]) if field in data else None for field, (_, load) in self.fields.items()}
+
+    async def create(self, **values) -> str:
+        "Creates a draft and returns its id."
+
+        pairs, _ = self.dump(values)
+        create = (await getScript(CREATE_SCRIPT))
+        while True:
+            draft_id = secrets.token_urlsafe(DRAFT_ID_LENGTH)
+            if await create(keys=[self.getKey(draft_id)], args=[self.ttl, DRAFT_MARKER, 1, *pairs]):
+                return draft_id
+
+    async def get(self, draft_id: str) -> dict | None:
+        redis = (await getRedisConnection())
+        return self.load(await redis.hgetall(self.getKey(draft_id)))
+
+    async def update(self, draft_id: str, **values) -> dict | None:
+        '''Sets the fields (`None` unsets a field) and prolongs the draft.
+        Returns the changed draft, `None` if it has expired.'''
+
+        pairs, unset = self.dump(values)
+        update = (await getScript(UPDATE_SCRIPT))
+        return self.load(await update(keys=[self.getKey(draft_id)], args=[self.ttl, len(pairs) // 2, *pairs, *unset]))
+
+    async def take(self, draft_id: str) -> dict | None:
+        '''Returns the draft which is being saved, `None` if it has expired or has already been taken.
+        The draft is kept until it is deleted after the save, or released if the save has failed.'''
+
+        take = (await getScript(TAKE_SCRIPT))
+        return self.load(await take(keys=[self.getKey(draft_id)], args=[DRAFT_TAKEN]))
+
+    async def release(self, draft_id: str) -> None:
+        "Allows to take the draft again."
+
+        redis = (await getRedisConnection())
+        await redis.hdel(self.getKey(draft_id), DRAFT_TAKEN)
+
+    async def delete(self, draft_id: str) -> None:
+        redis = (await getRedisConnection())
+        await redis.delete(self.getKey(draft_id))
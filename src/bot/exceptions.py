@@ -1,14 +1,13 @@
-from .logs import addLog
+from .alerts import reportException
 from .tg_api.queries import telegram_api_request
 
-import traceback
 import functools
 from textwrap import dedent
 
 
 def exceptions_catcher(bot='main'): 
     '''Catches all the exceptions in functions.
-    If exception is noticed, it adds a new note to a logfile 
+    If exception is noticed, it adds a new note to a logfile and to the alert digests (see `alerts`)
     and sends a telegram message for user about unsuccessful request.
     
     :param func: a function in which exceptions must be catched.
@@ -25,11 +24,7 @@ def exceptions_catcher(bot='main'):
             try:
                 result = await func(*args, **kwargs)
             except Exception as e:
-                await addLog(
-                    level='error', 
-                    text=traceback.format_exc(),
-                    send_telegram_message=True,
-                )
+                await reportException(e)
 
                 if user_id:
                     await telegram_api_request(
@@ -1,9 +1,13 @@
 from .tg_api.queries import telegram_api_request
 from .config import CHAT_WITH_LOGS_ID
+from . import config
 
 import os
+import queue
+import asyncio
 import datetime
 import logging
+import threading
 from textwrap import dedent
 
 
@@ -18,31 +22,170 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
+# Logs are written to the files by a background thread, a handler only puts them to the queue.
+# When the queue is full the new info and debug logs are dropped, the more important ones push out the oldest log.
+LOG_QUEUE_SIZE = getattr(config, 'LOG_QUEUE_SIZE', 10000)
+LOG_BATCH_SIZE = 500 # logs written between the flushes of the file
+LOG_IMPORTANT_LEVELS = ('warning', 'error', 'critical')
+# Telegram messages being sent at once, the others are dropped
+LOG_TELEGRAM_MAX_PENDING = getattr(config, 'LOG_TELEGRAM_MAX_PENDING', 20)
+
+log_metrics = {
+    'queued': 0,
+    'written': 0,
+    'dropped': 0,
+    'write_errors': 0,
+    'telegram_sent': 0,
+    'telegram_dropped': 0,
+    'telegram_errors': 0,
+}
+
+
+class LogWriter:
+    '''Appends the queued logs to the hourly files `logs/<year>/<month>/<day>/log-<hour>.log`.
+    The file of the current hour is kept open, it is flushed once per batch of logs
+    and is replaced by the next one when the hour changes.'''
+
+    STOP = object()
+
+    def __init__(self, maxsize: int=LOG_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = None
+        self.file = None
+        self.filename = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self.thread.start()
+
+    def put(self, now: datetime.datetime, level: str, text: str) -> None:
+        "Queues a log without waiting, it is dropped if the queue is full."
+
+        self.start()
+
+        record = (now, level, text)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_metrics['dropped'] += 1
+            if level not in LOG_IMPORTANT_LEVELS:
+                return
+
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                return
+        log_metrics['queued'] += 1
+
+    def stop(self, timeout: float=5) -> None:
+        "Writes the queued logs and stops the thread."
+
+        if self.thread is None:
+            return
+
+        self.queue.put(self.STOP)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _getFile(self, now: datetime.datetime):
+        path = f"logs/{now.year}/{now.month}/{now.day}/"
+        filename = path + f"log-{now.hour}.log"
+
+        if filename != self.filename:
+            if self.file is not None:
+                self.file.close()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.file = open(filename, 'a', encoding='utf-8', errors='backslashreplace')
+            self.filename = filename
+        return self.file
+
+    def _write(self, batch: list) -> None:
+        separator_string = f"\n\n{'='*50}\n\n"
+        for now, level, text in batch:
+            self._getFile(now).write(f"{now} [{level}] - {text}" + separator_string)
+        self.file.flush()
+        log_metrics['written'] += len(batch)
+
+    def _run(self) -> None:
+        stopped = False
+        while not stopped:
+            batch = []
+            record = self.queue.get()
+            while True:
+                if record is self.STOP:
+                    stopped = True
+                else:
+                    batch.append(record)
+
+                if len(batch) >= LOG_BATCH_SIZE:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception:
+                log_metrics['write_errors'] += 1
+                # The file is reopened with the next batch
+                if self.file is not None:
+                    self.file.close()
+                self.file = None
+                self.filename = None
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.filename = None
+
+
+log_writer = LogWriter()
+telegram_logs = set() # the logs being sent to telegram chat
+
+
 async def addLog(level: str, text: str, send_telegram_message: bool=False) -> None:
     '''Adds new log to file, console and telegram chat.
+    Returns at once, the log is written and sent in background.
 
     :param level: log level (`info`, 'debug', 'warning', 'error', 'critical').
     :param text: log text.
     :param send_telegram_message: determines whether a log will be sent to telegram chat.
     '''
-    
-    now = datetime.datetime.now()
-    path = f"logs/{now.year}/{now.month}/{now.day}/"
-    filename = path + f"log-{now.hour}.log"
 
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(filename, 'a') as file:
-        separator_string = f"\n\n{'='*50}\n\n"
-        try:
-            file.write(f"{now} [{level}] - {text}" + separator_string)
-        except:
-            file.write(f"{now} [{level}] - {text.encode('utf-8')}" + separator_string)
+    now = datetime.datetime.now()
+    log_writer.put(now, level, text)
 
     if send_telegram_message:
-        disable_notification = True
-        if level in ['warning', 'error', 'critical']:
-            disable_notification = False
+        queueTelegramLog(now, level, text)
+
+def queueTelegramLog(now: datetime.datetime, level: str, text: str) -> bool:
+    '''Sends a log to telegram chat in background.
+    Returns `False` if the log is dropped because `LOG_TELEGRAM_MAX_PENDING` messages are already being sent.'''
+
+    if len(telegram_logs) >= LOG_TELEGRAM_MAX_PENDING:
+        log_metrics['telegram_dropped'] += 1
+        return False
+
+    task = asyncio.get_running_loop().create_task(sendLog(now, level, text))
+    telegram_logs.add(task)
+    task.add_done_callback(telegram_logs.discard)
+    return True
+
+async def sendLog(now: datetime.datetime, level: str, text: str) -> None:
+    "Sends a log to telegram chat."
 
+    disable_notification = True
+    if level in LOG_IMPORTANT_LEVELS:
+        disable_notification = False
+
+    try:
         await telegram_api_request(
             request_method='POST',
             api_method='sendMessage',
@@ -57,4 +200,19 @@ async def addLog(level: str, text: str, send_telegram_message: bool=False) -> No
                 'parse_mode': 'Markdown',
                 'disable_notification': disable_notification,
             }
-        )
\ No newline at end of file
+        )
+    except Exception:
+        # The log is already in the file, a failed message must not produce new logs
+        log_metrics['telegram_errors'] += 1
+        return
+    log_metrics['telegram_sent'] += 1
+
+async def closeLogs(timeout: float=5) -> None:
+    "Waits for the logs being sent to telegram chat and writes the queued ones."
+
+    if telegram_logs:
+        await asyncio.wait(set(telegram_logs), timeout=timeout)
+    await asyncio.to_thread(log_writer.stop, timeout)
+
+def getLogMetrics() -> dict:
+    return {**log_metrics, 'queue_size': log_writer.queue.qsize()}
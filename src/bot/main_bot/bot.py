@@ -1,27 +1,38 @@
 from ..config import MAIN_BOT_TOKEN
-from ..exceptions import exceptions_catcher, NotFound
+from ..exceptions import exceptions_catcher
 from ..logs import addLog
 from .. import utils
 from ..state_machine import *
-from ..db import connect, asyncpg_errors
+from ..db import acquire, transaction, asyncpg_errors
 from ..works import getWorkTitle
-from ..pagination import paginator
+from ..counters import getUserCounters, getUserWorkCounters
+from ..pagination import paginator, countRows, resetCounts
+from ..drafts import DraftStore, INT, TEXT, DATE, INT_LIST, JSON
+from ..runtime import runtime
+from ..updates import receiveUpdates
+from ..dispatcher import Dispatcher
+from ..callbacks import encodeCallback, isPackedCallback, unpackCallback, parseLegacyCallback
 from ..calendar import Calendar, CallbackData, RUSSIAN_LANGUAGE
 from ..tg_api.queries import telegram_api_request
+from ..tg_api.bot import AsyncBot
+from ..tg_api.broadcast import deliver, scheduler as broadcast_scheduler
+from ..work_bot.feed import getWorkWorkers, addFreeWork, removeFreeWork, resetFeed
+from ..work_bot.reminders import cancelWorkReminders
+from .queries import *
 
-import sys
 import uuid
 import json
 import telebot
 import asyncio
 import datetime
-import traceback
 from textwrap import dedent
-import collections
 
 
 # Telegram Bot API configuration
 bot = telebot.TeleBot(token=MAIN_BOT_TOKEN)
+api = AsyncBot(bot) # the requests to Telegram from the coroutines
+dispatcher = Dispatcher()
+input_steps = Dispatcher() # the handlers of the text messages, which are waited for by `setInputStep`
 keyboard_obj = telebot.types.InlineKeyboardMarkup
 button_obj = telebot.types.InlineKeyboardButton
 
@@ -29,12 +40,26 @@ button_obj = telebot.types.InlineKeyboardButton
 calendar = Calendar(language=RUSSIAN_LANGUAGE)
 calendar_callback = CallbackData("calendar", "action", "year", "month", "day", "additional_data")
 
+# Drafts of the planned cleanings, the steps are passed in the order of `CLEANING_STEPS`
+cleaning_drafts = DraftStore(
+    'cleaning',
+    cleaners=INT_LIST,
+    property_id=INT,
+    date=DATE,
+    time_range=TEXT,
+    hygiene_kits_count=TEXT,
+    comment=TEXT,
+    properties=JSON, # [[id, address, title], ...] of the landlord, read when the draft is created
+)
+CLEANING_STEPS = ('property_id', 'date', 'time_range', 'hygiene_kits_count')
+
 
 # Catching all the "/start" in the chat
 @bot.message_handler(commands=['start'])
 def firstRun(message):
-    asyncio.run(addUser(message))
+    runtime.submit(addUser(message))
 
+@exceptions_catcher()
 async def addUser(message: telebot.types.Message) -> None:
     '''Retrieves the user_id from the message and tries to add it to the database.
     If the attempt ends with an error, it returns the bot start menu.'''
@@ -42,25 +67,34 @@ async def addUser(message: telebot.types.Message) -> None:
     user_id = message.from_user.id
     now = datetime.datetime.now
 
-    conn = await connect()
     try:
-        stmt = '''
-            INSERT INTO users (id, "regDate")
-            VALUES ($1, $2)
-        '''
-        await conn.execute(stmt, user_id, now())
+        async with acquire() as conn:
+            await conn.execute(ADD_USER_QUERY, user_id, now())
     except asyncpg_errors['UniqueViolationError']:
         pass
     finally:
-        await conn.close()
+        # The command cancels a step which waits for a text
+        await delInputStep(bot='main', user_id=user_id)
         await start(message)
 
 
 # Getter of any text messenges in the chat
 @bot.message_handler(content_types='text')
 def main(message):
-    asyncio.run(start(message))
+    runtime.submit(inputRunner(message))
+
+@exceptions_catcher()
+async def inputRunner(message: telebot.types.Message) -> None:
+    "Passes the message to the step which waits for it, outputs the start menu otherwise."
+
+    user_id = message.from_user.id
+    step = (await popInputStep(bot='main', user_id=user_id))
+    if step is None:
+        return await start(message)
+
+    await input_steps.dispatch(step['func'], message, user_id=user_id, **step['kwargs'])
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def start(message: telebot.types.Message=None, user_id: int=None) -> None:
@@ -68,16 +102,17 @@ async def start(message: telebot.types.Message=None, user_id: int=None) -> None:
 
     if user_id is None:
         user_id = message.from_user.id
+        await utils.rememberUser(message.from_user)
 
     greeting = await utils.greeting()
-    name = await utils.getUsername(bot, user_id)
+    name = await utils.getUsername(api, user_id)
 
     keyboard = keyboard_obj()
-    keyboard.add(button_obj(text='🛠 Инструменты', callback_data='start_func-toolsMenu'))
-    keyboard.add(button_obj(text='🏠 Мои объекты', callback_data='start_func-propertiesMenu'))
-    keyboard.add(button_obj(text='🧑🏼‍🔧 Мои сотрудники', callback_data=f'start_func-workersMenu'))
+    keyboard.add(button_obj(text='🛠 Инструменты', callback_data=encodeCallback('toolsMenu')))
+    keyboard.add(button_obj(text='🏠 Мои объекты', callback_data=encodeCallback('propertiesMenu')))
+    keyboard.add(button_obj(text='🧑🏼‍🔧 Мои сотрудники', callback_data=encodeCallback('workersMenu')))
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''*{greeting}, {name}!*'''
@@ -89,14 +124,15 @@ async def start(message: telebot.types.Message=None, user_id: int=None) -> None:
 
 # === Tools ===
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def toolsMenu(user_id: int) -> None:
     keyboard = keyboard_obj()
-    keyboard.add(button_obj(text='🧴 Клининг', callback_data='start_func-cleaningMenu'))
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='🧴 Клининг', callback_data=encodeCallback('cleaningMenu')))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -109,37 +145,24 @@ async def toolsMenu(user_id: int) -> None:
         reply_markup=keyboard,
     )
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def cleaningMenu(user_id: int) -> None:
     keyboard = keyboard_obj()
-    keyboard.add(button_obj(text='➕ Запланировать уборку', callback_data='start_func-addCleaning'))
-    keyboard.add(button_obj(text='🗂 Список уборок', callback_data='start_func-cleaningList'))
-    keyboard.add(button_obj(text='🗃 Архив уборок', callback_data='start_func-cleaningList-only_completed=True'))
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='➕ Запланировать уборку', callback_data=encodeCallback('addCleaning')))
+    keyboard.add(button_obj(text='🗂 Список уборок', callback_data=encodeCallback('cleaningList')))
+    keyboard.add(button_obj(text='🗃 Архив уборок', callback_data=encodeCallback('cleaningList', only_completed=True)))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
-    conn = await connect()
-    try:
-        query = '''
-            SELECT
-                COUNT(id) FILTER (WHERE "acceptForWorkDate" IS NULL) AS scheduled,
-                COUNT(id) FILTER (WHERE "acceptanceConfirmed" = TRUE AND "completedDate" IS NULL) AS confirmed,
-                COUNT(id) FILTER (WHERE "completedDate" IS NOT NULL) AS completed
-            FROM
-                "userWorks"
-            WHERE
-                "userID" = $1
-                AND "workID" = $2;
-        '''
-        cleaning_numbers = dict((await conn.fetchrow(query, user_id, work_id := 1)))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        cleaning_numbers = (await getUserWorkCounters(conn, user_id, work_id=1))
 
     scheduled_cleaning = cleaning_numbers['scheduled']
     confirmed_cleaning = cleaning_numbers['confirmed']
     completed_cleaning = cleaning_numbers['completed']
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -154,51 +177,64 @@ async def cleaningMenu(user_id: int) -> None:
         reply_markup=keyboard,
     )
 
+@dispatcher.handler()
 @exceptions_catcher()
-async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=False) -> None:
-    if redis_data_key:
-        redis = (await getRedisConnection())
-        cleaning_data = json.loads(redis.get(redis_data_key))
-    else:
-        cleaning_data = {
-            'cleaners': None,
-            'property_id': None,
-            'date': None,
-            'time_range': None,
-            'hygiene_kits_count': None,
-            'comment': None,
-        }
-        redis_data_key = str(uuid.uuid4())[:8]
-        redis = (await getRedisConnection())
-        redis.set(redis_data_key, json.dumps(cleaning_data), ex=60*10)
-
-    back_button = button_obj(text='⬅️ Назад', callback_data='start_func-back')
-
-    if cleaning_data['cleaners'] is None:
-        conn = await connect()
+async def addCleaning(
+    user_id: int,
+    redis_data_key: str=None,
+    property_id: int=None,
+    date: datetime.date=None,
+    confirmed: bool=False,
+) -> None:
+    '''Cleaning planning. The draft is kept in `cleaning_drafts` by the `redis_data_key` id,
+    a step saves only its own field and the next step is the first unset one (see `getCleaningStep`).'''
+
+    if redis_data_key and confirmed:
+        # The draft is taken by the first confirmation, the repeated ones are ignored while it is being saved
+        cleaning_data = (await cleaning_drafts.take(redis_data_key))
+        if cleaning_data is None:
+            return
         try:
-            query = '''
-                SELECT "workerID"
-                FROM "userWorkers"
-                WHERE "userID" = $1
-                    AND "workID" = $2
-            '''
-            cleaners = [c[0] for c in (await conn.fetch(query, user_id, 1))]
+            return await showCleaningStep(user_id, redis_data_key, cleaning_data, confirmed)
         finally:
-            await conn.close()
-
-        cleaners_count = len(cleaners)
+            # The saved draft is already deleted, an unsaved one can be confirmed again
+            await cleaning_drafts.release(redis_data_key)
+    elif redis_data_key:
+        cleaning_data = None
+        if property_id is not None:
+            # Only a property of the planning context can be chosen (the button may be stale or forged)
+            cleaning_data = (await cleaning_drafts.get(redis_data_key))
+            if cleaning_data and getDraftAddress({**cleaning_data, 'property_id': property_id}) is None:
+                property_id = None
+
+        values = {'property_id': property_id, 'date': date}
+        values = {k: v for k, v in values.items() if v is not None}
+        if values:
+            cleaning_data = (await cleaning_drafts.update(redis_data_key, **values))
+        elif cleaning_data is None:
+            cleaning_data = (await cleaning_drafts.get(redis_data_key))
+
+        # The draft has expired, the planning starts over
+        if cleaning_data is None:
+            redis_data_key = None
+
+    if not redis_data_key:
+        # The whole planning context is read once and is kept in the draft
+        async with acquire() as conn:
+            context = (await conn.fetchrow(ADD_CLEANING_CONTEXT_QUERY, user_id, 1))
+
+        cleaners = context['cleaners']
+        properties = [json.loads(p) for p in context['properties']]
 
-        if cleaners_count == 0:
-            # Remove cleaning data from redis
-            redis.delete(redis_data_key)
+        keyboard = keyboard_obj()
+        back_button = button_obj(text='⬅️ Назад', callback_data=encodeCallback('back'))
 
-            keyboard = keyboard_obj()
-            keyboard.add(button_obj(text='➕🧑🏼‍🔧 Добавить сотрудника', callback_data='start_func-addWorker'))
-            keyboard.add(button_obj(text='🧴 Вернуться в меню', callback_data='start_func-cleaningMenu'))
+        if len(cleaners) == 0:
+            keyboard.add(button_obj(text='➕🧑🏼‍🔧 Добавить сотрудника', callback_data=encodeCallback('addWorker')))
+            keyboard.add(button_obj(text='🧴 Вернуться в меню', callback_data=encodeCallback('cleaningMenu')))
             keyboard.add(back_button)
 
-            bot.send_message(
+            return await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -210,33 +246,13 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
                 parse_mode="Markdown",
                 reply_markup=keyboard,
             )
-        else:
-            cleaning_data['cleaners'] = cleaners
-            redis.set(redis_data_key, json.dumps(cleaning_data), ex=60*10)
-            await addCleaning(user_id, redis_data_key)
-
-    elif cleaning_data['property_id'] is None:
-        conn = await connect()    
-        try:
-            query = '''
-                SELECT id, address, title
-                FROM properties
-                WHERE "userID" = $1
-            '''
-            properties = (await conn.fetch(query, user_id))
-        finally:
-            await conn.close()
 
-        keyboard = keyboard_obj()
         if len(properties) == 0:
-            # Remove cleaning data from redis
-            redis.delete(redis_data_key)
-
-            keyboard.add(button_obj(text='➕🏠 Добавить объект', callback_data='start_func-addProperty'))
-            keyboard.add(button_obj(text='🧴 Вернуться в меню', callback_data='start_func-cleaningMenu'))
+            keyboard.add(button_obj(text='➕🏠 Добавить объект', callback_data=encodeCallback('addProperty')))
+            keyboard.add(button_obj(text='🧴 Вернуться в меню', callback_data=encodeCallback('cleaningMenu')))
             keyboard.add(back_button)
 
-            return bot.send_message(
+            return await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -248,34 +264,77 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
                 parse_mode="Markdown",
                 reply_markup=keyboard
             )
-        else:
-            for p in properties:
-                address = p[1]; title = p[2]
-                keyboard.add(
-                    button_obj(
-                        text=f'{title[:20] if title else address[:20]}', 
-                        callback_data=f'set_redis_data-{redis_data_key}-property_id={p[0]}-start_func=addCleaning'
-                    )
-                )
-            keyboard.add(back_button)
 
-            return bot.send_message(
-                chat_id=user_id,
-                text=dedent(
-                    f'''
-                    *➕ Планирование клининга*
+        redis_data_key = (await cleaning_drafts.create(cleaners=cleaners, properties=properties))
+        cleaning_data = {**dict.fromkeys(cleaning_drafts.fields), 'cleaners': cleaners, 'properties': properties}
 
-                    🏠 Выберите объект для которого хотите запланировать клининг.
-                    '''
-                ),
-                parse_mode="Markdown",
-                reply_markup=keyboard,
+    await showCleaningStep(user_id, redis_data_key, cleaning_data, confirmed)
+
+def getDraftAddress(cleaning_data: dict) -> str | None:
+    "Returns the address of the chosen property from the planning context of the draft."
+
+    for p in cleaning_data['properties']:
+        if p[0] == cleaning_data['property_id']:
+            return p[1]
+    return None
+
+def getCleaningStep(cleaning_data: dict) -> str:
+    "Returns the first unset field of the cleaning draft, `confirm` if all of them are set."
+
+    for step in CLEANING_STEPS:
+        if cleaning_data[step] is None:
+            return step
+    return 'confirm'
+
+async def showCleaningStep(user_id: int, redis_data_key: str, cleaning_data: dict, confirmed: bool=False) -> None:
+    "Sends the current step of the cleaning planning."
+
+    back_button = button_obj(text='⬅️ Назад', callback_data=encodeCallback('back'))
+
+    if cleaning_data['date'] is not None and cleaning_data['date'] < datetime.datetime.now().date():
+        cleaning_data = (await cleaning_drafts.update(redis_data_key, date=None))
+        if cleaning_data is None:
+            return await addCleaning(user_id)
+
+        await api.send_message(
+            chat_id=user_id,
+            text=dedent(
+                f"*❌ Дата уборки не может быть раньше сегодняшней!*"
+            ),
+            parse_mode="Markdown",
+        )
+
+    step = getCleaningStep(cleaning_data)
+
+    if step == 'property_id':
+        keyboard = keyboard_obj()
+        for p in cleaning_data['properties']:
+            address = p[1]; title = p[2]
+            keyboard.add(
+                button_obj(
+                    text=f'{title[:20] if title else address[:20]}', 
+                    callback_data=encodeCallback('addCleaning', redis_data_key=redis_data_key, property_id=p[0])
+                )
             )
+        keyboard.add(back_button)
 
-    elif cleaning_data['date'] is None:
+        return await api.send_message(
+            chat_id=user_id,
+            text=dedent(
+                f'''
+                *➕ Планирование клининга*
+
+                🏠 Выберите объект для которого хотите запланировать клининг.
+                '''
+            ),
+            parse_mode="Markdown",
+            reply_markup=keyboard,
+        )
+
+    elif step == 'date':
         now = datetime.datetime.now()
 
-        return bot.send_message(
+        return await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -285,7 +344,7 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
                 ''',
             ),
             parse_mode="Markdown",
-            reply_markup=calendar.create_calendar(
+            reply_markup=calendar.render_calendar(
                 name=calendar_callback.prefix,
                 year=now.year,
                 month=now.month,
@@ -293,127 +352,58 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
                 redis_data_key=f"{redis_data_key}",
             )
         )
-    
-    elif datetime.datetime.strptime(cleaning_data['date'], '%Y-%m-%d').date() < datetime.datetime.now().date():
-        cleaning_data['date'] = None
-        redis.set(redis_data_key, json.dumps(cleaning_data), ex=60*10)
+
+    elif step == 'time_range':
+        keyboard = keyboard_obj()
+        keyboard.add(back_button)
         
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
-                f"*❌ Дата уборки не может быть раньше сегодняшней!*"
+                f'''
+                *➕ Планирование клининга*
+
+                ⏰ Укажите диапазон времени, в которое должен подойти сотрудник для проведения клининга.
+                '''
             ),
             parse_mode="Markdown",
+            reply_markup=keyboard,
         )
-        await addCleaning(user_id, redis_data_key)
+        await setInputStep('main', user_id, 'setCleaningTimeRange', redis_data_key=redis_data_key)
 
-    elif cleaning_data['time_range'] is None:
+    elif step == 'hygiene_kits_count':
         keyboard = keyboard_obj()
         keyboard.add(back_button)
         
-        message = bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
                 *➕ Планирование клининга*
 
-                ⏰ Укажите диапазон времени, в которое должен подойти сотрудник для проведения клининга.
+                🧺 Укажите количество гигиенических наборов для заселения.
                 '''
             ),
             parse_mode="Markdown",
             reply_markup=keyboard,
         )
-
-        def nextStepHandler(message):
-            asyncio.run(setTimeRange(message))
-        bot.register_next_step_handler(message, nextStepHandler)
-
-        async def setTimeRange(message):
-            if len(message.text) > 30:
-                return bot.send_message(
-                    chat_id=user_id,
-                    text=dedent(
-                        f'''
-                        *❌ Слишком длинно!*
-
-                        Временной диапазон не должен состоять более чем из 30 символов.
-                        '''
-                    ),
-                    parse_mode="Markdown",
-                    reply_markup=keyboard,
-                )
-
-            redis = (await getRedisConnection())
-            values_dict = json.loads(redis.get(redis_data_key))
-            values_dict['time_range'] = message.text
-            redis.set(redis_data_key, json.dumps(values_dict), ex=60*10)
-            
-            await addCleaning(user_id, redis_data_key)
-
-    elif cleaning_data['hygiene_kits_count'] is None:
-            keyboard = keyboard_obj()
-            keyboard.add(back_button)
-            
-            message = bot.send_message(
-                chat_id=user_id,
-                text=dedent(
-                    f'''
-                    *➕ Планирование клининга*
-
-                    🧺 Укажите количество гигиенических наборов для заселения.
-                    '''
-                ),
-                parse_mode="Markdown",
-                reply_markup=keyboard,
-            )
-
-            def nextStepHandler(message):
-                asyncio.run(setHygieneKitsCount(message))
-            bot.register_next_step_handler(message, nextStepHandler)
-
-            async def setHygieneKitsCount(message):
-                if len(message.text) > 2:
-                    return bot.send_message(
-                        chat_id=user_id,
-                        text=dedent(
-                            f'''
-                            *❌ Слишком длинно!*
-
-                            Количество гигенических наборов не должен состоять более чем из 2 символов.
-                            '''
-                        ),
-                        parse_mode="Markdown",
-                        reply_markup=keyboard,
-                    )
-
-                redis = (await getRedisConnection())
-                values_dict = json.loads(redis.get(redis_data_key))
-                values_dict['hygiene_kits_count'] = message.text
-                redis.set(redis_data_key, json.dumps(values_dict), ex=60*10)
-                
-                return await addCleaning(user_id, redis_data_key)
+        await setInputStep('main', user_id, 'setCleaningHygieneKitsCount', redis_data_key=redis_data_key)
 
     else:
         if confirmed is False:
             keyboard = keyboard_obj()
             keyboard.row(
-                button_obj(text='❌ Отмена', callback_data='start_func-cleaningMenu'),
+                button_obj(text='❌ Отмена', callback_data=encodeCallback('cleaningMenu')),
                 button_obj(
                     text='✅ Подтвердить', 
-                    callback_data=f'start_func-addCleaning-redis_data_key="{redis_data_key}"&confirmed=True'
+                    callback_data=encodeCallback('addCleaning', redis_data_key=redis_data_key, confirmed=True)
                 )
             )
 
-            conn = (await connect())
-            try:
-                query = "SELECT address FROM properties WHERE id = $1"
-                property_address = (await conn.fetchval(query, int(cleaning_data['property_id'])))
-            finally:
-                await conn.close()
-
+            property_address = getDraftAddress(cleaning_data)
             comment = cleaning_data['comment']
 
-            message = bot.send_message(
+            await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -438,42 +428,19 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
                 reply_markup=keyboard,
             )
 
-            def nextStepHandler(message):
-                asyncio.run(setCommentText(message))
-            bot.register_next_step_handler(message, nextStepHandler)
-
-            async def setCommentText(message):
-                if len(message.text) > 200:
-                    bot.send_message(
-                        chat_id=user_id,
-                        text=dedent(
-                            f'''
-                            *❌ Комментарий слишком длинный!*
-
-                            Максимальная длина текста комментария - *200 символов*
-                            '''
-                        ),
-                        parse_mode="Markdown",
-                        reply_markup=keyboard,
-                    )
-                else:
-                    if message.text == '-':
-                        comment = None
-                    else:
-                        comment = message.text
-
-                    cleaning_data['comment'] = comment
-                    redis.set(redis_data_key, json.dumps(cleaning_data), ex=60*10)
+            await setInputStep('main', user_id, 'setCleaningComment', redis_data_key=redis_data_key)
 
-                await addCleaning(user_id, redis_data_key)
-                        
         else:
             # Clear available next step handlers
-            bot.clear_step_handler_by_chat_id(chat_id=user_id)
+            await delInputStep(bot='main', user_id=user_id)
+
+            # The property is not in the planning context any more, it is chosen again
+            if getDraftAddress(cleaning_data) is None:
+                return await saveCleaningStep(user_id, redis_data_key, property_id=None)
 
-            property_id = int(cleaning_data['property_id'])
+            property_id = cleaning_data['property_id']
             work_id = 1
-            date = datetime.datetime.strptime(cleaning_data['date'], '%Y-%m-%d').date()
+            date = cleaning_data['date']
             time_range = cleaning_data['time_range']
             comment = cleaning_data['comment']
             hygiene_kits_count = int(cleaning_data['hygiene_kits_count'])
@@ -482,18 +449,10 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
             elif date == (now() + datetime.timedelta(days=1)).date(): cleaning_date = 'Завтра'
             else: cleaning_date = date
 
-            conn = await connect()
-            try:
-                stmt_user_works = '''
-                    INSERT INTO "userWorks" 
-                    ("userID", "propertyID", "workID", "date", "timeRange", "comment", "addDate")
-                    VALUES ($1, $2, $3, $4, $5, $6, $7)
-                    RETURNING id
-                '''
-
-                user_work_id = (
-                    await conn.fetchval(
-                        stmt_user_works,
+            async with transaction() as uow:
+                user_work_id, property_address = (
+                    await uow.fetchrow(
+                        ADD_CLEANING_QUERY,
                         user_id,
                         property_id,
                         work_id,
@@ -501,32 +460,24 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
                         time_range,
                         comment,
                         now(),
+                        hygiene_kits_count,
                     )
                 )
 
-                stmt_cleaning = '''
-                    INSERT INTO cleaning ("workID", "hygieneKitsCount")
-                    VALUES ($1, $2)
-                '''
-                await conn.execute(stmt_cleaning, user_work_id, hygiene_kits_count)
-
-                query = "SELECT address FROM properties WHERE id = $1"
-                property_address = (await conn.fetchval(query, property_id))
-            finally:
-                await conn.close()
-
-            # Remove cleaning data from redis
-            redis.delete(redis_data_key)
+            # The draft is removed only when the cleaning is saved
+            await cleaning_drafts.delete(redis_data_key)
+            await resetCounts(user_id)
+            await addFreeWork(user_work_id, date, cleaning_data['cleaners'])
 
             keyboard = keyboard_obj()
             keyboard.add(
                 button_obj(
                     text='🧴 Карточка клининга', 
-                    callback_data=f'start_func-cleaningCard-work_id={user_work_id}-call_id=True'
+                    callback_data=encodeCallback('cleaningCard', work_id=user_work_id, call_id=True)
                 )
             )
 
-            bot.send_message(
+            await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -544,13 +495,11 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
                 reply_markup=keyboard,
             )
 
-            # Sending notifications to cleaners
-            for cleaner_id in cleaning_data['cleaners']:
-                await telegram_api_request(
-                    request_method='POST',
-                    api_method='sendMessage',
+            # Sending notifications to cleaners in background, the landlord has already got the answer
+            runtime.submit(
+                deliver(
+                    chat_ids=cleaning_data['cleaners'],
                     parameters={
-                        'chat_id': cleaner_id,
                         'text': dedent(
                             f'''
                             *⏰ Запланирован клининг!*
@@ -561,37 +510,115 @@ async def addCleaning(user_id: int, redis_data_key: str=None, confirmed: bool=Fa
                             '''
                         ),
                         'parse_mode': 'Markdown',
-                        'reply_markup': json.dumps({
+                        'reply_markup': {
                             "inline_keyboard": [
                                 [
                                     {
                                         'text': '☑️ Принять в работу',
-                                        'callback_data': f'start_func-acceptCleaning-work_id={user_work_id}-call_id=True',
+                                        'callback_data': encodeCallback('acceptCleaning', work_id=user_work_id, call_id=True),
                                     },
                                 ],
                             ],
-                        }),
+                        },
                     },
                     bot='work'
                 )
+            )
+
+async def saveCleaningStep(user_id: int, redis_data_key: str, **values) -> None:
+    "Saves the values entered by the user and moves on to the next step."
+
+    cleaning_data = (await cleaning_drafts.update(redis_data_key, **values))
+    if cleaning_data is None:
+        await addCleaning(user_id)
+    else:
+        await showCleaningStep(user_id, redis_data_key, cleaning_data)
+
+async def rejectCleaningStep(user_id: int, redis_data_key: str, text: str) -> None:
+    "Tells the user that the entered value is wrong and repeats the step."
+
+    keyboard = keyboard_obj()
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
+    await api.send_message(
+        chat_id=user_id,
+        text=dedent(text),
+        parse_mode="Markdown",
+        reply_markup=keyboard,
+    )
+    await saveCleaningStep(user_id, redis_data_key)
+
+@input_steps.handler()
 @exceptions_catcher()
-@autoSetState()
-async def cleaningList(user_id: int, page: int=1, only_completed: bool=False) -> None:
-    conn = await connect()
-    try:
-        query = f'''
-            SELECT id, date, "timeRange", "acceptanceConfirmed"
-            FROM "userWorks"
-            WHERE "userID" = $1
-                AND "workID" = $2
-                AND "completedDate" {'IS NOT NULL' if only_completed else 'IS NULL'}
-        '''
-        cleaning = (await conn.fetch(query, user_id, work_id := 1))
-    finally:
-        await conn.close()
+async def setCleaningTimeRange(message: telebot.types.Message, user_id: int, redis_data_key: str) -> None:
+    if len(message.text) > 30:
+        return await rejectCleaningStep(
+            user_id,
+            redis_data_key,
+            f'''
+            *❌ Слишком длинно!*
+
+            Временной диапазон не должен состоять более чем из 30 символов.
+            ''',
+        )
+
+    await saveCleaningStep(user_id, redis_data_key, time_range=message.text)
+
+@input_steps.handler()
+@exceptions_catcher()
+async def setCleaningHygieneKitsCount(message: telebot.types.Message, user_id: int, redis_data_key: str) -> None:
+    if len(message.text) > 2:
+        return await rejectCleaningStep(
+            user_id,
+            redis_data_key,
+            f'''
+            *❌ Слишком длинно!*
+
+            Количество гигенических наборов не должен состоять более чем из 2 символов.
+            ''',
+        )
+
+    await saveCleaningStep(user_id, redis_data_key, hygiene_kits_count=message.text)
+
+@input_steps.handler()
+@exceptions_catcher()
+async def setCleaningComment(message: telebot.types.Message, user_id: int, redis_data_key: str) -> None:
+    if len(message.text) > 200:
+        return await rejectCleaningStep(
+            user_id,
+            redis_data_key,
+            f'''
+            *❌ Комментарий слишком длинный!*
 
-    cleaning_count = len(cleaning)
+            Максимальная длина текста комментария - *200 символов*
+            ''',
+        )
+
+    # "-" removes the comment
+    await saveCleaningStep(user_id, redis_data_key, comment=None if message.text == '-' else message.text)
+
+@dispatcher.handler()
+@exceptions_catcher()
+@autoSetState()
+async def cleaningList(
+    user_id: int,
+    page: int=1,
+    only_completed: bool=False,
+    after: str=None,
+    before: str=None,
+) -> None:
+    conditions = CLEANING_CONDITIONS[only_completed]
+
+    async with acquire() as conn:
+        query = CLEANING_COUNT_QUERY.format(conditions=conditions)
+        cleaning_count = (await countRows(
+            conn, user_id, f'cleaning-completed={only_completed}', query, user_id, work_id := 1
+        ))
+
+        query = CLEANING_LIST_QUERY.format(conditions=conditions)
+        cleaning = (await cleaning_keyset.fetchPage(
+            conn, query, user_id, work_id, count=cleaning_count, page=page, after=after, before=before
+        ))
     is_confirmed = {
         False: '📅',
         True: '☑️',
@@ -602,16 +629,23 @@ async def cleaningList(user_id: int, page: int=1, only_completed: bool=False) ->
             {
                 # Cleaning text indexes: 1 - date, 2 - time_range, 3 - acceptanceConfirmed
                 'text': f'✅ {c[1]} ({c[2]})' if only_completed else f'{is_confirmed[c[3]]} {c[1]} ({c[2]})',
-                'callback_data': f'start_func-cleaningCard-work_id={c[0]}-call_id=True'
+                'callback_data': encodeCallback('cleaningCard', work_id=c[0], call_id=True)
             } 
             for c in cleaning
         ])
-        keyboard = (await paginator(array=cleaning_data, current_page=page, only_completed=only_completed))
+        keyboard = (await paginator(
+            array=cleaning_data,
+            handler='cleaningList',
+            current_page=page,
+            count=cleaning_count,
+            cursors=cleaning_keyset.getCursors(cleaning),
+            only_completed=only_completed,
+        ))
     else:
         keyboard = keyboard_obj()
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
     
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent((
             f'''
@@ -628,38 +662,17 @@ async def cleaningList(user_id: int, page: int=1, only_completed: bool=False) ->
         reply_markup=keyboard,
     )     
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT 
-                w.id, 
-                w."propertyID", p."address",
-                w."workerID", uw."workerName",
-                w.date, w."timeRange", 
-                w."acceptForWorkDate", w."acceptanceConfirmed", w."completedDate",
-                w.comment, 
-                w."addDate", 
-                c."hygieneKitsCount"
-            FROM "userWorks" w
-            JOIN cleaning c
-                ON c."workID" = w.id
-            JOIN properties p
-                ON p.id = w."propertyID"
-            LEFT JOIN "userWorkers" uw
-                ON uw."workerID" = w."workerID"
-            WHERE w.id = $1
-        '''
-        cleaning_data = (await conn.fetchrow(query, work_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        cleaning_data = (await conn.fetchrow(CLEANING_CARD_QUERY, work_id))
 
     if cleaning_data:
         cleaning_data = dict(cleaning_data)
     else:
-        return bot.answer_callback_query(
+        return await api.answer_callback_query(
             callback_query_id=call_id, 
             text=dedent(
             '''
@@ -673,22 +686,22 @@ async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
 
     keyboard = keyboard_obj()
     if cleaning_data['acceptanceConfirmed'] is False:
-        keyboard.add(button_obj(text='❌ Отменить клининг', callback_data=f'start_func-removeCleaning-work_id={work_id}'))
+        keyboard.add(button_obj(text='❌ Отменить клининг', callback_data=encodeCallback('removeCleaning', work_id=work_id)))
     elif cleaning_data['completedDate']:
         keyboard.add(
             button_obj(
                 text='🗑️ Удалить запись о клининге', 
-                callback_data=f'start_func-removeCleaning-work_id={work_id}'
+                callback_data=encodeCallback('removeCleaning', work_id=work_id)
             )
         )
     if cleaning_data['workerID']:
         keyboard.add(
             button_obj(
                 text='🧑🏼‍🔧 Карточка сотрудника', 
-                callback_data=f'start_func-workerCard-worker_id={cleaning_data["workerID"]}-call_id=True'
+                callback_data=encodeCallback('workerCard', worker_id=cleaning_data["workerID"], call_id=True)
             )
         )
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
     address = cleaning_data['address']
 
@@ -701,7 +714,7 @@ async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
     worker_name = cleaning_data['workerName']
     acceptanceConfirmed = cleaning_data['acceptanceConfirmed']
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -717,25 +730,14 @@ async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
         reply_markup=keyboard
     )
 
+@dispatcher.handler()
 @exceptions_catcher()
 async def removeCleaning(user_id: int, work_id: int, call_id: int=None, confirmed: bool=False) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT 
-                w.id, w."workerID", w.date, w."timeRange", p.address
-            FROM "userWorks" w
-            JOIN properties p
-                ON p.id = w."propertyID"
-            WHERE 
-                w.id = $1 AND w."userID" = $2
-        '''
-        cleaning_data = (await conn.fetchrow(query, work_id, user_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        cleaning_data = (await conn.fetchrow(REMOVE_CLEANING_QUERY, work_id, user_id))
 
     if cleaning_data is None:
-        bot.answer_callback_query(
+        await api.answer_callback_query(
             call_id, 
             dedent(
             '''
@@ -751,16 +753,17 @@ async def removeCleaning(user_id: int, work_id: int, call_id: int=None, confirme
         keyboard = keyboard_obj()
 
         if confirmed:
-            conn = await connect()
-            try:
-                stmt = 'DELETE FROM "userWorks" WHERE id = $1'
-                await conn.execute(stmt, work_id)
-            finally:
-                await conn.close()
+            async with transaction() as uow:
+                workers = (await getWorkWorkers(uow, work_id))
+                await uow.execute(DELETE_CLEANING_QUERY, work_id)
 
-            keyboard.add(button_obj(text='🏠 Главное меню', callback_data='start_func-start'))
+            await cancelWorkReminders(work_id)
+            await removeFreeWork(work_id, workers)
+            await resetCounts(*filter(None, (user_id, cleaning_data['workerID'])))
 
-            bot.send_message(
+            keyboard.add(button_obj(text='🏠 Главное меню', callback_data=encodeCallback('start')))
+
+            await api.send_message(
                 chat_id=user_id,
                 text="*✅ Запись о клининге удалёна!*",
                 parse_mode="Markdown",
@@ -792,14 +795,14 @@ async def removeCleaning(user_id: int, work_id: int, call_id: int=None, confirme
 
         else:
             keyboard.row(
-                button_obj(text='❌ Отмена', callback_data='start_func-back'),
+                button_obj(text='❌ Отмена', callback_data=encodeCallback('back')),
                 button_obj(
                     text='✅ Удалить', 
-                    callback_data=f'start_func-removeCleaning-work_id={work_id}&confirmed=True'
+                    callback_data=encodeCallback('removeCleaning', work_id=work_id, confirmed=True)
                 )
             )
 
-            bot.send_message(
+            await api.send_message(
                 chat_id=user_id,
                 text=f"*🗑 Вы уверены, что хотите удалить запись о клининге?*",
                 parse_mode="Markdown",
@@ -811,23 +814,19 @@ async def removeCleaning(user_id: int, work_id: int, call_id: int=None, confirme
 
 # === Properties ===
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def propertiesMenu(user_id: int) -> None:
     keyboard = keyboard_obj()
-    keyboard.add(button_obj(text='➕ Добавить объект', callback_data='start_func-addProperty'))
-    keyboard.add(button_obj(text='🗂 Список объектов', callback_data='start_func-propertiesList'))
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
-
-    conn = await connect()
-    try:
-        properties_query = '''SELECT COUNT(id) FROM properties WHERE "userID" = $1'''
+    keyboard.add(button_obj(text='➕ Добавить объект', callback_data=encodeCallback('addProperty')))
+    keyboard.add(button_obj(text='🗂 Список объектов', callback_data=encodeCallback('propertiesList')))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
-        properties = (await conn.fetchrow(properties_query, user_id))[0]
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        properties = (await getUserCounters(conn, user_id))['properties']
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -840,11 +839,12 @@ async def propertiesMenu(user_id: int) -> None:
         reply_markup=keyboard,
     )
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def addProperty(user_id: int, property_data: dict=None) -> None:
     keyboard = keyboard_obj()
-    back_button = button_obj(text='⬅️ Назад', callback_data='start_func-back')
+    back_button = button_obj(text='⬅️ Назад', callback_data=encodeCallback('back'))
 
     if property_data:
         address = property_data['address']
@@ -852,7 +852,7 @@ async def addProperty(user_id: int, property_data: dict=None) -> None:
 
         if len(address) > 100 or (title and len(title) > 30):
             keyboard.add(back_button)
-            bot.send_message(
+            await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -867,26 +867,19 @@ async def addProperty(user_id: int, property_data: dict=None) -> None:
             return
 
         now = datetime.datetime.now
-        conn = await connect()
-        try:
-            stmt = '''
-                INSERT INTO properties ("userID", address, title, "addDate")
-                VALUES ($1, $2, $3, $4)
-                RETURNING id
-            '''
-            property_id = (await conn.fetchval(stmt, user_id, address, title, now()))
-        finally:
-            await conn.close()
+        async with acquire() as conn:
+            property_id = (await conn.fetchval(ADD_PROPERTY_QUERY, user_id, address, title, now()))
+        await resetCounts(user_id)
 
         keyboard.add(
             button_obj(
                 text='🏡 Карточка объекта', 
-                callback_data=f'start_func-propertyCard-property_id={property_id}-call_id=True'
+                callback_data=encodeCallback('propertyCard', property_id=property_id, call_id=True)
             )
         )
         keyboard.add(back_button)
 
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -903,7 +896,7 @@ async def addProperty(user_id: int, property_data: dict=None) -> None:
     else:
         keyboard.add(back_button)
 
-        message = bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -919,73 +912,69 @@ async def addProperty(user_id: int, property_data: dict=None) -> None:
             reply_markup=keyboard,
         )
 
-        def nextStepHandler(message):
-            data = message.text.split(';')
-            property_data = {
-                'address': data[0],
-                'title': data[1] if len(data) > 1 else None,
-            }
-            asyncio.run(addProperty(user_id, property_data))
-        bot.register_next_step_handler(message, nextStepHandler)
+        await setInputStep('main', user_id, 'setPropertyData')
 
+@input_steps.handler()
+@exceptions_catcher()
+async def setPropertyData(message: telebot.types.Message, user_id: int) -> None:
+    data = message.text.split(';')
+    property_data = {
+        'address': data[0],
+        'title': data[1] if len(data) > 1 else None,
+    }
+    await addProperty(user_id, property_data)
+
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
-async def propertiesList(user_id: int, page: int=1) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT id, address, title
-            FROM properties
-            WHERE "userID" = $1
-        '''
-        properties = (await conn.fetch(query, user_id))
-    finally:
-        await conn.close()
+async def propertiesList(user_id: int, page: int=1, after: str=None, before: str=None) -> None:
+    async with acquire() as conn:
+        properties_count = (await countRows(conn, user_id, 'properties', PROPERTIES_COUNT_QUERY, user_id))
 
-    properties_count = len(properties)
+        properties = (await properties_keyset.fetchPage(
+            conn, PROPERTIES_LIST_QUERY, user_id, count=properties_count, page=page, after=after, before=before
+        ))
     if properties_count > 0:
         properties_data = tuple([
             {
                 'text': f'{p[2][:20] if p[2] else p[1][:20]}', # p[1] == "address", p[2] == "title"
-                'callback_data': f'start_func-propertyCard-property_id={p[0]}-call_id=True'
+                'callback_data': encodeCallback('propertyCard', property_id=p[0], call_id=True)
             } 
             for p in properties
         ])
-        keyboard = (await paginator(array=properties_data, current_page=page))
+        keyboard = (await paginator(
+            array=properties_data,
+            handler='propertiesList',
+            current_page=page,
+            count=properties_count,
+            cursors=properties_keyset.getCursors(properties),
+        ))
     else:
         keyboard = keyboard_obj()
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
     
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
             *🗂 Список объектов*
 
-            🏡 У Вас *{len(properties)}* объектов.
+            🏡 У Вас *{properties_count}* объектов.
             '''
         ),
         parse_mode="Markdown",
         reply_markup=keyboard,
     )     
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def propertyCard(user_id: int, property_id: int, call_id: int) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT address, title, "addDate"
-            FROM properties
-            WHERE id = $1 
-                AND "userID" = $2 
-        '''
-        property_data = (await conn.fetchrow(query, property_id, user_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        property_data = (await conn.fetchrow(PROPERTY_CARD_QUERY, property_id, user_id))
 
     if property_data is None:
-        bot.answer_callback_query(
+        await api.answer_callback_query(
             callback_query_id=call_id, 
             text=dedent(
             '''
@@ -1004,12 +993,12 @@ async def propertyCard(user_id: int, property_id: int, call_id: int) -> None:
         keyboard.add(
             button_obj(
                 text='🗑 Удалить объект', 
-                callback_data=f'start_func-removeProperty-property_id={property_id}-call_id=True'
+                callback_data=encodeCallback('removeProperty', property_id=property_id, call_id=True)
             )
         )
-        keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+        keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -1022,21 +1011,14 @@ async def propertyCard(user_id: int, property_id: int, call_id: int) -> None:
             reply_markup=keyboard,
         )
 
+@dispatcher.handler()
 @exceptions_catcher()
 async def removeProperty(user_id: int, property_id: int, call_id: int=None, confirmed: bool=False) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT address
-            FROM properties
-            WHERE id = $1 AND "userID" = $2
-        '''
-        property_data = (await conn.fetchrow(query, property_id, user_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        property_data = (await conn.fetchrow(REMOVE_PROPERTY_QUERY, property_id, user_id))
 
     if property_data is None:
-        bot.answer_callback_query(
+        await api.answer_callback_query(
             call_id, 
             dedent(
             '''
@@ -1053,16 +1035,18 @@ async def removeProperty(user_id: int, property_id: int, call_id: int=None, conf
         keyboard = keyboard_obj()
 
         if confirmed:
-            conn = await connect()
-            try:
-                stmt = "DELETE FROM properties WHERE id = $1"
-                await conn.execute(stmt, property_id)
-            finally:
-                await conn.close()
+            async with transaction() as uow:
+                works = (await uow.fetchrow(PROPERTY_WORKS_QUERY, property_id, user_id))
+                await uow.execute(DELETE_PROPERTY_QUERY, property_id)
+
+            # The deleted works disappear from the feeds, which are reloaded instead of removing the works one by one
+            await cancelWorkReminders(*works['works'])
+            await resetFeed(*works['workers'])
+            await resetCounts(user_id, *works['workers'])
 
-            keyboard.add(button_obj(text='🏠 Главное меню', callback_data='start_func-start'))
+            keyboard.add(button_obj(text='🏠 Главное меню', callback_data=encodeCallback('start')))
 
-            bot.send_message(
+            await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -1075,14 +1059,14 @@ async def removeProperty(user_id: int, property_id: int, call_id: int=None, conf
 
         else:
             keyboard.row(
-                button_obj(text='❌ Отмена', callback_data='start_func-back'),
+                button_obj(text='❌ Отмена', callback_data=encodeCallback('back')),
                 button_obj(
                     text='✅ Удалить', 
-                    callback_data=f'start_func-removeProperty-property_id={property_id}&confirmed=True'
+                    callback_data=encodeCallback('removeProperty', property_id=property_id, confirmed=True)
                 )
             )
 
-            bot.send_message(
+            await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -1100,29 +1084,25 @@ async def removeProperty(user_id: int, property_id: int, call_id: int=None, conf
 
 # === Workers ===
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def workersMenu(user_id: int, worker_data_key: str=None) -> None:
     if worker_data_key:
         redis = (await getRedisConnection())
-        redis.delete(worker_data_key)
+        await redis.delete(worker_data_key)
 
     keyboard = keyboard_obj()
-    keyboard.add(button_obj(text='➕ Добавить сотрудника', callback_data='start_func-addWorker'))
-    keyboard.add(button_obj(text='🗂 Список сотрудников', callback_data='start_func-workersList'))
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='➕ Добавить сотрудника', callback_data=encodeCallback('addWorker')))
+    keyboard.add(button_obj(text='🗂 Список сотрудников', callback_data=encodeCallback('workersList')))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
-    conn = await connect()
-    try:
-        workers_query = '''SELECT COUNT(id) FROM "userWorkers" WHERE "userID" = $1'''
-        active_workers_query = '''SELECT COUNT(id) FROM "userWorkers" WHERE "userID" = $1 AND "isActive" IS TRUE'''
-
-        workers = (await conn.fetchrow(workers_query, user_id))[0]
-        active_workers = (await conn.fetchrow(active_workers_query, user_id))[0]
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        counters = (await getUserCounters(conn, user_id))
+    workers = counters['workers']
+    active_workers = counters['activeWorkers']
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -1135,17 +1115,18 @@ async def workersMenu(user_id: int, worker_data_key: str=None) -> None:
         reply_markup=keyboard,
     )
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def addWorker(user_id: int, work_id: int=None) -> None:
     keyboard = keyboard_obj()
-    back_button = button_obj(text='⬅️ Назад', callback_data='start_func-back')
+    back_button = button_obj(text='⬅️ Назад', callback_data=encodeCallback('back'))
 
     if work_id is None:
-        keyboard.add(button_obj(text='🧴 Клининг', callback_data='start_func-addWorker-work_id=1'))
+        keyboard.add(button_obj(text='🧴 Клининг', callback_data=encodeCallback('addWorker', work_id=1)))
         keyboard.add(back_button)
 
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -1161,7 +1142,7 @@ async def addWorker(user_id: int, work_id: int=None) -> None:
     else:
         keyboard.add(back_button)
 
-        message = bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -1177,91 +1158,87 @@ async def addWorker(user_id: int, work_id: int=None) -> None:
             reply_markup=keyboard,
         )
 
-        def nextStepHandler(message):
-            asyncio.run(confirmWorkerData(message))
-        bot.register_next_step_handler(message, nextStepHandler)
+        await setInputStep('main', user_id, 'confirmWorkerData', work_id=work_id)
 
+@input_steps.handler()
+@exceptions_catcher()
+async def confirmWorkerData(message: telebot.types.Message, user_id: int, work_id: int) -> None:
+    back_button = button_obj(text='⬅️ Назад', callback_data=encodeCallback('back'))
 
-    async def confirmWorkerData(message):
-        message_parts = message.text.split(',')
-        name = message_parts[0]
-        if len(message_parts) > 1:
-            number = message_parts[1]
-        else:
-            number = None
+    message_parts = message.text.split(',')
+    name = message_parts[0]
+    if len(message_parts) > 1:
+        number = message_parts[1]
+    else:
+        number = None
 
-        if (len(name) > 36) or (number != None and len(number) > 20):
-            keyboard = keyboard_obj()
-            keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    if (len(name) > 36) or (number != None and len(number) > 20):
+        keyboard = keyboard_obj()
+        keyboard.add(back_button)
 
-            bot.send_message(
-                chat_id=user_id,
-                text=dedent(
-                    f'''
-                    *❌ Слишком длинное имя или номер!*
+        await api.send_message(
+            chat_id=user_id,
+            text=dedent(
+                f'''
+                *❌ Слишком длинное имя или номер!*
 
-                    Максимальная длина имени - *36 символов*, номера телефона - *20*.
-                    '''
-                ),
-                parse_mode="Markdown",
-                reply_markup=keyboard,
-            )
+                Максимальная длина имени - *36 символов*, номера телефона - *20*.
+                '''
+            ),
+            parse_mode="Markdown",
+            reply_markup=keyboard,
+        )
 
-        else:
-            worker_data = json.dumps({
-                'work_id': work_id,
-                'name': name,
-                'number': number,
-            })
-            worker_data_key = str(uuid.uuid4())[:8]
-            redis = await getRedisConnection()
-            redis.set(worker_data_key, worker_data, ex=60*10)
+    else:
+        worker_data = json.dumps({
+            'work_id': work_id,
+            'name': name,
+            'number': number,
+        })
+        worker_data_key = str(uuid.uuid4())[:8]
+        redis = await getRedisConnection()
+        await redis.set(worker_data_key, worker_data, ex=60*10)
 
-            keyboard = keyboard_obj()
-            keyboard.row(
-                button_obj(
-                    text='✅ Подтвердить',
-                    callback_data=f'start_func-createWorkerAddLink-worker_data_key="{worker_data_key}"'
-                ),
-                button_obj(text='❌ Отмена', callback_data=f'start_func-workersMenu-worker_data_key="{worker_data_key}"')
-            )
-            keyboard.add(back_button)
+        keyboard = keyboard_obj()
+        keyboard.row(
+            button_obj(
+                text='✅ Подтвердить',
+                callback_data=encodeCallback('createWorkerAddLink', worker_data_key=worker_data_key)
+            ),
+            button_obj(text='❌ Отмена', callback_data=encodeCallback('workersMenu', worker_data_key=worker_data_key))
+        )
+        keyboard.add(back_button)
 
-            bot.send_message(
-                chat_id=user_id,
-                text=dedent(
-                    f'''
-                    *➕ Добавление сотрудника*
+        await api.send_message(
+            chat_id=user_id,
+            text=dedent(
+                f'''
+                *➕ Добавление сотрудника*
 
-                    Перепроверьте указанную Вами информацию о сотруднике. Если все данные верны - нажмите на кнопку *"Подтвердить"*
+                Перепроверьте указанную Вами информацию о сотруднике. Если все данные верны - нажмите на кнопку *"Подтвердить"*
 
-                    *🪪 Имя*: {name}
-                    *☎️ Номер телефона*: {number if number else 'не указан'}
-                    *⚒  Вид работ*: {getWorkTitle(work_id, add_emoji=True)}
-                    '''
-                ),
-                parse_mode="Markdown",
-                reply_markup=keyboard,
-            )
+                *🪪 Имя*: {name}
+                *☎️ Номер телефона*: {number if number else 'не указан'}
+                *⚒  Вид работ*: {getWorkTitle(work_id, add_emoji=True)}
+                '''
+            ),
+            parse_mode="Markdown",
+            reply_markup=keyboard,
+        )
 
+@dispatcher.handler()
 @exceptions_catcher()
 async def createWorkerAddLink(user_id: int, worker_data_key: str) -> None:
     redis = await getRedisConnection()
-    worker_data = json.loads(redis.get(worker_data_key))
-    redis.delete(worker_data_key)
+    worker_data = json.loads(await redis.get(worker_data_key))
+    await redis.delete(worker_data_key)
 
     worker_add_id = str(uuid.uuid4())
     worker_activation_link = f'https://t.me/RentalerWorkBot?start={worker_add_id}'
 
-    conn = await connect()
-    try:
-        stmt = '''
-            INSERT INTO "userWorkers" ("userID", "workID", "workerName", "workerNumber", "addDate", "addID")
-            VALUES ($1, $2, $3, $4, $5, $6)
-            RETURNING id
-        '''
+    async with acquire() as conn:
         worker_id = (await conn.fetchval(
-                        stmt, 
+                        ADD_WORKER_QUERY, 
                         user_id, 
                         worker_data['work_id'], 
                         worker_data['name'],
@@ -1269,18 +1246,17 @@ async def createWorkerAddLink(user_id: int, worker_data_key: str) -> None:
                         datetime.datetime.now(),
                         worker_add_id
                     ))
-    finally:
-        await conn.close()
+    await resetCounts(user_id)
 
     keyboard = keyboard_obj()
     keyboard.add(
         button_obj(
             text='🧑🏼‍🔧 Карточка сотрудника', 
-            callback_data=f'start_func-workerCard-worker_id={worker_id}-call_id=True'
+            callback_data=encodeCallback('workerCard', worker_id=worker_id, call_id=True)
         )
     )
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -1297,28 +1273,24 @@ async def createWorkerAddLink(user_id: int, worker_data_key: str) -> None:
         reply_markup=keyboard,
     )     
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
-async def workersList(user_id: int, page: int=1) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT id, "workerName", "workID", "isActive"
-            FROM "userWorkers"
-            WHERE "userID" = $1
-        '''
-        workers = (await conn.fetch(query, user_id))
-    finally:
-        await conn.close()
+async def workersList(user_id: int, page: int=1, after: str=None, before: str=None) -> None:
+    async with acquire() as conn:
+        works_workers = (await conn.fetch(WORKERS_TOTALS_QUERY, user_id))
+        workers_count = sum(w['workers'] for w in works_workers)
+
+        workers = (await workers_keyset.fetchPage(
+            conn, WORKERS_LIST_QUERY, user_id, count=workers_count, page=page, after=after, before=before
+        ))
 
-    workers_count = len(workers)
     if workers_count > 0:
-        active_workers_count = len([w for w in workers if w[3]]) # w[3] == "isActive" column
+        active_workers_count = sum(w['active_workers'] for w in works_workers)
 
-        work_workers_count = collections.Counter(w[2] for w in workers)
         workers_by_works_text = '\n'.join(
-            f'*{getWorkTitle(k, add_emoji=True)}:* {v} сотрудников'
-            for (k,v) in work_workers_count.items()
+            f"*{getWorkTitle(w['workID'], add_emoji=True)}:* {w['workers']} сотрудников"
+            for w in works_workers
         )
 
         message_text = f'''
@@ -1339,11 +1311,17 @@ async def workersList(user_id: int, page: int=1) -> None:
         workers_data = tuple([
             {
                 'text': f'{is_active_emoji[w[3]]} {w[1][:10]} ({getWorkTitle(w[2], add_emoji=True)})', 
-                'callback_data': f'start_func-workerCard-worker_id={w[0]}-call_id=True'
+                'callback_data': encodeCallback('workerCard', worker_id=w[0], call_id=True)
             } 
             for w in workers
         ])
-        keyboard = (await paginator(array=workers_data, current_page=page))
+        keyboard = (await paginator(
+            array=workers_data,
+            handler='workersList',
+            current_page=page,
+            count=workers_count,
+            cursors=workers_keyset.getCursors(workers),
+        ))
     else:
         message_text = f'''
             *🗂 Список сотрудников*
@@ -1352,31 +1330,24 @@ async def workersList(user_id: int, page: int=1) -> None:
         '''
         keyboard = keyboard_obj()
 
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
     
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(message_text),
         parse_mode="Markdown",
         reply_markup=keyboard,
     )     
 
+@dispatcher.handler()
 @exceptions_catcher()
 @autoSetState()
 async def workerCard(user_id: int, worker_id: int, call_id: int) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT id, "workID", "workerName", "workerNumber", "addDate", "isActive"
-            FROM "userWorkers"
-            WHERE (id = $1 OR "workerID" = $1) AND "userID" = $2
-        '''
-        worker = (await conn.fetchrow(query, worker_id, user_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        worker = (await conn.fetchrow(WORKER_CARD_QUERY, worker_id, user_id))
 
     if worker is None:
-        bot.answer_callback_query(
+        await api.answer_callback_query(
             callback_query_id=call_id, 
             text=dedent(
             '''
@@ -1403,12 +1374,12 @@ async def workerCard(user_id: int, worker_id: int, call_id: int) -> None:
         keyboard.add(
             button_obj(
                 text='🗑 Удалить сотрудника', 
-                callback_data=f'start_func-removeUserWorker-worker_id={worker_id}-call_id=True'
+                callback_data=encodeCallback('removeUserWorker', worker_id=worker_id, call_id=True)
             )
         )
-        keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+        keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -1423,21 +1394,14 @@ async def workerCard(user_id: int, worker_id: int, call_id: int) -> None:
             reply_markup=keyboard,
         )     
         
+@dispatcher.handler()
 @exceptions_catcher()
 async def removeUserWorker(user_id: int, worker_id: int, call_id: int=None, confirmed: bool=False) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT "workID", "workerName"
-            FROM "userWorkers"
-            WHERE id = $1 AND "userID" = $2
-        '''
-        worker = (await conn.fetchrow(query, worker_id, user_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        worker = (await conn.fetchrow(REMOVE_WORKER_QUERY, worker_id, user_id))
 
     if worker is None:
-        bot.answer_callback_query(
+        await api.answer_callback_query(
             call_id, 
             dedent(
             '''
@@ -1455,19 +1419,16 @@ async def removeUserWorker(user_id: int, worker_id: int, call_id: int=None, conf
         keyboard = keyboard_obj()
 
         if confirmed:
-            conn = await connect()
-            try:
-                stmt = '''
-                    DELETE FROM "userWorkers"
-                    WHERE id = $1
-                '''
-                await conn.execute(stmt, worker_id)
-            finally:
-                await conn.close()
+            async with acquire() as conn:
+                await conn.execute(DELETE_WORKER_QUERY, worker_id)
+
+            # The works of the landlord are not visible to the worker any more
+            await resetFeed(worker[2])
+            await resetCounts(*filter(None, (user_id, worker[2])))
 
-            keyboard.add(button_obj(text='🏠 Главное меню', callback_data='start_func-start'))
+            keyboard.add(button_obj(text='🏠 Главное меню', callback_data=encodeCallback('start')))
 
-            bot.send_message(
+            await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -1480,14 +1441,14 @@ async def removeUserWorker(user_id: int, worker_id: int, call_id: int=None, conf
 
         else:
             keyboard.row(
-                button_obj(text='❌ Отмена', callback_data='start_func-back'),
+                button_obj(text='❌ Отмена', callback_data=encodeCallback('back')),
                 button_obj(
                     text='✅ Удалить', 
-                    callback_data=f'start_func-removeUserWorker-worker_id={worker_id}&confirmed=True'
+                    callback_data=encodeCallback('removeUserWorker', worker_id=worker_id, confirmed=True)
                 )
             )
 
-            bot.send_message(
+            await api.send_message(
                 chat_id=user_id,
                 text=dedent(
                     f'''
@@ -1508,161 +1469,100 @@ async def removeUserWorker(user_id: int, worker_id: int, call_id: int=None, conf
     func=lambda call: call.data.startswith(calendar_callback.prefix)
 )
 def calendarCallbackHander(call: telebot.types.CallbackQuery):
-    asyncio.run(calendarDataHandler(call))
+    runtime.submit(calendarDataHandler(call))
 
+@exceptions_catcher()
 async def calendarDataHandler(call: telebot.types.CallbackQuery):
     "Process calendars callbacks"
 
     calendar_data = call.data.split(calendar_callback.sep)
     name, action, year, month, day, start_func, redis_data_key = calendar_data
 
-    date = calendar.calendar_query_handler(
-        bot=bot, call=call, name=name, action=action, year=year, month=month, day=day, start_func=start_func, redis_data_key=redis_data_key
+    date = await calendar.calendar_query_handler(
+        bot=api, call=call, name=name, action=action, year=year, month=month, day=day, start_func=start_func, redis_data_key=redis_data_key
     )
 
     if action == "DAY":
         user_id = call.from_user.id
 
-        redis = (await getRedisConnection())
-        if redis.exists(redis_data_key):
-            values_dict = json.loads(redis.get(redis_data_key))
-        else:
-            values_dict = dict()
-        values_dict['date'] = f'{year}-{month}-{day}'
-        redis.set(redis_data_key, json.dumps(values_dict), ex=60*10)
-
-        await eval(f'{start_func}(user_id={user_id}, redis_data_key="{redis_data_key}")')
+        await dispatcher.dispatch(
+            start_func,
+            user_id=user_id,
+            redis_data_key=redis_data_key,
+            date=datetime.date(int(year), int(month), int(day)),
+        )
 
     elif action == "CANCEL":
-        call.data = 'start_func-back'
+        call.data = encodeCallback('back')
         await statesRunner(call)
 
 
 # Getter of any callback queries in the chat
 @bot.callback_query_handler(lambda call: True)
 def callbackHandler(call: telebot.types.CallbackQuery):
-    asyncio.run(statesRunner(call))
+    runtime.submit(statesRunner(call))
 
 @exceptions_catcher()
 async def statesRunner(call: telebot.types.CallbackQuery):
     "Runs required states."
 
     user_id = call.from_user.id
-    data = call.data.split('-') # 0 - command; 1 - command args; 2 - kwargs; 3: - parameters
-    command = data[0]
-
-    if command == 'start_func':
-        # List which have all the functions from the __main__ module
-        functions_list = [
-            name for (name, obj) 
-                in vars(sys.modules['__main__']).items() 
-                if hasattr(obj, "__class__") 
-                    and obj.__class__.__name__ == "function"
-        ]
-
-        func = data[1]
-        if 'back' != func not in functions_list:
-            raise NotFound
-
-        elif func == 'back': 
-            "Runs previous user state."
-
-            # Clear available next step handlers
-            bot.clear_step_handler_by_chat_id(chat_id=user_id)
-
-            current_state = (await getState(bot='main', user_id=user_id))
-            if current_state:
-                last_state = current_state['last_state']
-                last_state['is_back'] = True
-            else:
-                last_state = None
 
-            if last_state is None:
-                await start(user_id=user_id)
+    if isPackedCallback(call.data):
+        callback = (await unpackCallback(call.data))
+    else:
+        # Buttons which were sent before the packed callback data
+        callback = parseLegacyCallback(call.data)
+        if callback is None:
+            return
+        if callback['handler'] != 'back':
+            callback['kwargs'] = dispatcher.parseArguments(callback['handler'], callback['arguments'])
 
-            func = last_state['func']
-            args = last_state['args']
-            kwargs = [
-                f'{k}={v}' if isinstance(v, int) else f'{k}="{v}"'
-                for k,v in last_state['kwargs'].items()
-            ]
+    func = callback['handler']
 
-            if len(set(('user_id', 'message', 'call')) & set(last_state['kwargs'].keys())) == 0 \
-                and len(args) == 0:
-                    kwargs.insert(0, f'user_id={user_id}')
+    if func == 'back': 
+        "Runs previous user state."
 
-            # Setting the past state as the current one 
-            await setState('main', user_id, last_state)
+        # Clear available next step handlers
+        await delInputStep(bot='main', user_id=user_id)
 
-        else:
-            "Runs required function with kwargs."
-
-            if len(data) > 2 and data[2] != '':
-                args = []
-                kwargs = data[2].split('&')
-                kwargs.insert(0, f'user_id={user_id}')
-            else:
-                args, kwargs = [], []
-                kwargs.insert(0, f'user_id={user_id}')
-            
-            if len(data) > 3:
-                parameters = data[3].split('&')
-                if 'user_id=None' in parameters:
-                    del kwargs[0] # Remove user_id from kwargs
-                if 'call_id=True':
-                    kwargs.append(f'call_id=call.id')
-
-
-        # Deleting a bot message from a previous state
-        try:
-            bot.delete_message(chat_id=user_id, message_id=call.message.message_id)
-        except telebot.apihelper.ApiTelegramException:
-            pass
-    
-        func_arguments = [*args, *kwargs]
-        func_arguments_string = ', '.join(func_arguments)
-        await eval(f"{func}({func_arguments_string})")
-
-    elif command == 'set_redis_data':
-        "Adds value to redis by key from callback"
+        # The previous state becomes current
+        last_state = (await popState(bot='main', user_id=user_id))
 
-        key = data[1]
-        kwargs = data[2].split('&')
-
-        redis = (await getRedisConnection())
-        if redis.exists(key):
-            values_dict = json.loads(redis.get(key))
+        if last_state is None:
+            func, args, kwargs = 'start', [], {'user_id': user_id}
         else:
-            values_dict = dict()
-
-        for kw in kwargs:
-            k = kw.split('=')[0]
-            v = kw.split('=')[1]
-            values_dict[k] = v
+            func = last_state['func']
+            args = []
+            kwargs = {**last_state['kwargs'], 'user_id': user_id}
+            restoring_state.set(True)
 
-        redis.set(key, json.dumps(values_dict), ex=60*10)
+    else:
+        "Runs required function with kwargs."
 
-        if len(data) > 3:
-            parameters = data[3].split('&')
-            for p in parameters:
-                p_key = p.split('=')[0]
-                p_value = p.split('=')[1]
+        args = []
+        kwargs = dispatcher.checkArguments(func, callback['kwargs'])
+        kwargs['user_id'] = user_id
+        if callback['call_id']:
+            kwargs['call_id'] = call.id
 
-                if p_key == 'start_func':
-                    # Deleting a bot message from a previous state
-                    try:
-                        bot.delete_message(chat_id=user_id, message_id=call.message.message_id)
-                    except telebot.apihelper.ApiTelegramException:
-                        pass
+    # Checking the function before deleting the message, so an unknown callback changes nothing
+    dispatcher.getHandler(func)
 
-                    await eval(f'{p_value}(user_id={user_id}, redis_data_key="{key}")')
+    # Deleting a bot message from a previous state
+    try:
+        await api.delete_message(chat_id=user_id, message_id=call.message.message_id)
+    except telebot.apihelper.ApiTelegramException:
+        pass
 
+    await dispatcher.dispatch(func, *args, **kwargs)
 
 
 if __name__ == '__main__':
-    while True: 
-        try:    
-            bot.polling(none_stop=True)
-        except Exception as e:
-            asyncio.run(addLog(level='critical', text=traceback.format_exc(), send_telegram_message=True))
-        asyncio.run(asyncio.sleep(1))
\ No newline at end of file
+    runtime.start()
+    runtime.submit(broadcast_scheduler.run())
+
+    try:
+        receiveUpdates(bot, 'main')
+    finally:
+        runtime.stop()
@@ -0,0 +1,215 @@
+'''Queries of the main bot handlers.
+They are also explained by `query_audit`, so a changed query is audited as it is run.'''
+
+from ..pagination import Keyset
+
+import datetime
+
+
+# Ordering of the paginated lists
+cleaning_keyset = Keyset(('date', 'date', datetime.date.fromisoformat), ('id', 'id', int))
+properties_keyset = Keyset(('id', 'id', int))
+workers_keyset = Keyset(('id', 'id', int))
+
+
+ADD_USER_QUERY = '''
+    INSERT INTO users (id, "regDate")
+    VALUES ($1, $2)
+'''
+
+# Planning context of a new cleaning draft: the active cleaners and the properties of the landlord
+ADD_CLEANING_CONTEXT_QUERY = '''
+    SELECT
+        ARRAY(
+            SELECT "workerID"
+            FROM "userWorkers"
+            WHERE "userID" = $1
+                AND "workID" = $2
+                AND "workerID" IS NOT NULL
+                AND "isActive" IS TRUE
+        ) AS cleaners,
+        ARRAY(
+            SELECT json_build_array(id, address, title)::text
+            FROM properties
+            WHERE "userID" = $1
+            ORDER BY id
+        ) AS properties
+'''
+
+# Works of a landlord by `only_completed`
+CLEANING_CONDITIONS = {
+    False: '''
+        "userID" = $1
+        AND "workID" = $2
+        AND "completedDate" IS NULL
+    ''',
+    True: '''
+        "userID" = $1
+        AND "workID" = $2
+        AND "completedDate" IS NOT NULL
+    ''',
+}
+
+CLEANING_COUNT_QUERY = '''
+    SELECT COUNT(id)
+    FROM "userWorks"
+    WHERE {conditions}
+'''
+
+CLEANING_LIST_QUERY = '''
+    SELECT id, date, "timeRange", "acceptanceConfirmed"
+    FROM "userWorks"
+    WHERE {conditions}
+'''
+
+# The work and its cleaning details are inserted by one statement
+ADD_CLEANING_QUERY = '''
+    WITH work AS (
+        INSERT INTO "userWorks"
+        ("userID", "propertyID", "workID", "date", "timeRange", "comment", "addDate")
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        RETURNING id, "propertyID"
+    ), details AS (
+        INSERT INTO cleaning ("workID", "hygieneKitsCount")
+        SELECT id, $8 FROM work
+    )
+    SELECT work.id, p.address
+    FROM work
+    JOIN properties p ON p.id = work."propertyID"
+'''
+
+CLEANING_CARD_QUERY = '''
+    SELECT
+        w.id,
+        w."propertyID", p."address",
+        w."workerID", uw."workerName",
+        w.date, w."timeRange",
+        w."acceptForWorkDate", w."acceptanceConfirmed", w."completedDate",
+        w.comment,
+        w."addDate",
+        c."hygieneKitsCount"
+    FROM "userWorks" w
+    JOIN cleaning c
+        ON c."workID" = w.id
+    JOIN properties p
+        ON p.id = w."propertyID"
+    LEFT JOIN "userWorkers" uw
+        ON uw."workerID" = w."workerID"
+    WHERE w.id = $1
+'''
+
+REMOVE_CLEANING_QUERY = '''
+    SELECT
+        w.id, w."workerID", w.date, w."timeRange", p.address
+    FROM "userWorks" w
+    JOIN properties p
+        ON p.id = w."propertyID"
+    WHERE
+        w.id = $1 AND w."userID" = $2
+'''
+
+# The cleaning details are deleted by the cascade
+DELETE_CLEANING_QUERY = '''
+    DELETE FROM "userWorks"
+    WHERE id = $1
+'''
+
+ADD_PROPERTY_QUERY = '''
+    INSERT INTO properties ("userID", address, title, "addDate")
+    VALUES ($1, $2, $3, $4)
+    RETURNING id
+'''
+
+PROPERTIES_COUNT_QUERY = '''
+    SELECT COUNT(id)
+    FROM properties
+    WHERE "userID" = $1
+'''
+
+PROPERTIES_LIST_QUERY = '''
+    SELECT id, address, title
+    FROM properties
+    WHERE "userID" = $1
+'''
+
+PROPERTY_CARD_QUERY = '''
+    SELECT address, title, "addDate"
+    FROM properties
+    WHERE id = $1
+        AND "userID" = $2
+'''
+
+REMOVE_PROPERTY_QUERY = '''
+    SELECT address
+    FROM properties
+    WHERE id = $1 AND "userID" = $2
+'''
+
+# Works of a property which is being deleted: the uncompleted ones have reminders,
+# the feeds and the counts of their workers and of the active workers of the landlord are changed
+PROPERTY_WORKS_QUERY = '''
+    SELECT
+        ARRAY(
+            SELECT id
+            FROM "userWorks"
+            WHERE "propertyID" = $1
+                AND "completedDate" IS NULL
+        ) AS works,
+        ARRAY(
+            SELECT "workerID"
+            FROM "userWorks"
+            WHERE "propertyID" = $1
+                AND "workerID" IS NOT NULL
+            UNION
+            SELECT "workerID"
+            FROM "userWorkers"
+            WHERE "userID" = $2
+                AND "workerID" IS NOT NULL
+                AND "isActive" IS TRUE
+        ) AS workers
+'''
+
+# The works of the property and their details are deleted by the cascade
+DELETE_PROPERTY_QUERY = '''
+    DELETE FROM properties
+    WHERE id = $1
+'''
+
+WORKERS_TOTALS_QUERY = '''
+    SELECT
+        "workID",
+        COUNT(id) AS workers,
+        COUNT(id) FILTER (WHERE "isActive" IS TRUE) AS active_workers
+    FROM "userWorkers"
+    WHERE "userID" = $1
+    GROUP BY "workID"
+'''
+
+ADD_WORKER_QUERY = '''
+    INSERT INTO "userWorkers" ("userID", "workID", "workerName", "workerNumber", "addDate", "addID")
+    VALUES ($1, $2, $3, $4, $5, $6)
+    RETURNING id
+'''
+
+WORKERS_LIST_QUERY = '''
+    SELECT id, "workerName", "workID", "isActive"
+    FROM "userWorkers"
+    WHERE "userID" = $1
+'''
+
+WORKER_CARD_QUERY = '''
+    SELECT id, "workID", "workerName", "workerNumber", "addDate", "isActive"
+    FROM "userWorkers"
+    WHERE (id = $1 OR "workerID" = $1) AND "userID" = $2
+'''
+
+REMOVE_WORKER_QUERY = '''
+    SELECT "workID", "workerName", "workerID"
+    FROM "userWorkers"
+    WHERE id = $1 AND "userID" = $2
+'''
+
+DELETE_WORKER_QUERY = '''
+    DELETE FROM "userWorkers"
+    WHERE id = $1
+'''
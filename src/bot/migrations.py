@@ -0,0 +1,56 @@
+from .db import connect
+
+import asyncio
+import pathlib
+import datetime
+
+
+# SQL files `<version>_<name>.sql` are applied once each, in the order of their names
+MIGRATIONS_PATH = pathlib.Path(__file__).resolve().parents[2] / 'migrations'
+# Only one process applies migrations at a time
+MIGRATIONS_LOCK_ID = 720301
+
+
+async def getAppliedMigrations(conn) -> set[str]:
+    stmt = '''
+        CREATE TABLE IF NOT EXISTS "schemaMigrations" (
+            version VARCHAR(200) PRIMARY KEY,
+            "appliedDate" TIMESTAMP NOT NULL
+        )
+    '''
+    await conn.execute(stmt)
+
+    return {r['version'] for r in (await conn.fetch('SELECT version FROM "schemaMigrations"'))}
+
+async def migrate() -> list[str]:
+    '''Applies the new migrations from `MIGRATIONS_PATH`, every one in its own transaction.
+    Returns the names of the applied migrations.'''
+
+    conn = await connect()
+    applied = []
+    try:
+        await conn.execute('SELECT pg_advisory_lock($1)', MIGRATIONS_LOCK_ID)
+        done = (await getAppliedMigrations(conn))
+
+        for path in sorted(MIGRATIONS_PATH.glob('*.sql')):
+            if path.stem in done:
+                continue
+
+            async with conn.transaction():
+                await conn.execute(path.read_text(encoding='utf-8'))
+                stmt = '''
+                    INSERT INTO "schemaMigrations" (version, "appliedDate")
+                    VALUES ($1, $2)
+                '''
+                await conn.execute(stmt, path.stem, datetime.datetime.now())
+            applied.append(path.stem)
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATIONS_LOCK_ID)
+        await conn.close()
+
+    return applied
+
+
+if __name__ == '__main__':
+    applied = asyncio.run(migrate())
+    print('\n'.join(f'Applied: {name}' for name in applied) or 'Nothing to apply')
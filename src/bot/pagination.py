@@ -1,61 +1,230 @@
+from .callbacks import packCallback
+from .cache import LRUCache
+from .storage import getRedisConnection
+
 import math
-import inspect
 from telebot import types
 
 
+# Cached numbers of rows in the lists, they are also reset by the handlers which change the lists
+COUNTS_TTL = 60*5
+CURSOR_SEPARATOR = '_'
+
+
+# Built pages by (handler, page, pages count, page items, cursors, kwargs).
+# The key contains everything the page depends on, so a changed list never gets a stale page.
+# Values are the button rows, every call gets a new keyboard which the caller can extend.
+pages_cache = LRUCache(maxsize=2000, ttl=60*60)
+
+
+class Keyset:
+    '''Keyset pagination of a query by unique ordered columns.
+    A page is read by the cursor of the neighbouring page edge, so page N costs as much as the first one.
+
+    Usage:
+        keyset = Keyset(('w.date', 'date', datetime.date.fromisoformat), ('w.id', 'id', int))
+        rows = await keyset.fetchPage(conn, query, user_id, count=count, page=page, after=after, before=before)
+        keyboard = await paginator(array, 'cleaningList', page, count=count, cursors=keyset.getCursors(rows))
+    '''
+
+    def __init__(self, *columns: tuple[str, str, callable]):
+        '''
+        :param columns: `(sql expression, row field, parser of the cursor value)` of every ordering column.
+        '''
+
+        self.columns = columns
+
+    def encode(self, row) -> str:
+        return CURSOR_SEPARATOR.join(str(row[field]) for _, field, _ in self.columns)
+
+    def decode(self, cursor: str) -> list:
+        values = cursor.split(CURSOR_SEPARATOR)
+        if len(values) != len(self.columns):
+            raise ValueError(f'Invalid cursor: {cursor}')
+        return [parser(v) for (_, _, parser), v in zip(self.columns, values)]
+
+    def getCursors(self, rows: list) -> tuple[str, str] | None:
+        "Returns the cursors of the first and the last rows of a page."
+
+        if not rows:
+            return None
+        return self.encode(rows[0]), self.encode(rows[-1])
+
+    def orderBy(self, descending: bool=False) -> str:
+        direction = 'DESC' if descending else 'ASC'
+        return ', '.join(f'{expression} {direction}' for expression, _, _ in self.columns)
+
+    def pageQuery(
+        self,
+        query: str,
+        args_count: int,
+        cursor: str=None,
+        descending: bool=False,
+        limit: int=5,
+        offset: int=0,
+    ) -> str:
+        '''Returns the query of a page.
+
+        :param query: `SELECT ... FROM ... WHERE ...` without `ORDER BY` and `LIMIT`.
+        :param args_count: number of the query arguments, the cursor values follow them.
+        :param cursor: `after` or `before` to read the rows after or before the cursor values.
+        :param descending: read the rows from the end.
+        '''
+
+        if cursor:
+            columns = ', '.join(expression for expression, _, _ in self.columns)
+            placeholders = ', '.join(f'${args_count + i + 1}' for i in range(len(self.columns)))
+            query = f"{query} AND ({columns}) {'>' if cursor == 'after' else '<'} ({placeholders})"
+        return f"{query} ORDER BY {self.orderBy(descending)} LIMIT {limit} OFFSET {offset}"
+
+    async def fetchPage(
+        self,
+        conn,
+        query: str,
+        *args,
+        count: int,
+        per_page: int=5,
+        page: int=1,
+        after: str=None,
+        before: str=None,
+    ) -> list:
+        '''Returns the rows of a page in ascending order.
+
+        :param conn: database connection.
+        :param query: `SELECT ... FROM ... WHERE ...` without `ORDER BY` and `LIMIT`.
+        :param args: query arguments.
+        :param count: number of rows of the whole list.
+        :param per_page: number of rows per page.
+        :param page: page number, is used when there is no cursor (first or last page).
+        :param after: cursor of the last row of the previous page.
+        :param before: cursor of the first row of the next page.
+        '''
+
+        base_query, base_args = query, args
+        cursor = None
+        descending = False
+        offset = 0
+        limit = per_page
+        pages_count = max(math.ceil(count / per_page), 1)
+
+        if after or before:
+            cursor = 'after' if after else 'before'
+            args = (*args, *self.decode(after or before))
+            descending = cursor == 'before'
+        elif page > 1 and page >= pages_count:
+            # The last page is read from the end, it may be shorter than the others
+            descending = True
+            limit = count - (pages_count - 1) * per_page
+        elif page > 1:
+            # Page without a cursor, e.g. from an old button
+            offset = (page - 1) * per_page
+
+        rows = (await conn.fetch(
+            self.pageQuery(query, len(base_args), cursor, descending, limit, offset),
+            *args,
+        ))
+        if not rows and (after or before):
+            # The rows around the cursor were deleted
+            return await self.fetchPage(conn, base_query, *base_args, count=count, per_page=per_page)
+
+        return list(reversed(rows)) if descending else list(rows)
+
+
+async def countRows(conn, owner: int, name: str, query: str, *args) -> int:
+    '''Returns the number of rows of a list, the value is cached in Redis for `COUNTS_TTL`.
+
+    :param conn: database connection.
+    :param owner: id of the user whose list is counted, the cached values are reset by him.
+    :param name: name of the list (with its filters) among the lists of the user.
+    :param query: `SELECT COUNT(*) ...` query.
+    :param args: query arguments.
+    '''
+
+    redis = (await getRedisConnection())
+    key = f"counts=user={owner}"
+
+    count = (await redis.hget(key, name))
+    if count is not None:
+        return int(count)
+
+    count = (await conn.fetchval(query, *args))
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, name, count)
+        pipe.expire(key, COUNTS_TTL, nx=True)
+        await pipe.execute()
+
+    return count
+
+async def resetCounts(*owners: int) -> None:
+    "Resets the cached numbers of rows of the users lists, must be called after they are changed."
+
+    redis = (await getRedisConnection())
+    await redis.delete(*(f"counts=user={owner}" for owner in owners))
+
+
 async def paginator(
-    array: tuple[dict], 
-    per_page: int=5, 
+    array: tuple[dict],
+    handler: str,
     current_page: int=1,
+    per_page: int=5,
+    count: int=None,
+    cursors: tuple[str, str]=None,
     **kwargs
 ) -> types.InlineKeyboardMarkup:
-    '''Creates a keyboard with objects from array and pagination buttons.
-    
-    :param array: tuple of objects for pagination.
-    :param per_page: number of objects per page.
+    '''Creates a keyboard with objects of a page and pagination buttons.
+
+    :param array: tuple of objects of the current page.
+    :param handler: name of the function which is called by the pagination buttons with the `page` argument.
     :param current_page: current page number.
+    :param per_page: number of objects per page.
+    :param count: number of objects in the whole list.
+    :param cursors: keyset cursors of the first and the last objects of the page (see `Keyset.getCursors`),
+        the buttons of the neighbouring pages get them as `before` and `after` arguments.
+    :param kwargs: arguments of the handler which are kept on other pages.
     '''
 
+    if count is None:
+        count = len(array)
+    pages_count = math.ceil(count / per_page)
+    items = tuple((i['text'], i['callback_data']) for i in array[:per_page])
+
+    cache_key = (handler, current_page, pages_count, items, cursors, tuple(sorted(kwargs.items())))
+    rows = pages_cache.get(cache_key)
+    if rows is None:
+        rows = (await buildPage(items, handler, current_page, pages_count, cursors, kwargs))
+        pages_cache.set(cache_key, rows)
+
     keyboard = types.InlineKeyboardMarkup()
     button = types.InlineKeyboardButton
+    for row in rows:
+        keyboard.row(*(button(text=text, callback_data=callback_data) for text, callback_data in row))
+
+    return keyboard
+
+async def buildPage(
+    items: tuple,
+    handler: str,
+    current_page: int,
+    pages_count: int,
+    cursors: tuple[str, str] | None,
+    kwargs: dict,
+) -> tuple:
+    "Returns the button rows `((text, callback_data), ...)` of a page."
+
+    rows = [((text, callback_data),) for text, callback_data in items]
 
-    pages_count = math.ceil(len(array) / per_page)
-    last_index = per_page * current_page
-    first_index = last_index - per_page
-    
-    for i in array[first_index:last_index]:
-        keyboard.add(button(text=i['text'], callback_data=i['callback_data']))
-
-    # Get the name of the func calling paginator
-    stack = inspect.stack()
-    caller_func = stack[1].function 
-
-    if kwargs:
-        kwargs_parts = []
-        for k, v in kwargs.items():
-            if isinstance(v, int): form = f'{k}={v}'
-            else: form = f'{k}="{v}"'
-            kwargs_parts.append(form)
-        kwargs = '&'.join(kwargs_parts)
-    else:
-        kwargs = ''
-
-
-    manage_buttons = {
-        'previous': button(text='⬅️', callback_data=f'start_func-{caller_func}-page={current_page-1}&{kwargs}'),
-        'current': button(text=f'{current_page} / {pages_count}', callback_data='#'),
-        'next': button(text='➡️', callback_data=f'start_func-{caller_func}-page={current_page+1}&{kwargs}'),
-        'first': button(text='⏪', callback_data=f'start_func-{caller_func}-page=1&{kwargs}'),
-        'last': button(text='⏩', callback_data=f'start_func-{caller_func}-page={pages_count}&{kwargs}'),
-        'empty': button(text=' ', callback_data=f'#'),
-    }
     if pages_count > 1:
-        keyboard.row(
-            manage_buttons['first'] if current_page != 1 else manage_buttons['empty'],
-            manage_buttons['previous'] if current_page != 1 else manage_buttons['empty'],
-            manage_buttons['current'],
-            manage_buttons['next'] if current_page != pages_count else manage_buttons['empty'],
-            manage_buttons['last'] if current_page != pages_count else manage_buttons['empty'],
-        )
-
-    return keyboard
\ No newline at end of file
+        before, after = cursors if cursors else (None, None)
+        previous_page = {'page': current_page-1, 'before': before} if before else {'page': current_page-1}
+        next_page = {'page': current_page+1, 'after': after} if after else {'page': current_page+1}
+
+        empty = (' ', '#')
+        rows.append((
+            ('⏪', (await packCallback(handler, page=1, **kwargs))) if current_page != 1 else empty,
+            ('⬅️', (await packCallback(handler, **previous_page, **kwargs))) if current_page != 1 else empty,
+            (f'{current_page} / {pages_count}', '#'),
+            ('➡️', (await packCallback(handler, **next_page, **kwargs))) if current_page != pages_count else empty,
+            ('⏩', (await packCallback(handler, page=pages_count, **kwargs))) if current_page != pages_count else empty,
+        ))
+
+    return tuple(rows)
@@ -0,0 +1,273 @@
+'''Checks the plans of the hot queries of the bots.
+
+Every query is run through `EXPLAIN (ANALYZE, BUFFERS)` inside a rolled back transaction, so the writes are
+audited too, a sequential scan which reads more rows than the threshold is reported as a problem.
+Must be run on a local copy of the database, `--seed` fills it with generated data first:
+
+    python -m src.bot.query_audit --seed 20000 --threshold 1000
+'''
+
+from .db import connect
+from .counters import USER_COUNTERS_QUERY, USER_WORK_COUNTERS_QUERY, WORKER_WORK_COUNTERS_QUERY
+from .main_bot import queries as main_queries
+from .work_bot import queries as work_queries
+from .work_bot.feed import FEED_CONDITIONS, FEED_QUERY, FEED_COUNT_QUERY, CACHED_FEED_QUERY, WORK_WORKERS_QUERY, works_keyset
+from .work_bot.reminders import REMINDERS_QUERY, WORK_REMINDER_QUERY
+
+import sys
+import json
+import asyncio
+import argparse
+
+
+AUDITED_TABLES = ('userWorks', 'userWorkers', 'properties', 'cleaning')
+
+
+def pageQueries(name: str, keyset, query: str, argument_names: tuple, cursor_names: tuple) -> tuple:
+    "Returns the audited queries of a paginated list: the first page, a page after a cursor and the last page."
+
+    return (
+        (f'{name}: first page', keyset.pageQuery(query, len(argument_names)), argument_names),
+        (
+            f'{name}: page after',
+            keyset.pageQuery(query, len(argument_names), cursor='after'),
+            (*argument_names, *cursor_names),
+        ),
+        (f'{name}: last page', keyset.pageQuery(query, len(argument_names), descending=True), argument_names),
+    )
+
+
+# The statements which the foreign keys run on a delete. Their plans are not shown by `EXPLAIN` of the delete,
+# so they are audited separately: a cascade by a column without an index scans the whole table.
+CASCADE_WORKS_QUERY = 'DELETE FROM "userWorks" WHERE "propertyID" = $1'
+CASCADE_CLEANING_QUERY = 'DELETE FROM cleaning WHERE "workID" = $1'
+
+
+# (name, query, names of the sample arguments)
+# The queries are the constants which are run by the handlers.
+AUDIT_QUERIES = (
+    ('main.addUser', main_queries.ADD_USER_QUERY, ('new_user_id', 'now')),
+    ('main.addCleaning: context', main_queries.ADD_CLEANING_CONTEXT_QUERY, ('user_id', 'work_kind')),
+    (
+        'main.addCleaning: insert',
+        main_queries.ADD_CLEANING_QUERY,
+        ('user_id', 'property_id', 'work_kind', 'date', 'time_range', 'text', 'now', 'work_kind'),
+    ),
+    ('main.cleaningMenu: counters', USER_WORK_COUNTERS_QUERY, ('user_id', 'work_kind')),
+    ('main.propertiesMenu: counters', USER_COUNTERS_QUERY, ('user_id',)),
+    *(
+        query
+        for only_completed, conditions in main_queries.CLEANING_CONDITIONS.items()
+        for query in (
+            (
+                f'main.cleaningList (completed: {only_completed}): count',
+                main_queries.CLEANING_COUNT_QUERY.format(conditions=conditions),
+                ('user_id', 'work_kind'),
+            ),
+            *pageQueries(
+                f'main.cleaningList (completed: {only_completed})',
+                main_queries.cleaning_keyset,
+                main_queries.CLEANING_LIST_QUERY.format(conditions=conditions),
+                ('user_id', 'work_kind'),
+                ('date', 'id'),
+            ),
+        )
+    ),
+    ('main.cleaningCard', main_queries.CLEANING_CARD_QUERY, ('work_id',)),
+    ('main.removeCleaning', main_queries.REMOVE_CLEANING_QUERY, ('work_id', 'user_id')),
+    ('main.removeCleaning: delete', main_queries.DELETE_CLEANING_QUERY, ('work_id',)),
+    ('main.removeCleaning: cascade to cleaning', CASCADE_CLEANING_QUERY, ('work_id',)),
+    ('main.addProperty', main_queries.ADD_PROPERTY_QUERY, ('user_id', 'text', 'text', 'now')),
+    ('main.propertiesList: count', main_queries.PROPERTIES_COUNT_QUERY, ('user_id',)),
+    *pageQueries(
+        'main.propertiesList', main_queries.properties_keyset, main_queries.PROPERTIES_LIST_QUERY, ('user_id',), ('id',),
+    ),
+    ('main.propertyCard', main_queries.PROPERTY_CARD_QUERY, ('property_id', 'user_id')),
+    ('main.removeProperty', main_queries.REMOVE_PROPERTY_QUERY, ('property_id', 'user_id')),
+    ('main.removeProperty: works', main_queries.PROPERTY_WORKS_QUERY, ('property_id', 'user_id')),
+    ('main.removeProperty: delete', main_queries.DELETE_PROPERTY_QUERY, ('property_id',)),
+    ('main.removeProperty: cascade to userWorks', CASCADE_WORKS_QUERY, ('property_id',)),
+    ('main.createWorkerAddLink', main_queries.ADD_WORKER_QUERY, ('user_id', 'work_kind', 'text', 'text', 'now', 'new_add_id')),
+    ('main.workersList: totals', main_queries.WORKERS_TOTALS_QUERY, ('user_id',)),
+    *pageQueries(
+        'main.workersList', main_queries.workers_keyset, main_queries.WORKERS_LIST_QUERY, ('user_id',), ('id',),
+    ),
+    ('main.workerCard', main_queries.WORKER_CARD_QUERY, ('worker_id', 'user_id')),
+    ('main.removeUserWorker', main_queries.REMOVE_WORKER_QUERY, ('user_worker_id', 'user_id')),
+    ('main.removeUserWorker: delete', main_queries.DELETE_WORKER_QUERY, ('user_worker_id',)),
+
+    ('work.addWorker', work_queries.WORKER_INVITE_QUERY, ('add_id',)),
+    ('work.addWorker: account', work_queries.ADD_WORKER_ACCOUNT_QUERY, ('worker_id', 'now')),
+    ('work.addWorker: activation', work_queries.ACTIVATE_WORKER_QUERY, ('worker_id', 'add_id')),
+    ('work.start: counters', WORKER_WORK_COUNTERS_QUERY, ('worker_id', 'work_kind')),
+    *(
+        query
+        for status, conditions in FEED_CONDITIONS.items()
+        for query in (
+            (f'work.cleaningList ({status}): count', FEED_COUNT_QUERY.format(conditions=conditions), ('worker_id',)),
+            *pageQueries(
+                f'work.cleaningList ({status})',
+                works_keyset,
+                FEED_QUERY.format(conditions=conditions),
+                ('worker_id',),
+                ('date', 'id'),
+            ),
+        )
+    ),
+    ('work.cleaningList: cached page', CACHED_FEED_QUERY, ('work_ids',)),
+    ('work.cleaningCard', work_queries.CLEANING_CARD_QUERY, ('work_id',)),
+    ('work.acceptCleaning', work_queries.ACCEPT_CLEANING_QUERY, ('work_id',)),
+    ('work.acceptCleaning: take', work_queries.TAKE_CLEANING_QUERY, ('worker_id', 'now', 'work_id')),
+    ('work.acceptCleaning: worker name', work_queries.WORKER_NAME_QUERY, ('worker_id', 'user_id')),
+    ('work.refuseCleaning', work_queries.REFUSE_CLEANING_QUERY, ('work_id', 'worker_id')),
+    ('work.refuseCleaning: free', work_queries.FREE_CLEANING_QUERY, ('work_id', 'worker_id')),
+    ('work.completeCleaning', work_queries.WORKER_WORK_QUERY, ('work_id',)),
+    ('work.completeCleaning: complete', work_queries.COMPLETE_CLEANING_QUERY, ('now', 'worker_id', 'work_id')),
+    ('work.confirmAcceptance: confirm', work_queries.CONFIRM_CLEANING_QUERY, ('worker_id', 'work_id')),
+    ('work.getWorkWorkers', WORK_WORKERS_QUERY, ('work_id',)),
+    ('work.sendWorkReminders', REMINDERS_QUERY, ('tomorrow', 'day_after_tomorrow')),
+    ('work.sendWorkReminder', WORK_REMINDER_QUERY, ('work_id',)),
+)
+
+
+SEED_SCRIPT = '''
+    INSERT INTO users (id, "regDate")
+    SELECT u, now() FROM generate_series(1, $1 / 100 + 1) u
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO workers (id, "regDate")
+    SELECT 1000000 + w, now() FROM generate_series(1, $1 / 50 + 1) w
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO properties ("userID", address, title, "addDate")
+    SELECT p % ($1 / 100 + 1) + 1, 'Address ' || p, NULL, now()
+    FROM generate_series(1, $1 / 10 + 1) p;
+
+    INSERT INTO "userWorkers" ("userID", "workID", "workerID", "workerName", "addDate", "addID", "isActive")
+    SELECT w % ($1 / 100 + 1) + 1, 1, 1000000 + w, 'Worker ' || w, now(), md5(random()::text || w), TRUE
+    FROM generate_series(1, $1 / 50 + 1) w;
+
+    INSERT INTO "userWorks" (
+        "userID", "propertyID", "workID", "workerID", date, "timeRange", "addDate",
+        "acceptForWorkDate", "completedDate"
+    )
+    SELECT
+        p."userID", p.id, 1,
+        CASE WHEN n % 4 = 0 THEN NULL ELSE 1000000 + n % ($1 / 50 + 1) + 1 END,
+        current_date + (n % 730 - 365),
+        '10:00-12:00', now(),
+        CASE WHEN n % 4 = 0 THEN NULL ELSE now() END,
+        CASE WHEN n % 730 < 365 THEN now() ELSE NULL END
+    FROM generate_series(1, $1) n
+    JOIN properties p ON p.id = (SELECT min(id) FROM properties) + n % ($1 / 10 + 1);
+
+    INSERT INTO cleaning ("workID", "hygieneKitsCount")
+    SELECT id, 2 FROM "userWorks" w
+    WHERE NOT EXISTS (SELECT 1 FROM cleaning c WHERE c."workID" = w.id);
+'''
+
+
+async def seedDatabase(conn, works: int) -> None:
+    "Fills the database with generated landlords, workers, properties and `works` cleanings."
+
+    async with conn.transaction():
+        # Every statement is run separately, `execute` with arguments takes only one
+        for stmt in SEED_SCRIPT.split(';'):
+            if stmt.strip():
+                await conn.execute(stmt.replace('$1', str(int(works))))
+
+    for table in AUDITED_TABLES:
+        await conn.execute(f'ANALYZE "{table}"')
+
+
+async def getSampleArguments(conn) -> dict:
+    "Picks the busiest landlord and worker, so the queries read as many rows as possible."
+
+    query = '''
+        SELECT
+            (SELECT "userID" FROM "userWorks" GROUP BY "userID" ORDER BY COUNT(*) DESC LIMIT 1) AS user_id,
+            (SELECT "workerID" FROM "userWorks" WHERE "workerID" IS NOT NULL
+                GROUP BY "workerID" ORDER BY COUNT(*) DESC LIMIT 1) AS worker_id,
+            (SELECT max(id) FROM "userWorks") AS work_id,
+            (SELECT max(id) FROM properties) AS property_id,
+            (SELECT max(id) FROM "userWorkers") AS user_worker_id,
+            (SELECT "addID" FROM "userWorkers" LIMIT 1) AS add_id,
+            1 AS work_kind,
+            current_date AS date,
+            0 AS id,
+            current_date + 1 AS tomorrow,
+            current_date + 2 AS day_after_tomorrow,
+            localtimestamp AS now,
+            'Audit' AS text,
+            '10:00-12:00' AS time_range,
+            (SELECT COALESCE(max(id), 0) + 1 FROM users) AS new_user_id,
+            md5(random()::text) AS new_add_id,
+            ARRAY(SELECT id FROM "userWorks" ORDER BY id DESC LIMIT 5) AS work_ids
+    '''
+    return dict(await conn.fetchrow(query))
+
+
+def findSequentialScans(plan: dict, threshold: int) -> list[str]:
+    "Returns the sequential scans of the audited tables which read more than `threshold` rows."
+
+    problems = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in AUDITED_TABLES:
+        loops = plan.get('Actual Loops', 1)
+        rows = (plan.get('Actual Rows', 0) + plan.get('Rows Removed by Filter', 0)) * loops
+        if rows > threshold:
+            problems.append(f"Seq Scan on {plan['Relation Name']}: {rows} rows")
+
+    for child in plan.get('Plans', []):
+        problems += findSequentialScans(child, threshold)
+    return problems
+
+
+async def auditQueries(conn, threshold: int) -> dict:
+    '''Explains every query of `AUDIT_QUERIES`.
+    Returns `{query name: [problems]}` of the queries with problems.'''
+
+    arguments = (await getSampleArguments(conn))
+    report = dict()
+
+    for name, query, argument_names in AUDIT_QUERIES:
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            explained = (await conn.fetchval(
+                f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}',
+                *(arguments[a] for a in argument_names),
+            ))
+        finally:
+            await transaction.rollback()
+
+        plan = json.loads(explained)[0]['Plan']
+        problems = findSequentialScans(plan, threshold)
+        if problems:
+            report[name] = problems
+
+    return report
+
+
+async def main(seed: int, threshold: int) -> int:
+    conn = await connect()
+    try:
+        if seed:
+            await seedDatabase(conn, seed)
+        report = (await auditQueries(conn, threshold))
+    finally:
+        await conn.close()
+
+    for name, problems in report.items():
+        print(f'{name}:\n' + '\n'.join(f'    {p}' for p in problems))
+    print(f'{len(AUDIT_QUERIES) - len(report)} of {len(AUDIT_QUERIES)} queries passed')
+
+    return 1 if report else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks the plans of the hot queries.')
+    parser.add_argument('--seed', type=int, default=0, help='generate this many cleanings before the audit')
+    parser.add_argument('--threshold', type=int, default=1000, help='maximum rows of a sequential scan')
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.seed, args.threshold)))
@@ -0,0 +1,180 @@
+from .logs import addLog, closeLogs
+from .alerts import reportException
+from .db import closePool
+from .storage import closeRedisConnection
+from .tg_api.queries import closeSessions
+
+import time
+import asyncio
+import threading
+import contextlib
+import concurrent.futures
+from textwrap import dedent
+
+
+class Runtime:
+    '''Long-lived asyncio event loop running in a dedicated thread.
+
+    Telebot calls its handlers from its own worker threads, so every update is submitted
+    to this loop instead of creating a new one with `asyncio.run()`. Thanks to that
+    connection pools and clients created in the loop survive between updates.
+    '''
+
+    def __init__(self, name: str='runtime', report_interval: int=60*10):
+        '''
+        :param name: name of the loop thread.
+        :param report_interval: how often (in seconds) the update overhead is reported to logs.
+        '''
+
+        self.name = name
+        self.report_interval = report_interval
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+        self._collector = threading.local()
+        self._pending = set() # keeps references to the running coroutines
+        self.metrics = {
+            'updates': 0,
+            'failed': 0,
+            'in_flight': 0,
+            'scheduling_delay_total': 0.0,
+            'scheduling_delay_max': 0.0,
+            'handling_time_total': 0.0,
+        }
+
+    def start(self) -> None:
+        "Starts the loop thread, if it is not running yet."
+
+        with self._lock:
+            if self.loop is not None:
+                return
+
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def runLoop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            self.thread = threading.Thread(target=runLoop, name=self.name, daemon=True)
+            self.thread.start()
+            started.wait()
+            self.loop = loop
+
+        if self.report_interval:
+            asyncio.run_coroutine_threadsafe(self._reportStats(), self.loop)
+
+    def stop(self, timeout: float=10) -> None:
+        "Closes the shared resources and stops the loop thread."
+
+        if self.loop is None:
+            return
+
+        for close in (closeLogs, closePool, closeRedisConnection, closeSessions):
+            future = asyncio.run_coroutine_threadsafe(close(), self.loop)
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        self.loop = None
+        self.thread = None
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        '''Schedules a coroutine in the runtime loop without waiting for its result.
+        Can be called from any thread, including the runtime loop itself (e.g. for background jobs).
+
+        :param coro: coroutine object (e.g. `start(message)`).
+        '''
+
+        self.start()
+
+        future = asyncio.run_coroutine_threadsafe(self._measure(coro, time.perf_counter()), self.loop)
+        self._pending.add(future)
+        future.add_done_callback(self._onDone)
+
+        futures = getattr(self._collector, 'futures', None)
+        if futures is not None:
+            futures.append(future)
+
+        return future
+
+    def run(self, coro, timeout: float=None):
+        '''Schedules a coroutine in the runtime loop and blocks the calling thread until it is done.
+        Must not be called from the runtime loop itself.'''
+
+        return self.submit(coro).result(timeout)
+
+    @contextlib.contextmanager
+    def collect(self):
+        '''Collects the futures submitted by the current thread inside the block.
+
+        Usage:
+            with runtime.collect() as futures:
+                bot.process_new_updates(updates)
+            concurrent.futures.wait(futures)
+        '''
+
+        self._collector.futures = []
+        try:
+            yield self._collector.futures
+        finally:
+            self._collector.futures = None
+
+    async def _measure(self, coro, submitted: float):
+        started = time.perf_counter()
+        scheduling_delay = started - submitted
+
+        self.metrics['updates'] += 1
+        self.metrics['in_flight'] += 1
+        self.metrics['scheduling_delay_total'] += scheduling_delay
+        self.metrics['scheduling_delay_max'] = max(self.metrics['scheduling_delay_max'], scheduling_delay)
+        try:
+            return await coro
+        finally:
+            self.metrics['in_flight'] -= 1
+            self.metrics['handling_time_total'] += time.perf_counter() - started
+
+    def _onDone(self, future: concurrent.futures.Future) -> None:
+        self._pending.discard(future)
+        if future.cancelled() or future.exception() is None:
+            return
+
+        self.metrics['failed'] += 1
+        exception = future.exception()
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(reportException(exception), self.loop)
+
+    def stats(self) -> dict:
+        "Returns a snapshot of the per-update overhead metrics."
+
+        stats = dict(self.metrics)
+        updates = stats['updates']
+        stats['scheduling_delay_avg'] = stats['scheduling_delay_total'] / updates if updates else 0.0
+        stats['handling_time_avg'] = stats['handling_time_total'] / updates if updates else 0.0
+        return stats
+
+    async def _reportStats(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_interval)
+
+            stats = self.stats()
+            if stats['updates'] == 0:
+                continue
+
+            await addLog(
+                level='info',
+                text=dedent(
+                    f'''
+                    [{self.name}] updates: {stats['updates']} (failed: {stats['failed']}, in flight: {stats['in_flight']})
+                    scheduling delay: avg {stats['scheduling_delay_avg'] * 1000:.2f} ms, max {stats['scheduling_delay_max'] * 1000:.2f} ms
+                    handling time: avg {stats['handling_time_avg'] * 1000:.2f} ms
+                    '''
+                ),
+            )
+
+
+runtime = Runtime()
@@ -0,0 +1,251 @@
+from .storage import getRedisConnection, getScript
+from .logs import addLog
+
+import json
+import time
+import random
+import asyncio
+import datetime
+import traceback
+
+
+# Moves the due jobs from the queue to the processing set, where they stay until they are finished.
+# KEYS[1] - queue, KEYS[2] - processing; ARGV[1] - now, ARGV[2] - batch size, ARGV[3] - lease deadline
+CLAIM_SCRIPT = '''
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, job_id in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job_id)
+    redis.call('ZADD', KEYS[2], ARGV[3], job_id)
+end
+return due
+'''
+
+# Adds a job unless a job with the same id is already scheduled.
+# KEYS[1] - jobs, KEYS[2] - queue; ARGV[1] - job id, ARGV[2] - job, ARGV[3] - score
+SCHEDULE_SCRIPT = '''
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+'''
+
+# Returns the jobs with an expired lease (the process died while running them) back to the queue.
+# KEYS[1] - queue, KEYS[2] - processing; ARGV[1] - now
+RECOVER_SCRIPT = '''
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, job_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], job_id)
+    redis.call('ZADD', KEYS[1], ARGV[1], job_id)
+end
+return #expired
+'''
+
+
+class Scheduler:
+    '''Durable job scheduler backed by a Redis sorted set.
+
+    Jobs are stored in Redis with the time they must run at, so they survive restarts:
+    the jobs that were missed while the process was down are run as soon as it starts again.
+    A job being run is leased, if the process dies in the middle, the job is returned to the queue.
+
+    Usage:
+        scheduler = Scheduler('work')
+
+        @scheduler.job()
+        async def remind(work_id: int): ...
+
+        await scheduler.schedule('work=1-remind', 'remind', run_at, {'work_id': 1})
+        runtime.submit(scheduler.run())
+    '''
+
+    def __init__(
+        self,
+        name: str,
+        poll_interval: float=1.0,
+        batch_size: int=50,
+        lease: int=60*5,
+        max_attempts: int=5,
+    ):
+        '''
+        :param name: scheduler name, is used as a prefix of its Redis keys.
+        :param poll_interval: pause (in seconds) between checks for due jobs.
+        :param batch_size: maximum number of jobs run at once.
+        :param lease: time (in seconds) after which an unfinished job is considered lost and is run again.
+        :param max_attempts: how many times a failing job is run before it is dropped.
+        '''
+
+        self.name = name
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.handlers = dict()
+        self.running = dict() # job id -> task of the jobs run by this process
+
+        self.queue_key = f"scheduler={name}-queue"
+        self.processing_key = f"scheduler={name}-processing"
+        self.jobs_key = f"scheduler={name}-jobs"
+
+    def job(self, name: str=None, run_at: bool=False):
+        '''Registers a coroutine function as a job handler.
+
+        :param name: handler name, the function name by default.
+        :param run_at: if `True`, the handler gets the time the run was scheduled at as `run_at`,
+            it is the same for the retries of the run.
+        '''
+
+        def container(func):
+            self.handlers[name or func.__name__] = (func, run_at)
+            return func
+        return container
+
+    async def schedule(
+        self,
+        job_id: str,
+        handler: str,
+        run_at: datetime.datetime,
+        kwargs: dict=None,
+        interval: int=None,
+        jitter: int=0,
+        replace: bool=True,
+    ) -> None:
+        '''Adds a job to the queue.
+
+        :param job_id: unique job id, scheduling a job with an existing id replaces it.
+        :param handler: name of a registered job handler.
+        :param run_at: time when the job must be run.
+        :param kwargs: keyword arguments of the handler (must be JSON serializable).
+        :param interval: if set, the job is repeated every `interval` seconds.
+        :param jitter: maximum random delay (in seconds) added to the run time, spreads the load of simultaneous jobs.
+        :param replace: if `False`, an already scheduled job with the same id is kept as it is.
+        '''
+
+        if handler not in self.handlers:
+            raise ValueError(f'Unknown job handler: {handler}')
+
+        job = json.dumps({
+            'handler': handler,
+            'kwargs': kwargs or dict(),
+            'run_at': run_at.timestamp(),
+            'interval': interval,
+            'jitter': jitter,
+            'attempts': 0,
+        })
+        score = run_at.timestamp() + random.uniform(0, jitter)
+
+        redis = (await getRedisConnection())
+        if replace is False:
+            # The job and its place in the queue are added together, so a job is never left without a run time
+            schedule = (await getScript(SCHEDULE_SCRIPT))
+            await schedule(keys=[self.jobs_key, self.queue_key], args=[job_id, job, score])
+        else:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hset(self.jobs_key, job_id, job)
+                pipe.zrem(self.processing_key, job_id)
+                pipe.zadd(self.queue_key, {job_id: score})
+                await pipe.execute()
+
+    async def cancel(self, *job_ids: str) -> None:
+        "Removes the jobs from the queue."
+
+        redis = (await getRedisConnection())
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.queue_key, *job_ids)
+            pipe.zrem(self.processing_key, *job_ids)
+            pipe.hdel(self.jobs_key, *job_ids)
+            await pipe.execute()
+
+    async def run(self) -> None:
+        '''Runs the due jobs forever. Must be started once per process.
+        Every job is run in its own task, so a slow job doesn't hold the others, at most `batch_size` at once.
+        The leases of the running jobs are renewed on every poll, so a long job is not run again by another process.'''
+
+        claim = (await getScript(CLAIM_SCRIPT))
+        recover = (await getScript(RECOVER_SCRIPT))
+
+        while True:
+            try:
+                now = time.time()
+                if self.running:
+                    redis = (await getRedisConnection())
+                    # `xx` - a job which was cancelled meanwhile is not added back
+                    await redis.zadd(self.processing_key, {job_id: now + self.lease for job_id in self.running}, xx=True)
+                await recover(keys=[self.queue_key, self.processing_key], args=[now])
+
+                free = self.batch_size - len(self.running)
+                if free > 0:
+                    job_ids = (await claim(
+                        keys=[self.queue_key, self.processing_key],
+                        args=[now, free, now + self.lease],
+                    ))
+                    for job_id in job_ids:
+                        self._startJob(job_id.decode())
+            except Exception:
+                await addLog(level='error', text=traceback.format_exc(), send_telegram_message=True)
+
+            await asyncio.sleep(self.poll_interval)
+
+    def _startJob(self, job_id: str) -> None:
+        task = asyncio.get_running_loop().create_task(self._runJob(job_id))
+        self.running[job_id] = task
+
+        def onDone(task: asyncio.Task) -> None:
+            self.running.pop(job_id, None)
+            if not task.cancelled() and task.exception() is not None:
+                # The job failures are handled by `_runJob`, this one is of Redis, the lease returns the job to the queue
+                exception = task.exception()
+                text = ''.join(traceback.format_exception(exception))
+                asyncio.get_running_loop().create_task(
+                    addLog(level='error', text=f"Job {job_id} was interrupted:\n{text}", send_telegram_message=True)
+                )
+        task.add_done_callback(onDone)
+
+    async def _runJob(self, job_id: str) -> None:
+        redis = (await getRedisConnection())
+
+        job = (await redis.hget(self.jobs_key, job_id))
+        if job is None:
+            await redis.zrem(self.processing_key, job_id)
+            return
+        job = json.loads(job)
+
+        func, with_run_at = self.handlers[job['handler']]
+        kwargs = job['kwargs']
+        if with_run_at:
+            kwargs = {**kwargs, 'run_at': datetime.datetime.fromtimestamp(job['run_at'])}
+
+        try:
+            await func(**kwargs)
+        except Exception:
+            job['attempts'] += 1
+            await addLog(
+                level='error',
+                text=f"Job {job_id} failed (attempt {job['attempts']}):\n{traceback.format_exc()}",
+                send_telegram_message=True,
+            )
+            if job['attempts'] < self.max_attempts:
+                return await self._requeue(job_id, job, time.time() + 60 * 2 ** job['attempts'])
+        else:
+            job['attempts'] = 0
+
+        if job['interval']:
+            # Recurring jobs are run once after a downtime, missed runs are not repeated
+            run_at = job['run_at'] + job['interval']
+            while run_at <= time.time():
+                run_at += job['interval']
+            job['run_at'] = run_at
+            return await self._requeue(job_id, job, run_at + random.uniform(0, job['jitter']))
+
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.processing_key, job_id)
+            pipe.hdel(self.jobs_key, job_id)
+            await pipe.execute()
+
+    async def _requeue(self, job_id: str, job: dict, score: float) -> None:
+        redis = (await getRedisConnection())
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.jobs_key, job_id, json.dumps(job))
+            pipe.zrem(self.processing_key, job_id)
+            pipe.zadd(self.queue_key, {job_id: score})
+            await pipe.execute()
@@ -1,25 +1,131 @@
-from .storage import getRedisConnection
+from .storage import getRedisConnection, getScript
+from .callbacks import encodeCallback, decodeCallback
 
-import json
+import time
 import functools
+import contextvars
+import collections
 
 
-async def setState(bot: str, user_id: int, state_data: dict) -> None:
-    redis = await getRedisConnection()
-    if 'last_state' not in state_data.keys():
-        state['last_state'] = (await getState(bot, user_id))
-    state = json.dumps(state_data)
-    redis.set(f"bot={bot}&user={user_id}-state", state)
+# Navigation stack of a user: a Redis list with the current state at the head.
+# Every state is a handler call packed like callback data, the list is capped and expires if the user is idle.
+STATE_STACK_SIZE = 20
+STATE_TTL = 60*60*24*7
+
+# The step which waits for a text message of a user (e.g. the address of a new property),
+# a handler call packed like a state. It is taken by the first message, so any worker can handle the answer.
+INPUT_TTL = 60*60
+
+# Is set while a previous state is being restored by the "back" button,
+# the restored handler is already at the head of the stack and must not be pushed again.
+restoring_state = contextvars.ContextVar('restoring_state', default=False)
+
+# Time spent on recording the states, by handler
+state_metrics = collections.defaultdict(lambda: {'calls': 0, 'time_total': 0.0, 'time_max': 0.0})
+
+
+# Pushes a state and returns the previous current one. A state equal to the current one is not pushed again.
+# KEYS[1] - stack, KEYS[2] - old JSON state; ARGV[1] - state, ARGV[2] - stack size, ARGV[3] - ttl, ARGV[4] - reset
+PUSH_SCRIPT = '''
+local previous = redis.call('LINDEX', KEYS[1], 0)
+if ARGV[4] == '1' then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    previous = false
+end
+if previous ~= ARGV[1] then
+    redis.call('LPUSH', KEYS[1], ARGV[1])
+    redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return previous
+'''
+
+# Drops the current state and returns the previous one.
+# KEYS[1] - stack; ARGV[1] - ttl
+POP_SCRIPT = '''
+redis.call('LPOP', KEYS[1])
+local previous = redis.call('LINDEX', KEYS[1], 0)
+if previous then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return previous
+'''
+
+
+def getStateKey(bot: str, user_id: int) -> str:
+    return f"state=bot={bot}&user={user_id}"
+
+def encodeState(func: str, kwargs: dict) -> str | None:
+    '''Packs a handler call. `user_id` is not stored, it is known when the state is restored.
+    Returns `None` if the arguments can't be packed, such calls are not recorded.'''
+
+    try:
+        return encodeCallback(func, **{k: v for k, v in kwargs.items() if k != 'user_id'})
+    except TypeError:
+        return None
+
+def decodeState(state: bytes) -> dict:
+    "Returns `{'func': ..., 'kwargs': {...}}`."
+
+    callback = decodeCallback(state.decode())
+    return {'func': callback['handler'], 'kwargs': callback['kwargs']}
+
+
+async def pushState(bot: str, user_id: int, state: str, reset: bool=False) -> dict | None:
+    '''Makes the state current in one atomic operation. The oldest states are dropped when the stack is full.
+    Returns the state which was current before.
+
+    :param state: packed handler call (see `encodeState`).
+    :param reset: if `True`, the previous states are dropped (e.g. the start menu).
+    '''
+
+    push = (await getScript(PUSH_SCRIPT))
+    previous_state = (await push(
+        keys=[getStateKey(bot, user_id), f"bot={bot}&user={user_id}-state"], # with the key of the old JSON states
+        args=[state, STATE_STACK_SIZE, STATE_TTL, int(reset)],
+    ))
+
+    return decodeState(previous_state) if previous_state else None
+
+async def popState(bot: str, user_id: int) -> dict | None:
+    "Drops the current state and returns the previous one, which becomes current."
+
+    pop = (await getScript(POP_SCRIPT))
+    previous_state = (await pop(keys=[getStateKey(bot, user_id)], args=[STATE_TTL]))
+
+    return decodeState(previous_state) if previous_state else None
 
 async def getState(bot: str, user_id: int) -> dict | None:
-    redis = await getRedisConnection()
-    state_data = redis.get(f"bot={bot}&user={user_id}-state")
-    if state_data:
-        return json.loads(state_data)
+    "Returns the current state."
+
+    redis = (await getRedisConnection())
+    state = (await redis.lindex(getStateKey(bot, user_id), 0))
+    return decodeState(state) if state else None
 
 async def delStates(bot: str, user_id: int) -> None:
-    redis = await getRedisConnection()
-    redis.delete(f"bot={bot}&user={user_id}-state")
+    redis = (await getRedisConnection())
+    await redis.delete(getStateKey(bot, user_id))
+
+
+def getInputKey(bot: str, user_id: int) -> str:
+    return f"input=bot={bot}&user={user_id}"
+
+async def setInputStep(bot: str, user_id: int, func: str, **kwargs) -> None:
+    "Makes the handler wait for the next text message of the user, it gets the message and `kwargs`."
+
+    redis = (await getRedisConnection())
+    await redis.set(getInputKey(bot, user_id), encodeCallback(func, **kwargs), ex=INPUT_TTL)
+
+async def popInputStep(bot: str, user_id: int) -> dict | None:
+    "Takes the waiting step of the user, returns `{'func': ..., 'kwargs': {...}}`."
+
+    redis = (await getRedisConnection())
+    step = (await redis.getdel(getInputKey(bot, user_id)))
+    return decodeState(step) if step else None
+
+async def delInputStep(bot: str, user_id: int) -> None:
+    redis = (await getRedisConnection())
+    await redis.delete(getInputKey(bot, user_id))
 
 
 def autoSetState(bot: str='main'):
@@ -31,29 +137,31 @@ def autoSetState(bot: str='main'):
             try:
                 user_id = args[0].from_user.id
             except (IndexError, AttributeError):
-                if 'user_id' in kwargs.keys():
-                    user_id = kwargs['user_id']
-                else: 
-                    user_id = None
-
-            if user_id:
-                if func.__name__ == 'start':
-                    await delStates(bot, user_id)
-                    last_state_data = None
-                else:
-                    last_state_data = (await getState(bot, user_id))
-
-                if (last_state_data is None) or (last_state_data['is_back'] is False):
-                    state_data = {
-                        'func': func.__name__,
-                        'args': args[1:],
-                        'kwargs': kwargs,
-                        'is_back': False,
-                        'last_state': last_state_data,
-                    }
-                    await setState(bot, user_id, state_data)
+                user_id = kwargs.get('user_id')
+
+            if user_id and not restoring_state.get():
+                start_time = time.perf_counter()
+
+                state = encodeState(func.__name__, kwargs)
+                if state:
+                    await pushState(bot, user_id, state, reset=(func.__name__ == 'start'))
+
+                duration = time.perf_counter() - start_time
+                metrics = state_metrics[func.__name__]
+                metrics['calls'] += 1
+                metrics['time_total'] += duration
+                metrics['time_max'] = max(metrics['time_max'], duration)
 
             result = await func(*args, **kwargs)
             return result
         return wrapper
-    return container
\ No newline at end of file
+    return container
+
+def getStateMetrics() -> dict:
+    '''Returns the states recording overhead by handler:
+    `{handler: {'calls': ..., 'time_total': ..., 'time_max': ..., 'time_avg': ...}}`.'''
+
+    return {
+        name: {**m, 'time_avg': m['time_total'] / m['calls'] if m['calls'] else 0.0}
+        for name, m in state_metrics.items()
+    }
@@ -1,12 +1,56 @@
 from .config import REDIS_DB, REDIS_HOST, REDIS_PORT
+from . import config
 
-import redis
 import asyncio
+import redis.asyncio as redis
+
+
+REDIS_MAX_CONNECTIONS = getattr(config, 'REDIS_MAX_CONNECTIONS', 50)
+REDIS_SOCKET_TIMEOUT = getattr(config, 'REDIS_SOCKET_TIMEOUT', 5.0)
+REDIS_SOCKET_CONNECT_TIMEOUT = getattr(config, 'REDIS_SOCKET_CONNECT_TIMEOUT', 5.0)
 
 
 redis_connection = None
+redis_connection_loop = None
+scripts = dict() # Lua source -> script registered on `redis_connection`
 async def getRedisConnection() -> redis.Redis:
-    global redis_connection
-    if redis_connection is None:
-        redis_connection = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-    return redis_connection
\ No newline at end of file
+    '''Returns the non-blocking Redis client which is shared by the whole process.
+    The client is backed by a bounded connection pool, a request waits for a free connection
+    when all of them are in use.'''
+
+    global redis_connection, redis_connection_loop
+
+    loop = asyncio.get_running_loop()
+    if redis_connection is None or redis_connection_loop is not loop:
+        connection_pool = redis.BlockingConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_SOCKET_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+            health_check_interval=30,
+        )
+        redis_connection = redis.Redis(connection_pool=connection_pool)
+        redis_connection_loop = loop
+    return redis_connection
+
+async def getScript(source: str):
+    '''Returns the Lua script registered on the shared client. A script is registered (hashed) once per client,
+    a call runs it by `EVALSHA` and loads it to the server only if the server doesn't have it.'''
+
+    client = (await getRedisConnection())
+    script = scripts.get(source)
+    if script is None or script.registered_client is not client:
+        script = client.register_script(source)
+        scripts[source] = script
+    return script
+
+async def closeRedisConnection() -> None:
+    global redis_connection, redis_connection_loop
+    if redis_connection is not None:
+        await redis_connection.aclose()
+        redis_connection = None
+        redis_connection_loop = None
+        scripts.clear()
@@ -0,0 +1,36 @@
+from .. import config
+
+import asyncio
+import functools
+import telebot
+import concurrent.futures
+
+
+# Threads which make the requests of the sync telebot, a request occupies a thread until Telegram answers
+TELEGRAM_API_THREADS = getattr(config, 'TELEGRAM_API_THREADS', 32)
+
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=TELEGRAM_API_THREADS, thread_name_prefix='telegram-api')
+
+
+class AsyncBot:
+    '''Awaitable methods of a sync `TeleBot`.
+    Every method is run in a thread of the executor, so a request to Telegram doesn't block the runtime loop
+    and the other updates are handled meanwhile.
+
+    Usage:
+        api = AsyncBot(bot)
+        message = await api.send_message(chat_id=user_id, text='...')
+        bot.process_new_updates(updates) # the methods which don't make requests are called on the bot
+    '''
+
+    def __init__(self, bot: telebot.TeleBot):
+        self.bot = bot
+
+    def __getattr__(self, name: str):
+        method = getattr(self.bot, name)
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(method, *args, **kwargs))
+        return call
@@ -0,0 +1,185 @@
+from .queries import telegram_api_request
+from ..logs import addLog
+from ..scheduler import Scheduler
+from .. import config
+
+import time
+import asyncio
+import secrets
+import datetime
+
+
+# Telegram allows a bot about 30 messages per second in total and about one message per second in a single chat
+BROADCAST_GLOBAL_RATE = getattr(config, 'BROADCAST_GLOBAL_RATE', 30)
+BROADCAST_CHAT_INTERVAL = getattr(config, 'BROADCAST_CHAT_INTERVAL', 1.0)
+BROADCAST_CONCURRENCY = getattr(config, 'BROADCAST_CONCURRENCY', 10)
+
+# Retries of the failed deliveries, is run by both bots
+scheduler = Scheduler('broadcast')
+
+
+class RateLimiter:
+    '''Spreads requests in time according to the global and per-chat limits.
+    Every caller reserves the nearest free slot and sleeps until it comes.'''
+
+    def __init__(self, rate: float=BROADCAST_GLOBAL_RATE, chat_interval: float=BROADCAST_CHAT_INTERVAL):
+        '''
+        :param rate: maximum number of requests per second.
+        :param chat_interval: minimal interval (in seconds) between requests to the same chat.
+        '''
+
+        self.interval = 1 / rate
+        self.chat_interval = chat_interval
+        self.next_slot = 0.0
+        self.chats_next_slot = dict()
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+
+        chat_slot = max(now, self.chats_next_slot.get(chat_id, 0.0))
+        slot = max(chat_slot, self.next_slot)
+        self.next_slot = slot + self.interval
+        self.chats_next_slot[chat_id] = slot + self.chat_interval
+
+        if len(self.chats_next_slot) > 10000:
+            self.chats_next_slot = {c: s for c, s in self.chats_next_slot.items() if s > now}
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+rate_limiters = dict()
+def getRateLimiter(bot: str) -> RateLimiter:
+    "Limits are applied per bot token, so every bot has its own limiter."
+
+    if bot not in rate_limiters:
+        rate_limiters[bot] = RateLimiter()
+    return rate_limiters[bot]
+
+
+async def sendMessages(messages: list[dict], bot: str, api_method: str='sendMessage') -> list[dict]:
+    '''Sends a batch of messages concurrently, respecting Telegram rate limits.
+    Returns a delivery result for every message in the same order:
+    `{'chat_id': ..., 'ok': ..., 'code': ..., 'text': ..., 'parameters': ...}`.
+
+    :param messages: list of Telegram API method parameters, every one must contain `chat_id`.
+    :param bot: the bot whose token will be used to send the messages.
+    :param api_method: the required method in Telegram API.
+    '''
+
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    rate_limiter = getRateLimiter(bot)
+
+    async def send(parameters: dict) -> dict:
+        async with semaphore:
+            await rate_limiter.wait(parameters['chat_id'])
+            try:
+                response = await telegram_api_request(
+                    request_method='POST',
+                    api_method=api_method,
+                    parameters=parameters,
+                    bot=bot,
+                )
+            except Exception as e:
+                response = {'code': None, 'text': repr(e)}
+
+        return {
+            'chat_id': parameters['chat_id'],
+            'ok': response['code'] == 200,
+            'code': response['code'],
+            'text': response['text'],
+            'parameters': parameters,
+        }
+
+    return list(await asyncio.gather(*(send(m) for m in messages)))
+
+async def broadcast(chat_ids: list[int], parameters: dict, bot: str, api_method: str='sendMessage') -> list[dict]:
+    '''Sends one message to many chats concurrently.
+
+    :param chat_ids: recipients of the message.
+    :param parameters: Telegram API method parameters without `chat_id`.
+    :param bot: the bot whose token will be used to send the message.
+    :param api_method: the required method in Telegram API.
+    '''
+
+    messages = [{**parameters, 'chat_id': chat_id} for chat_id in chat_ids]
+    return await sendMessages(messages, bot, api_method)
+
+def isRetryable(result: dict) -> bool:
+    '''Checks whether a delivery failed for a temporary reason (network error, rate limit, server error).
+    Recipients who blocked the bot (`403`) or bad requests (`400`) are not retried.'''
+
+    return not result['ok'] and (result['code'] is None or result['code'] == 429 or result['code'] >= 500)
+
+def getRetryableResults(results: list[dict]) -> list[dict]:
+    "Returns the deliveries which failed for a temporary reason, see `isRetryable`."
+
+    return [r for r in results if isRetryable(r)]
+
+async def retryFailed(results: list[dict], bot: str, api_method: str='sendMessage') -> list[dict]:
+    '''Repeats the retryable deliveries from the previous results.
+    Returns the merged results, so they can be stored or retried again.'''
+
+    retryable = getRetryableResults(results)
+    if not retryable:
+        return results
+
+    retried = {
+        r['chat_id']: r for r in (await sendMessages([r['parameters'] for r in retryable], bot, api_method))
+    }
+    return [retried.get(r['chat_id'], r) if not r['ok'] else r for r in results]
+
+@scheduler.job()
+async def retryDelivery(results: list[dict], bot: str, attempt: int, retries: int, retry_delay: float) -> None:
+    "Job which repeats the failed deliveries of a broadcast, see `deliver`."
+
+    results = (await retryFailed(results, bot))
+    await storeFailed(results, bot, attempt + 1, retries, retry_delay)
+
+async def storeFailed(results: list[dict], bot: str, attempt: int, retries: int, retry_delay: float) -> None:
+    '''Schedules the retry of the temporary failures, logs the deliveries which are not retried any more.
+
+    :param attempt: number of the retries already made.
+    '''
+
+    retryable = getRetryableResults(results)
+    if retryable and attempt < retries:
+        await scheduler.schedule(
+            job_id=f"delivery={secrets.token_hex(8)}",
+            handler='retryDelivery',
+            run_at=datetime.datetime.now() + datetime.timedelta(seconds=retry_delay * 2 ** attempt),
+            kwargs={
+                'results': retryable,
+                'bot': bot,
+                'attempt': attempt,
+                'retries': retries,
+                'retry_delay': retry_delay,
+            },
+        )
+        results = [r for r in results if not isRetryable(r)]
+
+    undelivered = [r for r in results if not r['ok']]
+    if undelivered:
+        await addLog(
+            level='warning',
+            text=f"{len(undelivered)} messages were not delivered: " + ', '.join(
+                f"{r['chat_id']} ({r['code']})" for r in undelivered
+            ),
+        )
+
+async def deliver(chat_ids: list[int], parameters: dict, bot: str, retries: int=3, retry_delay: float=30) -> list[dict]:
+    '''Broadcasts a message and logs the undelivered ones.
+    Intended to be run in background, so the user does not wait for all the recipients.
+    The temporary failures are kept in the `broadcast` scheduler and retried with a growing delay,
+    so they are delivered even if the process is restarted meanwhile.
+
+    :param chat_ids: recipients of the message.
+    :param parameters: Telegram API `sendMessage` parameters without `chat_id`.
+    :param bot: the bot whose token will be used to send the message.
+    :param retries: how many times temporary failures are retried.
+    :param retry_delay: pause (in seconds) before the first retry, it is doubled for every next one.
+    '''
+
+    results = (await broadcast(chat_ids, parameters, bot))
+    await storeFailed(results, bot, 0, retries, retry_delay)
+    return results
@@ -1,9 +1,53 @@
 from ..config import *
+from .. import config
 
-import requests
+import json
+import asyncio
+import aiohttp
 
-async def telegram_api_request(request_method: str, api_method: str, parameters:dict={}, bot: str='logs') -> str:
+
+TELEGRAM_API_URL = 'https://api.telegram.org'
+TELEGRAM_API_CONNECTIONS_LIMIT = getattr(config, 'TELEGRAM_API_CONNECTIONS_LIMIT', 100)
+TELEGRAM_API_TIMEOUT = getattr(config, 'TELEGRAM_API_TIMEOUT', 15)
+TELEGRAM_API_RETRIES = getattr(config, 'TELEGRAM_API_RETRIES', 3)
+
+
+def getBotToken(bot: str) -> str:
+    "Returns the token of the bot by its name (`main`, `work` or `logs`)."
+
+    match bot:
+        case 'main': return MAIN_BOT_TOKEN
+        case 'work': return WORK_BOT_TOKEN
+        case 'logs': return LOGS_BOT_TOKEN
+        case _: raise ValueError('Unavailable telegram bot token')
+
+
+sessions = dict() # bot name -> (event loop, aiohttp.ClientSession)
+async def getSession(bot: str) -> aiohttp.ClientSession:
+    '''Returns the keep-alive HTTP session of the bot.
+    Sessions are bound to the event loop, so a new one is created if the loop changes.'''
+
+    loop = asyncio.get_running_loop()
+    session_loop, session = sessions.get(bot, (None, None))
+    if session is None or session.closed or session_loop is not loop:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=TELEGRAM_API_CONNECTIONS_LIMIT, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=TELEGRAM_API_TIMEOUT),
+        )
+        sessions[bot] = (loop, session)
+    return session
+
+async def closeSessions() -> None:
+    for bot, (session_loop, session) in list(sessions.items()):
+        if session_loop is asyncio.get_running_loop():
+            await session.close()
+        del sessions[bot]
+
+
+async def telegram_api_request(request_method: str, api_method: str, parameters:dict={}, bot: str='logs') -> dict:
     '''Sends request to Telegram API.
+    If Telegram answers with `429 Too Many Requests`, the request is repeated after `retry_after` seconds.
+    Parameters are sent as a JSON body, so nested objects (e.g. `reply_markup`) can be passed as dicts.
 
     :param request_method: http request method (`get` or `post`).
     :param api_method: the required method in Telegram API.
@@ -11,22 +55,35 @@ async def telegram_api_request(request_method: str, api_method: str, parameters:
     :param bot: the bot whose token will be used to send the request.
     '''
 
-    match bot:
-        case 'main': BOT_TOKEN = MAIN_BOT_TOKEN
-        case 'work': BOT_TOKEN = WORK_BOT_TOKEN
-        case 'logs': BOT_TOKEN = LOGS_BOT_TOKEN
-        case _: return ValueError('Unavailable telegram bot token')
-
-    request = f"https://api.telegram.org/bot{BOT_TOKEN}/{api_method}?{'&'.join([f'{k}={v}' for k, v in parameters.items()])}"
-
-    if request_method == 'GET':
-        r = requests.get(request)
-    elif request_method == 'POST':
-        r = requests.post(request)
-
-    response = {
-        'code': r.status_code,
-        'text': r.text,
-    }
-    
-    return response
\ No newline at end of file
+    session = await getSession(bot)
+    url = f"{TELEGRAM_API_URL}/bot{getBotToken(bot)}/{api_method}"
+
+    for attempt in range(TELEGRAM_API_RETRIES + 1):
+        try:
+            if request_method.upper() == 'GET':
+                request = session.get(url, params={k: v if isinstance(v, str) else json.dumps(v) for k, v in parameters.items()})
+            else:
+                request = session.post(url, json=parameters)
+
+            async with request as r:
+                response = {
+                    'code': r.status,
+                    'text': await r.text(),
+                }
+        except aiohttp.ClientConnectorError:
+            # The connection was not established, so the request surely was not delivered
+            if attempt == TELEGRAM_API_RETRIES:
+                raise
+            await asyncio.sleep(2 ** attempt)
+            continue
+
+        if response['code'] != 429 or attempt == TELEGRAM_API_RETRIES:
+            break
+
+        try:
+            retry_after = json.loads(response['text'])['parameters']['retry_after']
+        except (ValueError, KeyError, TypeError):
+            retry_after = 2 ** attempt
+        await asyncio.sleep(retry_after)
+
+    return response
@@ -0,0 +1,269 @@
+'''Processing of the updates by several worker processes.
+
+The webhook receiver puts every update to one of the `STREAM_PARTITIONS` Redis Streams of the bot
+by its chat, the workers read the streams through a consumer group. A partition is leased by one worker
+at a time and its updates are handled one by one, so the updates of a chat keep their order.
+The conversation state (navigation, drafts, the steps waiting for a text) is kept in Redis,
+so the chat may move to another worker at any update.
+
+    python -m src.bot.main_bot.bot          # receiver (webhook) or a single process (polling)
+    python -m src.bot.main_bot.bot worker   # worker, as many as needed
+'''
+
+from .logs import addLog
+from .runtime import runtime
+from .storage import getRedisConnection, getScript
+from . import config
+
+import os
+import json
+import math
+import time
+import socket
+import asyncio
+import telebot
+import concurrent.futures
+from redis.exceptions import ResponseError
+
+
+UPDATES_STREAM = getattr(config, 'UPDATES_STREAM', False) # the webhook puts the updates to the streams
+STREAM_PARTITIONS = getattr(config, 'STREAM_PARTITIONS', 8)
+STREAM_MAXLEN = getattr(config, 'STREAM_MAXLEN', 100000) # approximate length of a partition
+STREAM_GROUP = 'workers'
+STREAM_READ_COUNT = 20
+STREAM_BLOCK = 1000 # ms
+PARTITION_LEASE = 30 # seconds, the lease is renewed three times per period
+# ms after which an unacknowledged update of a previous owner is handled again, must not exceed the lease:
+# the new owner waits for these updates before it reads the new ones
+STREAM_CLAIM_IDLE = PARTITION_LEASE * 1000 // 2
+REPORT_INTERVAL = 60*10
+
+
+# Prolongs or releases a lease if it is still held by the worker. KEYS[1] - lease; ARGV[1] - worker, ARGV[2] - ms
+RENEW_SCRIPT = '''
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+'''
+RELEASE_SCRIPT = '''
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+'''
+
+
+def getStreamKey(bot: str, partition: int) -> str:
+    return f"updates=bot={bot}&partition={partition}"
+
+def getPartition(update: dict) -> int:
+    "Returns the partition of an update by its chat (or user, if there is no chat)."
+
+    for key, value in update.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+
+        chat = value.get('chat') or (value.get('message') or {}).get('chat') or value.get('from') or {}
+        if 'id' in chat:
+            return chat['id'] % STREAM_PARTITIONS
+    return 0
+
+async def publishUpdate(bot: str, update: dict) -> None:
+    "Puts an update (as received from Telegram) to the stream of its partition."
+
+    redis = (await getRedisConnection())
+    await redis.xadd(
+        getStreamKey(bot, getPartition(update)),
+        {'update': json.dumps(update)},
+        maxlen=STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+class StreamWorker:
+    '''Handles the updates of the leased partitions of a bot.
+    The partitions are shared evenly by the live workers, a worker takes the partitions of a stopped one
+    when their leases expire, and its unacknowledged updates are handled again.'''
+
+    def __init__(self, bot: telebot.TeleBot, name: str, consumer: str=None):
+        '''
+        :param bot: bot whose handlers process the updates.
+        :param name: bot name (`main` or `work`).
+        :param consumer: worker name in the consumer group, host and pid by default.
+        '''
+
+        self.bot = bot
+        self.name = name
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.workers_key = f"updates=bot={name}&workers"
+        self.partitions = dict() # partition -> (task, stop event)
+        self.metrics = {
+            'handled': 0,
+            'failed': 0,
+            'claimed': 0,
+        }
+
+    def getLeaseKey(self, partition: int) -> str:
+        return f"{getStreamKey(self.name, partition)}&lease"
+
+    async def createGroups(self) -> None:
+        redis = (await getRedisConnection())
+        for partition in range(STREAM_PARTITIONS):
+            try:
+                await redis.xgroup_create(getStreamKey(self.name, partition), STREAM_GROUP, id='0', mkstream=True)
+            except ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    async def balance(self) -> None:
+        '''Renews the leases of the worker and takes the free partitions up to its share,
+        the partitions above the share are released for the new workers.'''
+
+        redis = (await getRedisConnection())
+        renew = (await getScript(RENEW_SCRIPT))
+        release = (await getScript(RELEASE_SCRIPT))
+        lease_ms = PARTITION_LEASE * 1000
+
+        now = time.time()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.workers_key, {self.consumer: now})
+            pipe.zremrangebyscore(self.workers_key, '-inf', now - PARTITION_LEASE)
+            pipe.zcard(self.workers_key)
+            workers = (await pipe.execute())[2]
+        share = math.ceil(STREAM_PARTITIONS / max(workers, 1))
+
+        for partition in list(self.partitions):
+            if not (await renew(keys=[self.getLeaseKey(partition)], args=[self.consumer, lease_ms])):
+                await self.stopPartition(partition)
+
+        for partition in range(STREAM_PARTITIONS):
+            if len(self.partitions) >= share:
+                break
+            if partition not in self.partitions:
+                if await redis.set(self.getLeaseKey(partition), self.consumer, nx=True, px=lease_ms):
+                    stop = asyncio.Event()
+                    self.partitions[partition] = (asyncio.create_task(self.consume(partition, stop)), stop)
+
+        while len(self.partitions) > share:
+            partition = max(self.partitions)
+            await self.stopPartition(partition)
+            await release(keys=[self.getLeaseKey(partition)], args=[self.consumer])
+
+    async def stopPartition(self, partition: int) -> None:
+        '''Stops reading a partition and waits until the update being handled is acknowledged,
+        so the lease may be released. The read but not handled updates are claimed by the next owner.'''
+
+        task, stop = self.partitions.pop(partition)
+        stop.set()
+        await asyncio.wait([task])
+
+    def handle(self, data: dict) -> None:
+        '''Runs the handlers of an update and waits for the coroutines they submit to the runtime,
+        so the next update of the partition is handled after this one. Is run in a thread.'''
+
+        update = telebot.types.Update.de_json(data)
+        with runtime.collect() as futures:
+            self.bot.process_new_updates([update])
+        concurrent.futures.wait(futures)
+
+    async def claimPending(self, key: str, stop: asyncio.Event) -> None:
+        '''Handles the unacknowledged updates of the previous owners of the partition (and of this worker).
+        They are older than any unread update, so the new ones are not read until all of them are taken.'''
+
+        redis = (await getRedisConnection())
+        while not stop.is_set():
+            start_id = '0-0'
+            while True:
+                start_id, entries, *_ = (await redis.xautoclaim(
+                    key, STREAM_GROUP, self.consumer,
+                    min_idle_time=STREAM_CLAIM_IDLE, start_id=start_id, count=STREAM_READ_COUNT,
+                ))
+                self.metrics['claimed'] += len(entries)
+                await self.handleEntries(key, entries, stop)
+                if start_id == b'0-0' or stop.is_set():
+                    break
+
+            # The updates which are not idle long enough are left by an owner which has stopped just now
+            if not (await redis.xpending(key, STREAM_GROUP))['pending']:
+                return
+            await asyncio.sleep(STREAM_BLOCK / 1000)
+
+    async def handleEntries(self, key: str, entries: list, stop: asyncio.Event) -> None:
+        "Handles the updates one by one and acknowledges them, the rest is left when the partition is stopped."
+
+        redis = (await getRedisConnection())
+        for entry_id, fields in entries:
+            if stop.is_set():
+                return
+            if not fields: # removed from the stream by the length limit
+                await redis.xack(key, STREAM_GROUP, entry_id)
+                continue
+            try:
+                await asyncio.to_thread(self.handle, json.loads(fields[b'update']))
+                self.metrics['handled'] += 1
+            except Exception:
+                # A broken update is not handled again, the exception is already logged by the handler
+                self.metrics['failed'] += 1
+            await redis.xack(key, STREAM_GROUP, entry_id)
+
+    async def consume(self, partition: int, stop: asyncio.Event) -> None:
+        redis = (await getRedisConnection())
+        key = getStreamKey(self.name, partition)
+
+        await self.claimPending(key, stop)
+
+        while not stop.is_set():
+            streams = (await redis.xreadgroup(
+                STREAM_GROUP, self.consumer, {key: '>'}, count=STREAM_READ_COUNT, block=STREAM_BLOCK,
+            ))
+            await self.handleEntries(key, streams[0][1] if streams else [], stop)
+
+    async def getLag(self) -> dict:
+        "Returns `{partition: {'lag': ..., 'pending': ...}}`, lag is the number of the unread updates."
+
+        redis = (await getRedisConnection())
+        lag = dict()
+        for partition in range(STREAM_PARTITIONS):
+            for group in (await redis.xinfo_groups(getStreamKey(self.name, partition))):
+                if group['name'] == STREAM_GROUP.encode():
+                    lag[partition] = {'lag': group.get('lag'), 'pending': group['pending']}
+        return lag
+
+    async def reportLag(self) -> None:
+        lag = (await self.getLag())
+        text = ', '.join(f"{p}: {l['lag']}/{l['pending']}" for p, l in lag.items())
+        await addLog(
+            level='info',
+            text=(
+                f"[{self.name}:{self.consumer}] partitions: {sorted(self.partitions)}, "
+                f"handled: {self.metrics['handled']} (failed: {self.metrics['failed']}, claimed: {self.metrics['claimed']})\n"
+                f"lag/pending by partition: {text}"
+            ),
+        )
+
+    async def run(self) -> None:
+        await self.createGroups()
+        reported = time.monotonic()
+        try:
+            while True:
+                await self.balance()
+                if time.monotonic() - reported > REPORT_INTERVAL:
+                    await self.reportLag()
+                    reported = time.monotonic()
+                await asyncio.sleep(PARTITION_LEASE / 3)
+        finally:
+            redis = (await getRedisConnection())
+            release = (await getScript(RELEASE_SCRIPT))
+            for partition in list(self.partitions):
+                await self.stopPartition(partition)
+                await release(keys=[self.getLeaseKey(partition)], args=[self.consumer])
+            await redis.zrem(self.workers_key, self.consumer)
+
+
+def runWorker(bot: telebot.TeleBot, name: str) -> None:
+    "Handles the updates of the bot from the streams until the process is stopped."
+
+    # The handlers must run in the calling thread, so their coroutines are collected by `handle`
+    bot.threaded = False
+    runtime.run(StreamWorker(bot, name).run())
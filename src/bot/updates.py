@@ -0,0 +1,139 @@
+'''Receiving of the updates of a bot.
+
+In production Telegram posts the updates to a webhook served by aiohttp in the runtime loop,
+the long polling is left for development and is used when `WEBHOOK_URL` is not set in the config.
+With `UPDATES_STREAM` the webhook only puts the updates to Redis Streams for the workers (see `update_stream`).'''
+
+from .logs import addLog
+from .runtime import runtime
+from .update_stream import UPDATES_STREAM, publishUpdate, runWorker
+from .tg_api.queries import telegram_api_request
+from . import config
+
+import sys
+import json
+import time
+import hmac
+import hashlib
+import telebot
+import traceback
+from aiohttp import web
+
+
+WEBHOOK_URL = getattr(config, 'WEBHOOK_URL', None) # public base url, the bot name is appended to it
+WEBHOOK_HOST = getattr(config, 'WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORTS = getattr(config, 'WEBHOOK_PORTS', {'main': 8081, 'work': 8082})
+WEBHOOK_SECRET = getattr(config, 'WEBHOOK_SECRET', None)
+WEBHOOK_MAX_CONNECTIONS = getattr(config, 'WEBHOOK_MAX_CONNECTIONS', 40)
+
+webhook_metrics = {
+    'received': 0,
+    'rejected': 0,
+    'invalid': 0,
+}
+
+
+def getSecretToken(bot: telebot.TeleBot) -> str:
+    "Returns the secret which Telegram sends with every update, by default it is derived from the bot token."
+
+    secret = WEBHOOK_SECRET or bot.token
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def createWebhookApp(bot: telebot.TeleBot, name: str) -> web.Application:
+    '''Returns the application which accepts the updates of the bot at `/<name>`.
+    An update is answered at once, its handlers are run by the bot in background.'''
+
+    secret_token = getSecretToken(bot)
+
+    async def receiveUpdate(request: web.Request) -> web.Response:
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token, secret_token):
+            webhook_metrics['rejected'] += 1
+            return web.Response(status=403)
+
+        try:
+            data = (await request.json())
+            update = telebot.types.Update.de_json(data)
+        except (ValueError, KeyError, TypeError):
+            webhook_metrics['invalid'] += 1
+            return web.Response(status=400)
+
+        webhook_metrics['received'] += 1
+        if UPDATES_STREAM:
+            # Telegram repeats the update if it is not saved
+            await publishUpdate(name, data)
+        else:
+            # The handlers only submit the coroutines to the runtime, so the update is not waited for
+            bot.process_new_updates([update])
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(f'/{name}', receiveUpdate)
+    return app
+
+async def startWebhook(bot: telebot.TeleBot, name: str) -> web.AppRunner:
+    "Starts the webhook server of the bot and registers it in Telegram."
+
+    runner = web.AppRunner(createWebhookApp(bot, name), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORTS[name]).start()
+
+    response = (await telegram_api_request(
+        request_method='POST',
+        api_method='setWebhook',
+        parameters={
+            'url': f"{WEBHOOK_URL.rstrip('/')}/{name}",
+            'secret_token': getSecretToken(bot),
+            'max_connections': WEBHOOK_MAX_CONNECTIONS,
+        },
+        bot=name,
+    ))
+    try:
+        registered = json.loads(response['text']).get('ok', False)
+    except ValueError:
+        registered = False
+
+    if not registered:
+        # Telegram doesn't send the updates anywhere, the server is useless
+        await runner.cleanup()
+        text = f"[{name}] webhook is not registered: {response['code']} {response['text']}"
+        await addLog(level='critical', text=text, send_telegram_message=True)
+        raise RuntimeError(text)
+
+    await addLog(level='info', text=f'[{name}] webhook is listening on {WEBHOOK_HOST}:{WEBHOOK_PORTS[name]}')
+
+    return runner
+
+
+def runWebhook(bot: telebot.TeleBot, name: str) -> None:
+    "Serves the webhook of the bot until the process is stopped."
+
+    runner = runtime.run(startWebhook(bot, name))
+    try:
+        while True:
+            time.sleep(60)
+    finally:
+        runtime.run(runner.cleanup())
+
+def runPolling(bot: telebot.TeleBot) -> None:
+    "Receives the updates by the long polling, the webhook is removed first."
+
+    bot.remove_webhook()
+    while True:
+        try:
+            bot.polling(none_stop=True)
+        except Exception as e:
+            runtime.run(addLog(level='critical', text=traceback.format_exc(), send_telegram_message=True))
+        time.sleep(1)
+
+def receiveUpdates(bot: telebot.TeleBot, name: str) -> None:
+    '''Runs the stream worker if the process is started with the `worker` argument,
+    the webhook if `WEBHOOK_URL` is set in the config, the long polling otherwise.'''
+
+    if sys.argv[1:2] == ['worker']:
+        runWorker(bot, name)
+    elif WEBHOOK_URL:
+        runWebhook(bot, name)
+    else:
+        runPolling(bot)
@@ -1,16 +1,29 @@
+from .storage import getRedisConnection
+from .cache import LRUCache
+from .tg_api.bot import AsyncBot
+
 import telebot
 import datetime
 
 
-async def getUsername(bot: telebot.TeleBot, user_id: int, profile_link=False) -> str:
-    '''Checks all the username options and reduces them to one.
+# Display names are kept in process for a short time and in Redis, shared by both bots, for longer.
+# A user whose name can't be got is cached as an empty name for a shorter time.
+USERNAME_LOCAL_TTL = 60*10
+USERNAME_TTL = 60*60*24
+USERNAME_NEGATIVE_TTL = 60*5
+
+usernames_cache = LRUCache(maxsize=10000, ttl=USERNAME_LOCAL_TTL)
+usernames_metrics = {
+    'local_hits': 0,
+    'redis_hits': 0,
+    'misses': 0,
+    'api_errors': 0,
+}
 
-    :param bot: object of telebot.TeleBot.
-    :param user_id: telegram user id.
-    :param profile_link: if `True`, the username becomes clickable with a link to the user's profile.
-    '''
 
-    user = bot.get_chat_member(chat_id=user_id, user_id=user_id).user
+def formatUsername(user: telebot.types.User) -> str:
+    "Checks all the username options and reduces them to one."
+
     first_name = user.first_name
     last_name = user.last_name
     telegram_username = user.username
@@ -19,14 +32,64 @@ async def getUsername(bot: telebot.TeleBot, user_id: int, profile_link=False) ->
     if first_name: username_parts.append(first_name)
     if first_name and last_name: username_parts.append(last_name)
     if len(username_parts) == 0 and telegram_username: username_parts.append(telegram_username)
-    if len(username_parts) == 0: username_parts.append(user_id)
+    if len(username_parts) == 0: username_parts.append(str(user.id))
+
+    return ' '.join(username_parts)
+
+async def rememberUser(user: telebot.types.User) -> None:
+    '''Refreshes the cached name from the user data which came with an update,
+    so the next `getUsername` doesn't need a request to Telegram.'''
+
+    username = formatUsername(user)
+    if usernames_cache.get(user.id) == username:
+        return
+
+    usernames_cache.set(user.id, username)
+    redis = (await getRedisConnection())
+    await redis.set(f"username={user.id}", username, ex=USERNAME_TTL)
 
-    username = ' '.join(username_parts)
+async def getUsername(bot: AsyncBot, user_id: int, profile_link=False) -> str:
+    '''Returns the display name of a user. Asks Telegram only if the name is not cached.
+
+    :param bot: awaitable methods of the bot (see `AsyncBot`).
+    :param user_id: telegram user id.
+    :param profile_link: if `True`, the username becomes clickable with a link to the user's profile.
+    '''
+
+    username = usernames_cache.get(user_id)
+    if username is not None:
+        usernames_metrics['local_hits'] += 1
+    else:
+        redis = (await getRedisConnection())
+        cached = (await redis.get(f"username={user_id}"))
+
+        if cached is not None:
+            usernames_metrics['redis_hits'] += 1
+            username = cached.decode()
+        else:
+            usernames_metrics['misses'] += 1
+            try:
+                member = (await bot.get_chat_member(chat_id=user_id, user_id=user_id))
+                username = formatUsername(member.user)
+                ttl = USERNAME_TTL
+            except telebot.apihelper.ApiTelegramException:
+                usernames_metrics['api_errors'] += 1
+                username = ''
+                ttl = USERNAME_NEGATIVE_TTL
+            await redis.set(f"username={user_id}", username, ex=ttl)
+
+        usernames_cache.set(user_id, username, ttl=None if username else USERNAME_NEGATIVE_TTL)
+
+    if username == '':
+        username = str(user_id)
     if profile_link:
         username = f'[{username}](tg://user?id={user_id})'
 
     return username
 
+def getUsernameMetrics() -> dict:
+    return {**usernames_metrics, 'local_size': len(usernames_cache.data)}
+
 
 async def greeting():
     "Creates a personalized greeting depending on the current server time."
@@ -1,34 +1,41 @@
 from ..config import MAIN_BOT_TOKEN, WORK_BOT_TOKEN
-from ..exceptions import exceptions_catcher, NotFound
+from ..exceptions import exceptions_catcher
 from ..logs import addLog
 from .. import utils
 from ..state_machine import *
-from ..db import connect, asyncpg_errors
+from ..db import acquire, transaction
 from ..works import getWorkTitle
+from ..counters import getWorkerWorkCounters, reconcileCounters
 from ..tg_api.queries import telegram_api_request
-from ..pagination import paginator
+from ..tg_api.bot import AsyncBot
+from ..tg_api.broadcast import deliver, scheduler as broadcast_scheduler
+from ..pagination import paginator, resetCounts
+from .feed import getFeedPage, works_keyset, getWorkWorkers, addFreeWork, removeFreeWork, resetFeed
+from .queries import *
+from .reminders import scheduler, sendWorkReminders, scheduleWorkReminders, cancelWorkReminders, REMINDERS_TIME
+from ..runtime import runtime
+from ..updates import receiveUpdates
+from ..dispatcher import Dispatcher
+from ..callbacks import encodeCallback, isPackedCallback, unpackCallback, parseLegacyCallback
 
-import sys
-import time
 import uuid
 import json
 import telebot
 import asyncio
 import datetime
-import traceback
 from textwrap import dedent
-import schedule
-import threading
 
 
 # Telegram Bot API configuration
 bot = telebot.TeleBot(token=WORK_BOT_TOKEN)
+api = AsyncBot(bot) # the requests to Telegram from the coroutines
 main_bot = telebot.TeleBot(token=MAIN_BOT_TOKEN)
+main_api = AsyncBot(main_bot)
+dispatcher = Dispatcher()
 keyboard_obj = telebot.types.InlineKeyboardMarkup
 button_obj = telebot.types.InlineKeyboardButton
 
 
-
 # Catching all the "/start" in the chat
 @bot.message_handler(commands=['start'])
 def firstRun(message):
@@ -37,7 +44,7 @@ def firstRun(message):
 
     if len(start_text) > 1:
         worker_add_id = str(start_text[1])
-        asyncio.run(addWorker(message, worker_add_id))
+        runtime.submit(addWorker(message, worker_add_id))
     else:
         bot.send_message(
             chat_id=user_id,
@@ -54,21 +61,14 @@ def firstRun(message):
 @exceptions_catcher('work')
 async def addWorker(message: telebot.types.Message, worker_add_id: str) -> None:
     user_id = message.from_user.id
+    await utils.rememberUser(message.from_user)
     now = datetime.datetime.now
 
-    conn = await connect()
-    try:
-        query = '''
-            SELECT "userID", "workerID"
-            FROM "userWorkers"
-            WHERE "addID" = $1
-        '''
-        user_worker_data = (await conn.fetchrow(query, worker_add_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        user_worker_data = (await conn.fetchrow(WORKER_INVITE_QUERY, worker_add_id))
 
     if user_worker_data is None:
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f"*❌ Данная ссылка-приглашение не действительна.*"
@@ -80,62 +80,51 @@ async def addWorker(message: telebot.types.Message, worker_add_id: str) -> None:
         if worker_id:
             await start(message)
         else:
-            conn = await connect()
-            try:
-                stmt_workers = '''
-                    INSERT INTO workers (id, "regDate")
-                    VALUES ($1, $2)
-                '''
-                await conn.fetchval(stmt_workers, user_id, now())
-            except asyncpg_errors['UniqueViolationError']:
-                pass
-            finally:
-                stmt_user_workers = '''
-                    UPDATE "userWorkers"
-                    SET "workerID" = $1, "isActive" = true
-                    WHERE "addID" = $2
-                '''
-                await conn.execute(stmt_user_workers, user_id, worker_add_id)
-
-                landlord_user_id = user_worker_data[0]
-                landlord_username = (await utils.getUsername(main_bot, landlord_user_id))
-                bot.send_message(
-                    chat_id=user_id,
-                    text=dedent(
-                        f'''
-                        ✅ *{landlord_username}* назначил Вас своим сотрудником.
+            async with transaction() as uow:
+                await uow.execute(ADD_WORKER_ACCOUNT_QUERY, user_id, now())
+                await uow.execute(ACTIVATE_WORKER_QUERY, user_id, worker_add_id)
+
+            landlord_user_id = user_worker_data[0]
+            # The works of the landlord become visible to the worker
+            await resetFeed(user_id)
+            await resetCounts(user_id, landlord_user_id)
+            landlord_username = (await utils.getUsername(main_api, landlord_user_id))
+            await api.send_message(
+                chat_id=user_id,
+                text=dedent(
+                    f'''
+                    ✅ *{landlord_username}* назначил Вас своим сотрудником.
                         
-                        Теперь Вам будут приходить уведомления о новых запланированных задачах.
-                        '''
-                    ),
-                    parse_mode="Markdown",
-                )
+                    Теперь Вам будут приходить уведомления о новых запланированных задачах.
+                    '''
+                ),
+                parse_mode="Markdown",
+            )
 
-                username = (await utils.getUsername(bot, user_id))
-                await telegram_api_request(
-                    request_method='POST',
-                    api_method='sendMessage',
-                    parameters={
-                        'chat_id': landlord_user_id,
-                        'text': dedent(
-                            f'''
-                            ✅ Ваш сотрудник *{username}* подключился к системе RentalerWork.
-
-                            Теперь его аккаунт активен и Вы можете ставить ему задачи.
-                            '''),
-                        'parse_mode': 'Markdown',
-                    },
-                    bot='main'
-                )
+            username = (await utils.getUsername(api, user_id))
+            await telegram_api_request(
+                request_method='POST',
+                api_method='sendMessage',
+                parameters={
+                    'chat_id': landlord_user_id,
+                    'text': dedent(
+                        f'''
+                        ✅ Ваш сотрудник *{username}* подключился к системе RentalerWork.
 
-                await conn.close()
+                        Теперь его аккаунт активен и Вы можете ставить ему задачи.
+                        '''),
+                    'parse_mode': 'Markdown',
+                },
+                bot='main'
+            )
 
 
 # Getter of any text messenges in the chat
 @bot.message_handler(content_types='text')
 def main(message):
-    asyncio.run(start(message))
+    runtime.submit(start(message))
 
+@dispatcher.handler()
 @exceptions_catcher('work')
 @autoSetState(bot='work')
 async def start(message: telebot.types.Message=None, user_id: int=None) -> None:
@@ -143,31 +132,20 @@ async def start(message: telebot.types.Message=None, user_id: int=None) -> None:
 
     if user_id is None:
         user_id = message.from_user.id
+        await utils.rememberUser(message.from_user)
 
     greeting = await utils.greeting()
-    name = await utils.getUsername(bot, user_id)
+    name = await utils.getUsername(api, user_id)
 
-    conn = await connect()
-    try:
-        query = '''
-            SELECT COUNT(id)
-            FROM "userWorks"
-            WHERE 
-                "workID" = 1
-                AND "workerID" = $1
-                AND "completedDate" IS NULL
-                AND "acceptForWorkDate" IS NOT NULL
-        '''
-        accepted_cleaning = (await conn.fetchval(query, user_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        accepted_cleaning = (await getWorkerWorkCounters(conn, user_id, work_id=1))['accepted']
 
     keyboard = keyboard_obj()
-    keyboard.add(button_obj('📅 Предстоящие уборки', callback_data='start_func-cleaningList-status="accepted"'))
-    keyboard.add(button_obj('🔎 Свободные уборки', callback_data='start_func-cleaningList-status="scheduled"'))
-    keyboard.add(button_obj('✅ Завершённые уборки', callback_data='start_func-cleaningList-status="completed"'))
+    keyboard.add(button_obj('📅 Предстоящие уборки', callback_data=encodeCallback('cleaningList', status='accepted')))
+    keyboard.add(button_obj('🔎 Свободные уборки', callback_data=encodeCallback('cleaningList', status='scheduled')))
+    keyboard.add(button_obj('✅ Завершённые уборки', callback_data=encodeCallback('cleaningList', status='completed')))
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -183,45 +161,33 @@ async def start(message: telebot.types.Message=None, user_id: int=None) -> None:
 
 # === Tools ===
 
+@dispatcher.handler()
 @exceptions_catcher('work')
 @autoSetState('work')
-async def cleaningList(user_id: int, status: str, page: int=1) -> None:
-    conn = await connect()
-    try:
-        args = []
-        match status:
-            case 'accepted':
-                query_where_confitions = '"workerID" = $1'
-                args.append(user_id)
-            case 'scheduled':
-                query_where_confitions = '"acceptForWorkDate" IS NULL'
-            case 'completed':
-                query_where_confitions = '"completedDate" IS NOT NULL'
-
-        query = f'''
-            SELECT id, date, "timeRange"
-            FROM "userWorks"
-            WHERE {query_where_confitions}
-        '''
-        cleaning = (await conn.fetch(query, *args))
-    finally:
-        await conn.close()
-
-    cleaning_count = len(cleaning)
+async def cleaningList(user_id: int, status: str, page: int=1, after: str=None, before: str=None) -> None:
+    async with acquire() as conn:
+        cleaning_count, cleaning = (await getFeedPage(conn, user_id, status, page=page, after=after, before=before))
 
     if cleaning_count > 0:
         cleaning_data = tuple([
             {
                 # Cleaning text indexes: 1 - date, 2 - time_range, 3 - acceptanceConfirmed
                 'text': f'{c[1]} ({c[2]})',
-                'callback_data': f'start_func-cleaningCard-work_id={c[0]}-call_id=True'
+                'callback_data': encodeCallback('cleaningCard', work_id=c[0], call_id=True)
             } 
             for c in cleaning
         ])
-        keyboard = (await paginator(array=cleaning_data, current_page=page, status=status))
+        keyboard = (await paginator(
+            array=cleaning_data,
+            handler='cleaningList',
+            current_page=page,
+            count=cleaning_count,
+            cursors=works_keyset.getCursors(cleaning),
+            status=status,
+        ))
     else:
         keyboard = keyboard_obj()
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
     match status:
         case 'accepted':
@@ -231,43 +197,24 @@ async def cleaningList(user_id: int, status: str, page: int=1) -> None:
         case 'completed':
             list_title = '✅ Завершённые уборки'
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=f"{list_title}",
         parse_mode="Markdown",
         reply_markup=keyboard,
     )     
 
+@dispatcher.handler()
 @exceptions_catcher('work')
 @autoSetState('work')
 async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT 
-                w.id,
-                w."propertyID", p."address",
-                w."workerID",
-                w.date, w."timeRange", 
-                w."acceptForWorkDate", w."acceptanceConfirmed", w."completedDate",
-                w.comment, 
-                w."addDate", 
-                c."hygieneKitsCount"
-            FROM "userWorks" w
-            JOIN cleaning c
-                ON c."workID" = w.id
-            JOIN properties p
-                ON p.id = w."propertyID"
-            WHERE w.id = $1
-        '''
-        cleaning_data = (await conn.fetchrow(query, work_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        cleaning_data = (await conn.fetchrow(CLEANING_CARD_QUERY, work_id))
 
     if cleaning_data:
         cleaning_data = dict(cleaning_data)
     else:
-        return bot.answer_callback_query(
+        return await api.answer_callback_query(
             callback_query_id=call_id, 
             text=dedent(
             '''
@@ -284,7 +231,7 @@ async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
         keyboard.add(
             button_obj(
                 text='☑️ Принять в работу', 
-                callback_data=f'start_func-acceptCleaning-work_id={work_id}-call_id=True'
+                callback_data=encodeCallback('acceptCleaning', work_id=work_id, call_id=True)
             )
         )
 
@@ -294,18 +241,18 @@ async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
             keyboard.add(
                 button_obj(
                     text='✅ Завершить клининг', 
-                    callback_data=f'start_func-completeCleaning-work_id={work_id}'
+                    callback_data=encodeCallback('completeCleaning', work_id=work_id)
                 )
             )
         if cleaning_data['acceptForWorkDate'] and cleaning_data['acceptanceConfirmed'] is False:
             keyboard.add(
                 button_obj(
                     text='🚫 Отказаться от проведения', 
-                    callback_data=f'start_func-refuseCleaning-work_id={work_id}-call_id=True'
+                    callback_data=encodeCallback('refuseCleaning', work_id=work_id, call_id=True)
                 )
             )
 
-    keyboard.add(button_obj(text='⬅️ Назад', callback_data='start_func-back'))
+    keyboard.add(button_obj(text='⬅️ Назад', callback_data=encodeCallback('back')))
 
     address = cleaning_data['address']
     now_date = datetime.datetime.now().date()
@@ -316,7 +263,7 @@ async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
     acceptanceConfirmed = cleaning_data['acceptanceConfirmed']
     hygiene_kits_count = cleaning_data['hygieneKitsCount']
 
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -332,29 +279,16 @@ async def cleaningCard(user_id: int, work_id: int, call_id: int=None) -> None:
         reply_markup=keyboard
     )
 
+@dispatcher.handler()
 @exceptions_catcher('work')
 async def acceptCleaning(user_id: int, work_id: int, call_id: int, confirmed: bool=False) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT 
-                w.id, w."userID", w."propertyID", p."address",
-                w.date, w."timeRange", w."acceptForWorkDate"
-            FROM "userWorks" w
-            JOIN cleaning c
-                ON c."workID" = w.id
-            JOIN properties p
-                ON p.id = w."propertyID"
-            WHERE w.id = $1
-        '''
-        cleaning_data = (await conn.fetchrow(query, work_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        cleaning_data = (await conn.fetchrow(ACCEPT_CLEANING_QUERY, work_id))
 
     if cleaning_data:
         cleaning_data = dict(cleaning_data)
     else:
-        return bot.answer_callback_query(
+        return await api.answer_callback_query(
             callback_query_id=call_id, 
             text=dedent(
             '''
@@ -366,7 +300,7 @@ async def acceptCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
         )
 
     if cleaning_data['acceptForWorkDate'] is not None:
-        return bot.answer_callback_query(
+        return await api.answer_callback_query(
             callback_query_id=call_id, 
             text=dedent(
             '''
@@ -380,14 +314,14 @@ async def acceptCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
     if confirmed is False:
         keyboard = keyboard_obj()
         keyboard.row(
-            button_obj(text='❌ Отмена', callback_data='start_func-back'),
+            button_obj(text='❌ Отмена', callback_data=encodeCallback('back')),
             button_obj(
                 text='✅ Принять', 
-                callback_data=f'start_func-acceptCleaning-work_id={work_id}&confirmed=True-call_id=True'
+                callback_data=encodeCallback('acceptCleaning', work_id=work_id, confirmed=True, call_id=True)
             )
         )
 
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -402,35 +336,41 @@ async def acceptCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
         )
 
     else:
-        conn = await connect()
-        try:
+        async with transaction() as uow:
             now = datetime.datetime.now
-            stmt = '''
-                UPDATE "userWorks"
-                SET "workerID" = $1, "acceptForWorkDate" = $2
-                WHERE id = $3
-            '''
-            await conn.execute(stmt, user_id, now(), work_id)
+            accepted = (await uow.fetchval(TAKE_CLEANING_QUERY, user_id, now(), work_id))
 
-            query = '''
-                SELECT "workerName", "workerNumber"
-                FROM "userWorkers"
-                WHERE "workerID" = $1
-            '''
-            worker_data = (await conn.fetchrow(query, user_id))
-        finally:
-            await conn.close()
+            if accepted is not None:
+                workers = (await getWorkWorkers(uow, work_id))
+
+                worker_data = (await uow.fetchrow(WORKER_NAME_QUERY, user_id, cleaning_data['userID']))
+
+        if accepted is None:
+            return await api.answer_callback_query(
+                callback_query_id=call_id, 
+                text=dedent(
+                '''
+                ❌ Данная уборка уже закреплена за другим сотрудником!
+
+                Меню из которого Вы пытались принять его в работу устарело.
+                '''), 
+                show_alert=True
+            )
+
+        await scheduleWorkReminders(work_id, cleaning_data['date'])
+        await removeFreeWork(work_id, workers)
+        await resetCounts(user_id)
 
         keyboard = keyboard_obj()
         keyboard.add(
             button_obj(
                 text='🧴 Карточка клининга', 
-                callback_data=f'start_func-cleaningCard-work_id={work_id}',
+                callback_data=encodeCallback('cleaningCard', work_id=work_id),
             )
         )
 
         # Message for worker
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -470,51 +410,36 @@ async def acceptCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
                     🧑🏼‍🔧 Отвественный сотрудник: {worker_name_and_number}
                     '''),
                 'parse_mode': 'Markdown',
-                'reply_markup': json.dumps({
+                'reply_markup': {
                     "inline_keyboard": [
                         [
                             {
                                 'text': '🧴 Карточка клининга',
-                                'callback_data': f'start_func-cleaningCard-work_id={work_id}-call_id=True',
+                                'callback_data': encodeCallback('cleaningCard', work_id=work_id, call_id=True),
                             },
                         ],
                         [
                             {
                                 'text': '🧑🏼‍🔧 Карточка сотрудника',
-                                'callback_data': f'start_func-workerCard-worker_id={user_id}-call_id=True',
+                                'callback_data': encodeCallback('workerCard', worker_id=user_id, call_id=True),
                             },
                         ],
                     ],
-                }),
+                },
             },
             bot='main'
         )
 
+@dispatcher.handler()
 @exceptions_catcher('work')
 async def refuseCleaning(user_id: int, work_id: int, call_id: int, confirmed: bool=False) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT 
-                w.id, w."userID", w."propertyID", p."address",
-                w.date, w."timeRange", w."acceptForWorkDate",
-                w.comment
-            FROM "userWorks" w
-            JOIN cleaning c
-                ON c."workID" = w.id
-            JOIN properties p
-                ON p.id = w."propertyID"
-            WHERE w.id = $1 
-                AND w."workerID" = $2
-        '''
-        cleaning_data = (await conn.fetchrow(query, work_id, user_id))
-    finally:
-        await conn.close()
+    async with acquire() as conn:
+        cleaning_data = (await conn.fetchrow(REFUSE_CLEANING_QUERY, work_id, user_id))
 
     if cleaning_data:
         cleaning_data = dict(cleaning_data)
     else:
-        return bot.answer_callback_query(
+        return await api.answer_callback_query(
             callback_query_id=call_id, 
             text=dedent(
             '''
@@ -528,14 +453,14 @@ async def refuseCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
     if confirmed is False:
         keyboard = keyboard_obj()
         keyboard.row(
-            button_obj(text='❌ Отмена', callback_data='start_func-back'),
+            button_obj(text='❌ Отмена', callback_data=encodeCallback('back')),
             button_obj(
                 text='🚫 Отказаться', 
-                callback_data=f'start_func-refuseCleaning-work_id={work_id}&confirmed=True-call_id=True'
+                callback_data=encodeCallback('refuseCleaning', work_id=work_id, confirmed=True, call_id=True)
             )
         )
 
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=dedent(
                 f'''
@@ -549,37 +474,40 @@ async def refuseCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
         )
 
     else:
-        conn = await connect()
-        try:
-            now = datetime.datetime.now
-            stmt = '''
-                UPDATE "userWorks"
-                SET "workerID" = NULL, "acceptForWorkDate" = NULL
-                WHERE id = $1
-            '''
-            await conn.execute(stmt, work_id)
-
-            query = '''
-                SELECT "workerID"
-                FROM "userWorkers"
-                WHERE "userID" = $1
-                    AND "workID" = $2
-                    AND "workerID" != $3
-            '''
-            cleaners = [c[0] for c in (await conn.fetch(query, cleaning_data['userID'], 1, user_id))]
-        finally:
-            await conn.close()
+        async with transaction() as uow:
+            status = (await uow.execute(FREE_CLEANING_QUERY, work_id, user_id))
+            workers = (await getWorkWorkers(uow, work_id)) if status == 'UPDATE 1' else None
+
+        # The cleaning is removed, completed or already refused since the card was read
+        if workers is None:
+            return await api.answer_callback_query(
+                callback_query_id=call_id,
+                text=dedent(
+                '''
+                🔎 Запись о клининге не найдена!
+
+                Меню из которого Вы пытались отказаться от него устарело.
+                '''),
+                show_alert=True
+            )
+
+        # The other active cleaners of the landlord are notified about the free work
+        cleaners = [w for w in workers if w != user_id]
+
+        await cancelWorkReminders(work_id)
+        await addFreeWork(work_id, cleaning_data['date'], workers)
+        await resetCounts(user_id, cleaning_data['userID'])
 
         keyboard = keyboard_obj()
         keyboard.add(
             button_obj(
                 text='🧴 Карточка клининга', 
-                callback_data=f'start_func-cleaningCard-work_id={work_id}',
+                callback_data=encodeCallback('cleaningCard', work_id=work_id),
             )
         )
 
         # Message for worker
-        bot.send_message(
+        await api.send_message(
             chat_id=user_id,
             text=f"*🚫 Вы отказались от проведения клининга!*",
             parse_mode="Markdown",
@@ -600,22 +528,22 @@ async def refuseCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
                     📅 Дата и время проведения: *{cleaning_data['date']} ({cleaning_data['timeRange']})*
                     '''),
                 'parse_mode': 'Markdown',
-                'reply_markup': json.dumps({
+                'reply_markup': {
                     "inline_keyboard": [
                         [
                             {
                                 'text': '🧴 Карточка клининга',
-                                'callback_data': f'start_func-cleaningCard-work_id={work_id}-call_id=True',
+                                'callback_data': encodeCallback('cleaningCard', work_id=work_id, call_id=True),
                             },
                         ],
                         [
                             {
                                 'text': '🧑🏼‍🔧 Карточка сотрудника',
-                                'callback_data': f'start_func-workerCard-worker_id={user_id}-call_id=True',
+                                'callback_data': encodeCallback('workerCard', worker_id=user_id, call_id=True),
                             },
                         ],
                     ],
-                }),
+                },
             },
             bot='main'
         )
@@ -624,7 +552,7 @@ async def refuseCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
         keyboard.add(
             button_obj(
                 text='☑️ Приянть в работу', 
-                callback_data=f'start_func-acceptCleaning-work_id={work_id}-call_id=True'
+                callback_data=encodeCallback('acceptCleaning', work_id=work_id, call_id=True)
             )
         )
 
@@ -637,56 +565,60 @@ async def refuseCleaning(user_id: int, work_id: int, call_id: int, confirmed: bo
         elif date == (now() + datetime.timedelta(days=1)).date(): cleaning_date = 'Завтра'
         else: cleaning_date = date
 
-        for cleaner_id in cleaners:
-            bot.send_message(
-                chat_id=cleaner_id,
-                text=dedent(
-                    f'''
-                    *⏰ Запланирован клининг!*
+        runtime.submit(
+            deliver(
+                chat_ids=cleaners,
+                parameters={
+                    'text': dedent(
+                        f'''
+                        *⏰ Запланирован клининг!*
 
-                    *{cleaning_date} ({time_range})* на адрес: *{property_address}*
+                        *{cleaning_date} ({time_range})* на адрес: *{property_address}*
 
-                    {f'*💭 Комментарий:* {comment}' if comment else ''}
-                    '''
-                ),
-                parse_mode="Markdown",
-                reply_markup=keyboard,
+                        {f'*💭 Комментарий:* {comment}' if comment else ''}
+                        '''
+                    ),
+                    'parse_mode': 'Markdown',
+                    'reply_markup': keyboard.to_dict(),
+                },
+                bot='work'
             )
+        )
 
+@dispatcher.handler()
 @exceptions_catcher('work')
 async def completeCleaning(user_id: int, work_id: int) -> None:
-    conn = await connect()
-    try:
+    async with transaction() as uow:
         now = datetime.datetime.now
-        query = '''
-            SELECT 
-                w.id, w."userID", p."address"
-            FROM "userWorks" w
-            JOIN properties p
-                ON p.id = w."propertyID"
-            WHERE w.id = $1
-        '''
-        work_data = (await conn.fetchrow(query, work_id))
-
-        stmt = '''
-            UPDATE "userWorks"
-            SET "completedDate" = $1
-            WHERE "workerID" = $2 AND id = $3
-        '''
-        await conn.execute(stmt, now(), user_id, work_id)
-    finally:
-        await conn.close()
+        work_data = (await uow.fetchrow(WORKER_WORK_QUERY, work_id))
+        status = (await uow.execute(COMPLETE_CLEANING_QUERY, now(), user_id, work_id))
+
+    # The cleaning is removed, taken by another worker or already completed
+    if work_data is None or status != 'UPDATE 1':
+        return await api.send_message(
+            chat_id=user_id,
+            text=dedent(
+                '''
+                *🔎 Клининг не найден или уже завершён!*
+
+                Меню из которого Вы пытались завершить его устарело.
+                '''
+            ),
+            parse_mode="Markdown",
+        )
+
+    await resetCounts(user_id, work_data['userID'])
 
     keyboard = keyboard_obj()
     keyboard.add(
         button_obj(
             text='🧴 Карточка клининга', 
-            callback_data=f'start_func-cleaningCard-work_id={work_id}-call_id=True'
+            callback_data=encodeCallback('cleaningCard', work_id=work_id, call_id=True)
         )
     )
 
     # Message for worker
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=f"*✅ Клининг по адресу {work_data['address']} завершён!*",
         parse_mode="Markdown",
@@ -701,59 +633,57 @@ async def completeCleaning(user_id: int, work_id: int) -> None:
             'chat_id': work_data['userID'],
             'text': f"*✅ Клининг по адресу {work_data['address']} завершён!*",
             'parse_mode': 'Markdown',
-            'reply_markup': json.dumps({
+            'reply_markup': {
                 "inline_keyboard": [
                     [
                         {
                             'text': '🧴 Карточка клининга',
-                            'callback_data': f'start_func-cleaningCard-work_id={work_id}-call_id=True',
+                            'callback_data': encodeCallback('cleaningCard', work_id=work_id, call_id=True),
                         },
                     ],
                     [
                         {
                             'text': '🧑🏼‍🔧 Карточка сотрудника',
-                            'callback_data': f'start_func-workerCard-worker_id={user_id}-call_id=True',
+                            'callback_data': encodeCallback('workerCard', worker_id=user_id, call_id=True),
                         },
                     ],
                 ],
-            }),
+            },
         },
         bot='main'
     )
 
+@dispatcher.handler()
 @exceptions_catcher('work')
 async def confirmAcceptance(user_id: int, work_id: int) -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT 
-                w.id, w."userID", p."address", w."timeRange"
-            FROM "userWorks" w
-            JOIN properties p
-                ON p.id = w."propertyID"
-            WHERE w.id = $1
-        '''
-        work_data = (await conn.fetchrow(query, work_id))
-
-        stmt = '''
-            UPDATE "userWorks"
-            SET "acceptanceConfirmed" = TRUE
-            WHERE "workerID" = $1 AND id = $2
-        '''
-        await conn.execute(stmt, user_id, work_id)
-    finally:
-        await conn.close()
+    async with transaction() as uow:
+        work_data = (await uow.fetchrow(WORKER_WORK_QUERY, work_id))
+        status = (await uow.execute(CONFIRM_CLEANING_QUERY, user_id, work_id))
+
+    # The cleaning is removed, taken by another worker or already confirmed
+    if work_data is None or status != 'UPDATE 1':
+        return await api.send_message(
+            chat_id=user_id,
+            text=dedent(
+                '''
+                *🔎 Клининг не найден или уже подтверждён!*
+
+                Меню из которого Вы пытались подтвердить его проведение устарело.
+                '''
+            ),
+            parse_mode="Markdown",
+        )
 
     keyboard = keyboard_obj()
     keyboard.add(
         button_obj(
             text='🧴 Карточка клининга', 
-            callback_data=f'start_func-cleaningCard-work_id={work_id}-call_id=True'
+            callback_data=encodeCallback('cleaningCard', work_id=work_id, call_id=True)
         )
     )
 
     # Message for worker
-    bot.send_message(
+    await api.send_message(
         chat_id=user_id,
         text=dedent(
             f'''
@@ -780,22 +710,22 @@ async def confirmAcceptance(user_id: int, work_id: int) -> None:
                 '''
             ),
             'parse_mode': 'Markdown',
-            'reply_markup': json.dumps({
+            'reply_markup': {
                 "inline_keyboard": [
                     [
                         {
                             'text': '🧴 Карточка клининга',
-                            'callback_data': f'start_func-cleaningCard-work_id={work_id}-call_id=True',
+                            'callback_data': encodeCallback('cleaningCard', work_id=work_id, call_id=True),
                         },
                     ],
                     [
                         {
                             'text': '🧑🏼‍🔧 Карточка сотрудника',
-                            'callback_data': f'start_func-workerCard-worker_id={user_id}-call_id=True',
+                            'callback_data': encodeCallback('workerCard', worker_id=user_id, call_id=True),
                         },
                     ],
                 ],
-            }),
+            },
         },
         bot='main'
     )
@@ -805,178 +735,145 @@ async def confirmAcceptance(user_id: int, work_id: int) -> None:
 
 # === Work notifications ===
 
-def sendWorkNotificationsStarter():
-    asyncio.run(sendWorkNotifications())
+@scheduler.job(run_at=True)
+async def sendWorkNotifications(run_at: datetime.datetime) -> None:
+    '''Sends the daily reminders and confirmation requests to the workers.
+    The dates are counted from the scheduled run, so a delayed run or a retry after midnight
+    reminds about the same works. An exception is left to the scheduler, which retries the run.'''
 
-@exceptions_catcher('work')
-async def sendWorkNotifications() -> None:
-    conn = await connect()
-    try:
-        query = '''
-            SELECT 
-                w.id, w."workID",
-                w."propertyID", p."address",
-                w."workerID", uw."workerName",
-                w.date, w."timeRange", 
-                w."acceptForWorkDate", w."acceptanceConfirmed",
-                w.comment
-            FROM "userWorks" w
-            JOIN properties p
-                ON p.id = w."propertyID"
-            JOIN "userWorkers" uw
-                ON uw."workerID" = w."workerID"
-            WHERE w."workerID" IS NOT NULL
-                AND w."completedDate" IS NULL
-        '''
-        works = (await conn.fetch(query))
-    finally:
-        await conn.close()
+    stats = (await sendWorkReminders(today=run_at.date()))
+    await addLog(
+        level='info',
+        text=f"Work notifications: {stats['sent']} sent, {stats['skipped']} already sent, {stats['failed']} failed.",
+    )
 
-    now = datetime.datetime.now().date()
+async def scheduleWorkNotifications() -> None:
+    '''Adds the daily reminders run to the scheduler, if it is not there yet.
+    Single reminders are scheduled for every taken work, the daily run catches up
+    the works which were taken before their reminders started to be scheduled.'''
+
+    now = datetime.datetime.now()
+    run_at = datetime.datetime.combine(now.date(), REMINDERS_TIME)
+    if run_at <= now:
+        run_at += datetime.timedelta(days=1)
+
+    await scheduler.schedule(
+        job_id='work-notifications',
+        handler='sendWorkNotifications',
+        run_at=run_at,
+        interval=60*60*24,
+        replace=False,
+    )
 
-    for work in works:
-        work_title = getWorkTitle(work_id=work['workID'])
-        address = work['address']
-        time_range = work['timeRange']
+# /. === Work notifications ===
 
-        if ((work['date'] - now).days == 1) and (work['acceptanceConfirmed'] is False):
-            keyboard = keyboard_obj()
-            keyboard.row(
-                button_obj(text='✅ Подтвердить', callback_data=f'start_func-confirmAcceptance-work_id={work["id"]}'),
-                button_obj(text='🚫 Отказаться', callback_data=f'start_func-refuseCleaning-work_id={work["id"]}-call_id=True'),
-            )
 
-            bot.send_message(
-                chat_id=work['workerID'],
-                text=dedent(
-                    f'''
-                    *☑️ Подтвредите проведение работ*
+# === Counters ===
 
-                    На Вас назначено проведение работ *({work_title})*
-                    по адресу *{address}* - завтра *({time_range})*.
+# Menu counters are recounted at night, when the bots are least busy
+COUNTERS_CHECK_TIME = datetime.time(4, 0)
 
-                    _Подтвердите возможность проведения работ или откажитесь от их выполнения, нажав на соответствующую кнопку._
-                    '''
-                ),
-                parse_mode="Markdown",
-                reply_markup=keyboard,
-            )
-        elif ((work['date'] - now).days == 2):
-            bot.send_message(
-                chat_id=work['workerID'],
-                text=dedent(
-                    f'''
-                    *🔔 Напоминание о предстоящих работах*
+@scheduler.job()
+@exceptions_catcher('work')
+async def checkCounters() -> None:
+    "Recounts the menu counters. A correction means that some write has bypassed the triggers."
 
-                    На Вас назначено проведение работ *({work_title})*
-                    по адресу *{address}* - послезавтра *({time_range})*.
-                    '''
-                ),
-                parse_mode="Markdown",
-            )
+    async with acquire() as conn:
+        corrected = (await reconcileCounters(conn))
 
-def schedule_notifications():
-    schedule.every().day.at("19:00").do(sendWorkNotificationsStarter)
+    if corrected:
+        await addLog(
+            level='warning',
+            text=f"Menu counters: {corrected} rows were corrected by the reconciliation.",
+            send_telegram_message=True,
+        )
 
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
+async def scheduleCountersCheck() -> None:
+    now = datetime.datetime.now()
+    run_at = datetime.datetime.combine(now.date(), COUNTERS_CHECK_TIME)
+    if run_at <= now:
+        run_at += datetime.timedelta(days=1)
+
+    await scheduler.schedule(
+        job_id='counters-check',
+        handler='checkCounters',
+        run_at=run_at,
+        interval=60*60*24,
+        replace=False,
+    )
 
-# /. === Work notifications ===
+# /. === Counters ===
 
 
 # Getter of any callback queries in the chat
 @bot.callback_query_handler(lambda call: True)
 def callbackHandler(call: telebot.types.CallbackQuery):
-    asyncio.run(statesRunner(call))
+    runtime.submit(statesRunner(call))
 
 @exceptions_catcher('work')
 async def statesRunner(call: telebot.types.CallbackQuery):
     "Runs required states."
 
     user_id = call.from_user.id
-    data = call.data.split('-') # 0 - command; 1 - command args; 2 - kwargs; 3: - parameters
-    command = data[0]
-
-    if command == 'start_func':
-        # List which have all the functions from the __main__ module
-        functions_list = [
-            name for (name, obj) 
-                in vars(sys.modules['__main__']).items() 
-                if hasattr(obj, "__class__") 
-                    and obj.__class__.__name__ == "function"
-        ]
-
-        func = data[1]
-        if 'back' != func not in functions_list:
-            raise NotFound
-
-        elif func == 'back': 
-            "Runs previous user state."
-
-            # Clear available next step handlers
-            bot.clear_step_handler_by_chat_id(chat_id=user_id)
-
-            current_state = (await getState(bot='work', user_id=user_id))
-            if current_state:
-                last_state = current_state['last_state']
-                last_state['is_back'] = True
-            else:
-                last_state = None
-
-            if last_state is None:
-                await start(user_id=user_id)
 
-            func = last_state['func']
-            args = last_state['args']
-            kwargs = [
-                f'{k}={v}' if isinstance(v, int) else f'{k}="{v}"'
-                for k,v in last_state['kwargs'].items()
-            ]
+    if isPackedCallback(call.data):
+        callback = (await unpackCallback(call.data))
+    else:
+        # Buttons which were sent before the packed callback data
+        callback = parseLegacyCallback(call.data)
+        if callback is None:
+            return
+        if callback['handler'] != 'back':
+            callback['kwargs'] = dispatcher.parseArguments(callback['handler'], callback['arguments'])
 
-            if len(set(('user_id', 'message', 'call')) & set(last_state['kwargs'].keys())) == 0 \
-                and len(args) == 0:
-                    kwargs.insert(0, f'user_id={user_id}')
+    func = callback['handler']
 
-            # Setting the past state as the current one 
-            await setState('work', user_id, last_state)
+    if func == 'back': 
+        "Runs previous user state."
 
+        # Clear available next step handlers
+        await delInputStep(bot='work', user_id=user_id)
+
+        # The previous state becomes current
+        last_state = (await popState(bot='work', user_id=user_id))
+
+        if last_state is None:
+            func, args, kwargs = 'start', [], {'user_id': user_id}
         else:
-            "Runs required function with kwargs."
-
-            if len(data) > 2 and data[2] != '':
-                args = []
-                kwargs = data[2].split('&')
-                kwargs.insert(0, f'user_id={user_id}')
-            else:
-                args, kwargs = [], []
-                kwargs.insert(0, f'user_id={user_id}')
-            
-            if len(data) > 3:
-                parameters = data[3].split('&')
-                if 'user_id=None' in parameters:
-                    del kwargs[0] # Remove user_id from kwargs
-                if 'call_id=True':
-                    kwargs.append(f'call_id=call.id')
-
-
-        # Deleting a bot message from a previous state
-        try:
-            bot.delete_message(chat_id=user_id, message_id=call.message.message_id)
-        except telebot.apihelper.ApiTelegramException:
-            pass
-    
-        func_arguments = [*args, *kwargs]
-        func_arguments_string = ', '.join(func_arguments)
-        await eval(f"{func}({func_arguments_string})")
+            func = last_state['func']
+            args = []
+            kwargs = {**last_state['kwargs'], 'user_id': user_id}
+            restoring_state.set(True)
+
+    else:
+        "Runs required function with kwargs."
+
+        args = []
+        kwargs = dispatcher.checkArguments(func, callback['kwargs'])
+        kwargs['user_id'] = user_id
+        if callback['call_id']:
+            kwargs['call_id'] = call.id
+
+    # Checking the function before deleting the message, so an unknown callback changes nothing
+    dispatcher.getHandler(func)
+
+    # Deleting a bot message from a previous state
+    try:
+        await api.delete_message(chat_id=user_id, message_id=call.message.message_id)
+    except telebot.apihelper.ApiTelegramException:
+        pass
+
+    await dispatcher.dispatch(func, *args, **kwargs)
 
 
 if __name__ == '__main__':
-    schedule_thread = threading.Thread(target=schedule_notifications, daemon=True).start()
-
-    while True: 
-        try:    
-            bot.polling(none_stop=True)
-        except Exception as e:
-            asyncio.run(addLog(level='critical', text=traceback.format_exc(), send_telegram_message=True))
-        asyncio.run(asyncio.sleep(1))
\ No newline at end of file
+    runtime.start()
+    runtime.run(scheduleWorkNotifications())
+    runtime.run(scheduleCountersCheck())
+    runtime.submit(scheduler.run())
+    runtime.submit(broadcast_scheduler.run())
+
+    try:
+        receiveUpdates(bot, 'work')
+    finally:
+        runtime.stop()
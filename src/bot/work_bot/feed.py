@@ -0,0 +1,235 @@
+from ..storage import getRedisConnection, getScript
+from ..pagination import Keyset, countRows, resetCounts
+from .. import config
+
+import math
+import datetime
+
+
+# Keep the free works of every worker in Redis, so the feed doesn't query the landlords' works
+WORK_FEED_CACHE = getattr(config, 'WORK_FEED_CACHE', False)
+WORK_FEED_TTL = 60*60*24
+# Marks a loaded feed, so an empty feed is not loaded again. Its score is below any work score.
+FEED_LOADED_MEMBER = 'loaded'
+
+
+# Works which are visible to a worker: only the works of his landlords and of his work types
+FEED_CONDITIONS = {
+    'accepted': '''
+        w."workerID" = $1
+        AND w."completedDate" IS NULL
+    ''',
+    'scheduled': '''
+        w."acceptForWorkDate" IS NULL
+        AND w."completedDate" IS NULL
+        AND EXISTS (
+            SELECT 1
+            FROM "userWorkers" uw
+            WHERE uw."workerID" = $1
+                AND uw."userID" = w."userID"
+                AND uw."workID" = w."workID"
+                AND uw."isActive" IS TRUE
+        )
+    ''',
+    'completed': '''
+        w."workerID" = $1
+        AND w."completedDate" IS NOT NULL
+    ''',
+}
+
+FEED_QUERY = '''
+    SELECT w.id, w.date, w."timeRange"
+    FROM "userWorks" w
+    WHERE {conditions}
+'''
+
+FEED_COUNT_QUERY = '''
+    SELECT COUNT(w.id)
+    FROM "userWorks" w
+    WHERE {conditions}
+'''
+
+# Active workers who can take a work
+WORK_WORKERS_QUERY = '''
+    SELECT uw."workerID"
+    FROM "userWorks" w
+    JOIN "userWorkers" uw
+        ON uw."userID" = w."userID"
+        AND uw."workID" = w."workID"
+    WHERE w.id = $1
+        AND uw."workerID" IS NOT NULL
+        AND uw."isActive" IS TRUE
+'''
+
+# Works of a cached feed page, by their ids
+CACHED_FEED_QUERY = f'''
+    {FEED_QUERY.format(conditions='w.id = ANY($1::int[])')}
+    ORDER BY w.date, w.id
+'''
+
+works_keyset = Keyset(('w.date', 'date', datetime.date.fromisoformat), ('w.id', 'id', int))
+
+
+# Adds a work to the loaded feeds only, a feed which is not loaded will be read from the database in full.
+# KEYS - feeds; ARGV[1] - work id, ARGV[2] - score, ARGV[3] - loaded marker
+ADD_SCRIPT = '''
+for _, key in ipairs(KEYS) do
+    if redis.call('ZSCORE', key, ARGV[3]) then
+        redis.call('ZADD', key, ARGV[2], ARGV[1])
+    end
+end
+return #KEYS
+'''
+
+
+def getFeedKey(worker_id: int) -> str:
+    return f"feed=worker={worker_id}"
+
+def getScore(date: datetime.date, work_id: int) -> int:
+    "Orders the feed by (date, id) like the keyset of the database query."
+
+    return date.toordinal() * 10**9 + work_id
+
+
+async def getFeedPage(
+    conn,
+    worker_id: int,
+    status: str,
+    page: int=1,
+    after: str=None,
+    before: str=None,
+    per_page: int=5,
+) -> tuple[int, list]:
+    '''Returns the number of works in the worker feed and the works of the page.
+
+    :param conn: database connection.
+    :param worker_id: id of the worker.
+    :param status: `accepted` - works taken by the worker, `scheduled` - free works of his landlords,
+        `completed` - works completed by the worker.
+    :param page: page number.
+    :param after: keyset cursor of the last work of the previous page.
+    :param before: keyset cursor of the first work of the next page.
+    '''
+
+    if status == 'scheduled' and WORK_FEED_CACHE:
+        return await getCachedFeedPage(conn, worker_id, page, after, before, per_page)
+
+    conditions = FEED_CONDITIONS[status]
+
+    query = FEED_COUNT_QUERY.format(conditions=conditions)
+    count = (await countRows(conn, worker_id, f'cleaning-{status}', query, worker_id))
+
+    works = (await works_keyset.fetchPage(
+        conn,
+        FEED_QUERY.format(conditions=conditions),
+        worker_id,
+        count=count,
+        per_page=per_page,
+        page=page,
+        after=after,
+        before=before,
+    ))
+    return count, works
+
+
+async def loadFeed(conn, worker_id: int) -> None:
+    "Reads all the free works of a worker from the database to his feed in Redis."
+
+    query = FEED_QUERY.format(conditions=FEED_CONDITIONS['scheduled'])
+    works = (await conn.fetch(query, worker_id))
+
+    redis = (await getRedisConnection())
+    key = getFeedKey(worker_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.zadd(key, {FEED_LOADED_MEMBER: 0, **{w['id']: getScore(w['date'], w['id']) for w in works}})
+        pipe.expire(key, WORK_FEED_TTL)
+        await pipe.execute()
+
+async def getCachedFeedPage(conn, worker_id: int, page: int, after: str, before: str, per_page: int) -> tuple[int, list]:
+    redis = (await getRedisConnection())
+    key = getFeedKey(worker_id)
+
+    count = (await redis.zcard(key))
+    if count == 0:
+        await loadFeed(conn, worker_id)
+        count = (await redis.zcard(key))
+    count -= 1 # loaded marker
+
+    pages_count = max(math.ceil(count / per_page), 1)
+    descending = False
+
+    if after:
+        date, work_id = works_keyset.decode(after)
+        work_ids = (await redis.zrangebyscore(key, f'({getScore(date, work_id)}', '+inf', start=0, num=per_page))
+    elif before:
+        date, work_id = works_keyset.decode(before)
+        work_ids = (await redis.zrevrangebyscore(key, f'({getScore(date, work_id)}', 1, start=0, num=per_page))
+        descending = True
+    elif page > 1 and page >= pages_count:
+        limit = count - (pages_count - 1) * per_page
+        work_ids = (await redis.zrevrangebyscore(key, '+inf', 1, start=0, num=limit))
+        descending = True
+    else:
+        work_ids = (await redis.zrangebyscore(key, 1, '+inf', start=(page - 1) * per_page, num=per_page))
+
+    if descending:
+        work_ids = list(reversed(work_ids))
+    if not work_ids:
+        return count, []
+
+    works = (await conn.fetch(CACHED_FEED_QUERY, [int(w) for w in work_ids]))
+    return count, list(works)
+
+
+async def getWorkWorkers(conn, work_id: int) -> list[int]:
+    "Returns the active workers who can take the work."
+
+    return [w[0] for w in (await conn.fetch(WORK_WORKERS_QUERY, work_id))]
+
+async def addFreeWork(work_id: int, date: datetime.date, worker_ids: list[int]) -> None:
+    '''Adds a work which became free (new or refused) to the feeds of the workers.
+
+    :param work_id: id of the work.
+    :param date: date of the work.
+    :param worker_ids: workers who can take the work.
+    '''
+
+    worker_ids = [w for w in worker_ids if w]
+    if not worker_ids:
+        return
+    await resetCounts(*worker_ids)
+
+    if WORK_FEED_CACHE:
+        add = (await getScript(ADD_SCRIPT))
+        await add(
+            keys=[getFeedKey(w) for w in worker_ids],
+            args=[work_id, getScore(date, work_id), FEED_LOADED_MEMBER],
+        )
+
+async def removeFreeWork(work_id: int, worker_ids: list[int]) -> None:
+    '''Removes a work which was taken or deleted from the feeds of the workers.
+
+    :param work_id: id of the work.
+    :param worker_ids: workers who could take the work.
+    '''
+
+    worker_ids = [w for w in worker_ids if w]
+    if not worker_ids:
+        return
+    await resetCounts(*worker_ids)
+
+    if WORK_FEED_CACHE:
+        redis = (await getRedisConnection())
+        async with redis.pipeline(transaction=False) as pipe:
+            for worker_id in worker_ids:
+                pipe.zrem(getFeedKey(worker_id), work_id)
+            await pipe.execute()
+
+async def resetFeed(*worker_ids: int) -> None:
+    "Drops the feeds of the workers whose landlords or work types have changed."
+
+    worker_ids = [w for w in worker_ids if w]
+    if WORK_FEED_CACHE and worker_ids:
+        redis = (await getRedisConnection())
+        await redis.delete(*(getFeedKey(w) for w in worker_ids))
@@ -0,0 +1,117 @@
+'''Queries of the work bot handlers.
+They are also explained by `query_audit`, so a changed query is audited as it is run.
+The feed queries are in `feed`, the reminders ones are in `reminders`.'''
+
+
+WORKER_INVITE_QUERY = '''
+    SELECT "userID", "workerID"
+    FROM "userWorkers"
+    WHERE "addID" = $1
+'''
+
+# The account of a worker is created when the first invite is accepted
+ADD_WORKER_ACCOUNT_QUERY = '''
+    INSERT INTO workers (id, "regDate")
+    VALUES ($1, $2)
+    ON CONFLICT (id) DO NOTHING
+'''
+
+ACTIVATE_WORKER_QUERY = '''
+    UPDATE "userWorkers"
+    SET "workerID" = $1, "isActive" = true
+    WHERE "addID" = $2
+'''
+
+CLEANING_CARD_QUERY = '''
+    SELECT
+        w.id,
+        w."propertyID", p."address",
+        w."workerID",
+        w.date, w."timeRange",
+        w."acceptForWorkDate", w."acceptanceConfirmed", w."completedDate",
+        w.comment,
+        w."addDate",
+        c."hygieneKitsCount"
+    FROM "userWorks" w
+    JOIN cleaning c
+        ON c."workID" = w.id
+    JOIN properties p
+        ON p.id = w."propertyID"
+    WHERE w.id = $1
+'''
+
+ACCEPT_CLEANING_QUERY = '''
+    SELECT
+        w.id, w."userID", w."propertyID", p."address",
+        w.date, w."timeRange", w."acceptForWorkDate"
+    FROM "userWorks" w
+    JOIN cleaning c
+        ON c."workID" = w.id
+    JOIN properties p
+        ON p.id = w."propertyID"
+    WHERE w.id = $1
+'''
+
+# The cleaning is taken only if nobody has accepted it since the card was read
+TAKE_CLEANING_QUERY = '''
+    UPDATE "userWorks"
+    SET "workerID" = $1, "acceptForWorkDate" = $2
+    WHERE id = $3
+        AND "acceptForWorkDate" IS NULL
+    RETURNING id
+'''
+
+# Name of the worker which is shown to the landlord of the work
+WORKER_NAME_QUERY = '''
+    SELECT "workerName", "workerNumber"
+    FROM "userWorkers"
+    WHERE "workerID" = $1
+        AND "userID" = $2
+'''
+
+REFUSE_CLEANING_QUERY = '''
+    SELECT
+        w.id, w."userID", w."propertyID", p."address",
+        w.date, w."timeRange", w."acceptForWorkDate",
+        w.comment
+    FROM "userWorks" w
+    JOIN cleaning c
+        ON c."workID" = w.id
+    JOIN properties p
+        ON p.id = w."propertyID"
+    WHERE w.id = $1
+        AND w."workerID" = $2
+'''
+
+# The cleaning is freed only by its worker and until it is completed
+FREE_CLEANING_QUERY = '''
+    UPDATE "userWorks"
+    SET "workerID" = NULL, "acceptForWorkDate" = NULL, "acceptanceConfirmed" = FALSE
+    WHERE id = $1
+        AND "workerID" = $2
+        AND "completedDate" IS NULL
+'''
+
+# Work which is completed or confirmed by its worker
+WORKER_WORK_QUERY = '''
+    SELECT
+        w.id, w."userID", p."address", w."timeRange"
+    FROM "userWorks" w
+    JOIN properties p
+        ON p.id = w."propertyID"
+    WHERE w.id = $1
+'''
+
+COMPLETE_CLEANING_QUERY = '''
+    UPDATE "userWorks"
+    SET "completedDate" = $1
+    WHERE "workerID" = $2 AND id = $3
+        AND "completedDate" IS NULL
+'''
+
+CONFIRM_CLEANING_QUERY = '''
+    UPDATE "userWorks"
+    SET "acceptanceConfirmed" = TRUE
+    WHERE "workerID" = $1 AND id = $2
+        AND "acceptanceConfirmed" IS NOT TRUE
+'''
@@ -0,0 +1,253 @@
+from ..db import acquire
+from ..storage import getRedisConnection
+from ..works import getWorkTitle
+from ..tg_api.broadcast import sendMessages, isRetryable
+from ..scheduler import Scheduler
+from ..callbacks import encodeCallback
+from .. import config
+
+import datetime
+from textwrap import dedent
+
+
+REMINDERS_BATCH_SIZE = getattr(config, 'REMINDERS_BATCH_SIZE', 100)
+# How long the record of sent reminders is kept
+REMINDERS_RECORD_TTL = 60*60*24*3
+# Reminders are sent in the evening, spread over a few minutes
+REMINDERS_TIME = datetime.time(19, 0)
+REMINDERS_JITTER = 60*5
+
+
+scheduler = Scheduler('work')
+
+WORKS_QUERY = '''
+    SELECT
+        w.id, w."workID",
+        p."address",
+        w."workerID",
+        w.date, w."timeRange",
+        w."acceptanceConfirmed"
+    FROM "userWorks" w
+    JOIN properties p
+        ON p.id = w."propertyID"
+'''
+
+# Assigned works of the date window [$1, $2]
+REMINDERS_QUERY = f'''
+    {WORKS_QUERY}
+    WHERE w.date BETWEEN $1 AND $2
+        AND w."workerID" IS NOT NULL
+        AND w."completedDate" IS NULL
+    ORDER BY w.date, w.id
+'''
+
+WORK_REMINDER_QUERY = f'''
+    {WORKS_QUERY}
+    WHERE w.id = $1
+        AND w."workerID" IS NOT NULL
+        AND w."completedDate" IS NULL
+'''
+
+
+def buildReminder(work: dict, today: datetime.date) -> tuple[str, dict] | tuple[None, None]:
+    '''Returns the reminder kind and the message parameters for an assigned work.
+    `confirmation` is sent a day before the work, `reminder` - two days before.
+    If the work needs no message today, returns `(None, None)`.
+
+    :param work: row with `id`, `workID`, `workerID`, `address`, `date`, `timeRange`, `acceptanceConfirmed`.
+    :param today: the date of the reminders run.
+    '''
+
+    work_title = getWorkTitle(work_id=work['workID'])
+    address = work['address']
+    time_range = work['timeRange']
+    days_left = (work['date'] - today).days
+
+    if days_left == 1 and work['acceptanceConfirmed'] is False:
+        return 'confirmation', {
+            'chat_id': work['workerID'],
+            'text': dedent(
+                f'''
+                *☑️ Подтвредите проведение работ*
+
+                На Вас назначено проведение работ *({work_title})*
+                по адресу *{address}* - завтра *({time_range})*.
+
+                _Подтвердите возможность проведения работ или откажитесь от их выполнения, нажав на соответствующую кнопку._
+                '''
+            ),
+            'parse_mode': 'Markdown',
+            'reply_markup': {
+                "inline_keyboard": [
+                    [
+                        {
+                            'text': '✅ Подтвердить',
+                            'callback_data': encodeCallback('confirmAcceptance', work_id=work["id"]),
+                        },
+                        {
+                            'text': '🚫 Отказаться',
+                            'callback_data': encodeCallback('refuseCleaning', work_id=work["id"], call_id=True),
+                        },
+                    ],
+                ],
+            },
+        }
+    elif days_left == 2:
+        return 'reminder', {
+            'chat_id': work['workerID'],
+            'text': dedent(
+                f'''
+                *🔔 Напоминание о предстоящих работах*
+
+                На Вас назначено проведение работ *({work_title})*
+                по адресу *{address}* - послезавтра *({time_range})*.
+                '''
+            ),
+            'parse_mode': 'Markdown',
+        }
+
+    return None, None
+
+
+async def sendReminders(works: list[dict], today: datetime.date) -> dict:
+    '''Sends reminders for a batch of works exactly once per day.
+
+    Every reminder is claimed in the run record (a Redis set) before sending,
+    so a restarted run skips the reminders which were already sent.
+    Reminders that failed for a temporary reason are released and can be sent by the next run.
+
+    :param works: batch of assigned works.
+    :param today: the date of the reminders run.
+    '''
+
+    stats = {'sent': 0, 'skipped': 0, 'failed': 0}
+
+    # (work id, kind) -> (member of the run record, message parameters)
+    reminders = dict()
+    for work in works:
+        kind, parameters = buildReminder(work, today)
+        if kind:
+            reminders[(work['id'], kind)] = (f"{work['id']}:{work['workerID']}:{kind}", parameters)
+    if not reminders:
+        return stats
+
+    redis = (await getRedisConnection())
+    run_key = f"reminders={today.isoformat()}"
+
+    async with redis.pipeline(transaction=True) as pipe:
+        for member, _ in reminders.values():
+            pipe.sadd(run_key, member)
+        pipe.expire(run_key, REMINDERS_RECORD_TTL)
+        claims = (await pipe.execute())[:-1]
+
+    claimed = [key for key, is_new in zip(reminders.keys(), claims) if is_new]
+    stats['skipped'] = len(reminders) - len(claimed)
+    if not claimed:
+        return stats
+
+    # The results are in the order of the messages, so every result belongs to the claim at its position
+    results = (await sendMessages([reminders[key][1] for key in claimed], bot='work'))
+
+    released = [reminders[key][0] for key, r in zip(claimed, results) if isRetryable(r)]
+    if released:
+        await redis.srem(run_key, *released)
+
+    stats['sent'] = len([r for r in results if r['ok']])
+    stats['failed'] = len(results) - stats['sent']
+    return stats
+
+
+async def sendWorkReminders(today: datetime.date=None) -> dict:
+    '''Sends reminders about the works planned for tomorrow and the day after tomorrow.
+
+    Only the rows of this date window are read. They are streamed with a server-side cursor
+    and sent in rate-limited concurrent batches of `REMINDERS_BATCH_SIZE`.
+
+    :param today: the date of the reminders run (current date by default).
+    '''
+
+    if today is None:
+        today = datetime.datetime.now().date()
+
+    stats = {'sent': 0, 'skipped': 0, 'failed': 0}
+
+    async with acquire() as conn:
+        # Cursors live only inside a transaction
+        async with conn.transaction(readonly=True):
+            cursor = (await conn.cursor(
+                REMINDERS_QUERY,
+                today + datetime.timedelta(days=1),
+                today + datetime.timedelta(days=2),
+            ))
+
+            while True:
+                works = (await cursor.fetch(REMINDERS_BATCH_SIZE))
+                if not works:
+                    break
+
+                batch_stats = (await sendReminders([dict(w) for w in works], today))
+                for k, v in batch_stats.items():
+                    stats[k] += v
+
+    return stats
+
+
+@scheduler.job()
+async def sendWorkReminder(work_id: int, kind: str) -> None:
+    '''Job which sends a single reminder of a work.
+    The work is re-read, so nothing is sent if it was completed, refused or already confirmed.
+
+    :param work_id: id of the work.
+    :param kind: `reminder` or `confirmation`.
+    '''
+
+    async with acquire() as conn:
+        work = (await conn.fetchrow(WORK_REMINDER_QUERY, work_id))
+
+    if work is None:
+        return
+
+    today = datetime.datetime.now().date()
+    if buildReminder(dict(work), today)[0] == kind:
+        await sendReminders([dict(work)], today)
+
+async def scheduleWorkReminders(work_id: int, date: datetime.date) -> None:
+    '''Schedules the reminder (two days before the work) and the confirmation request (a day before)
+    for a work which has just been taken by a worker.
+
+    :param work_id: id of the work.
+    :param date: date of the work.
+    '''
+
+    now = datetime.datetime.now()
+
+    reminder_at = datetime.datetime.combine(date - datetime.timedelta(days=2), REMINDERS_TIME)
+    if reminder_at > now:
+        await scheduler.schedule(
+            job_id=f"work={work_id}-reminder",
+            handler='sendWorkReminder',
+            run_at=reminder_at,
+            kwargs={'work_id': work_id, 'kind': 'reminder'},
+            jitter=REMINDERS_JITTER,
+        )
+
+    # If the work was taken late in the evening before it, the confirmation is requested right away
+    confirmation_at = datetime.datetime.combine(date - datetime.timedelta(days=1), REMINDERS_TIME)
+    if date > now.date():
+        await scheduler.schedule(
+            job_id=f"work={work_id}-confirmation",
+            handler='sendWorkReminder',
+            run_at=max(confirmation_at, now),
+            kwargs={'work_id': work_id, 'kind': 'confirmation'},
+            jitter=REMINDERS_JITTER if confirmation_at > now else 0,
+        )
+
+async def cancelWorkReminders(*work_ids: int) -> None:
+    "Removes the scheduled reminders of the works, e.g. when the worker refused it or the work was deleted."
+
+    if work_ids:
+        await scheduler.cancel(*(
+            job_id
+            for work_id in work_ids
+            for job_id in (f"work={work_id}-reminder", f"work={work_id}-confirmation")
+        ))